@@ -0,0 +1,225 @@
+# %* *****************************************************************************
+# %  *  Title:  Approximate inference for large trust networks
+# %  *  Description:
+# %  *  Exact elimination (BN_Compiled.py) grows with the width of the network; this
+# %  *  module answers the same queries by sampling, with a cost that grows with the
+# %  *  number of samples. Both samplers draw whole batches of samples at once as an
+# %  *  (N x nodes) array of state indices, filled in topological order:
+# - Likelihood weighting: unobserved nodes are sampled from their CPD, observed
+#    nodes are clamped and add their log likelihood to the log weight of the sample.
+#    The weights are exponentiated relative to the largest log weight so far, so
+#    thousands of observations do not underflow.
+# - Gibbs sampling: many chains are advanced together; every sweep resamples each
+#    unobserved node from its Markov blanket. Deterministic CPDs (zero entries)
+#    can stop the chains from mixing, which shows up in R-hat.
+# Every result carries a standard error, an error bound at ``level``, the effective
+# sample size and (for Gibbs) the Gelman-Rubin R-hat. Accuracy is traded for latency
+# with a sample budget (``samples``) or a time budget in seconds (``deadline``).
+# %  *
+# %  **************************************************************************** */
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from BN_Compiled import CompiledNetwork, compile_model
+
+Estimate = namedtuple('Estimate', ['posterior', 'stderr', 'bound', 'level', 'samples',
+                                   'ess', 'rhat', 'method', 'elapsed'])
+
+# Normal quantiles for the error bound
+_Z = {0.9: 1.6448536269514722, 0.95: 1.959963984540054, 0.99: 2.5758293035489004}
+
+
+def _network(model):
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    if network.param_shape:
+        raise ValueError('Approximate inference needs a network without stacked CPTs')
+    return network
+
+
+def _conditional(network, node, states):
+    # P(node | parents) for every sample: (N x card)
+    cpt = network.cpts[node]
+    parents = network.parents[node]
+    if isinstance(cpt, np.ndarray):
+        if not parents:
+            return np.broadcast_to(cpt, (len(states), len(cpt)))
+        return cpt[(slice(None),) + tuple(states[:, p] for p in parents)].T
+    order = [network.index[name] for name in cpt.evidence]
+    return cpt.conditional(states[:, order])
+
+
+def _draw(rng, probs):
+    # One categorical draw per row of (unnormalized) probabilities
+    cdf = np.cumsum(probs, axis=1)
+    u = rng.random(len(probs))[:, None] * cdf[:, -1:]
+    return np.minimum((cdf <= u).sum(axis=1), probs.shape[1] - 1)
+
+
+def _evidence(network, evidence):
+    return {network._node(name): network._state(network._node(name), value)
+            for name, value in (evidence or {}).items()}
+
+
+def _z(level):
+    try:
+        return _Z[level]
+    except KeyError:
+        from scipy.special import ndtri
+        return float(ndtri(0.5 + level / 2.0))
+
+
+def _budget(samples, deadline):
+    if samples is None and deadline is None:
+        samples = 100000
+    if samples is not None and samples < 1:
+        raise ValueError('samples must be at least 1, got %r' % (samples,))
+    stop = None if deadline is None else time.perf_counter() + deadline
+    return samples, stop
+
+
+def likelihood_weighting(model, variables, evidence=None, samples=None, deadline=None,
+                         chunk=10000, level=0.95, seed=None):
+    """P(variables | evidence) by likelihood weighting.
+
+    Samples are drawn ``chunk`` at a time until ``samples`` are drawn or ``deadline``
+    seconds have passed (at least one chunk is always drawn).
+    """
+    start = time.perf_counter()
+    network = _network(model)
+    targets = [network._node(v) for v in variables]
+    observed = _evidence(network, evidence)
+    samples, stop = _budget(samples, deadline)
+    rng = np.random.default_rng(seed)
+    shape = tuple(network.cards[t] for t in targets)
+    size = int(np.prod(shape))
+
+    # Sums of the weights exp(log_w - shift), with shift the largest log weight so far
+    weighted, squared = np.zeros(size), np.zeros(size)
+    total = total_sq = 0.0
+    shift = -np.inf
+    drawn = 0
+    while True:
+        n = chunk if samples is None else min(chunk, samples - drawn)
+        states = np.empty((n, len(network.nodes)), dtype=np.int64)
+        log_w = np.zeros(n)
+        for node in range(len(network.nodes)):
+            probs = _conditional(network, node, states)
+            if node in observed:
+                states[:, node] = observed[node]
+                with np.errstate(divide='ignore'):
+                    log_w += np.log(probs[:, observed[node]])
+            else:
+                states[:, node] = _draw(rng, probs)
+        drawn += n
+        peak = log_w.max()
+        if np.isfinite(peak):
+            if peak > shift:
+                factor = np.exp(shift - peak)
+                weighted *= factor
+                squared *= factor ** 2
+                total *= factor
+                total_sq *= factor ** 2
+                shift = peak
+            weights = np.exp(log_w - shift)
+            index = np.ravel_multi_index(tuple(states[:, t] for t in targets), shape)
+            weighted += np.bincount(index, weights=weights, minlength=size)
+            squared += np.bincount(index, weights=weights ** 2, minlength=size)
+            total += weights.sum()
+            total_sq += (weights ** 2).sum()
+        if (samples is not None and drawn >= samples) or (stop is not None and time.perf_counter() >= stop):
+            break
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        posterior = weighted / total
+        # Delta method for a ratio estimator: sum w^2 (1_k - p_k)^2 / (sum w)^2
+        var = (squared * (1.0 - 2.0 * posterior) + posterior ** 2 * total_sq) / total ** 2
+        ess = total ** 2 / total_sq
+    stderr = np.sqrt(np.maximum(var, 0.0))
+    return Estimate(posterior.reshape(shape), stderr.reshape(shape), _z(level) * stderr.max(), level,
+                    drawn, ess, None, 'likelihood_weighting', time.perf_counter() - start)
+
+
+def gibbs(model, variables, evidence=None, samples=None, deadline=None, chains=256,
+          burn_in=100, level=0.95, seed=None):
+    """P(variables | evidence) by Gibbs sampling with ``chains`` parallel chains.
+
+    ``samples`` counts the kept states over all chains. The burn-in is cut short
+    when the deadline leaves no time for it. The standard error comes from the
+    spread of the chain means, so it accounts for autocorrelation.
+    """
+    start = time.perf_counter()
+    network = _network(model)
+    targets = [network._node(v) for v in variables]
+    observed = _evidence(network, evidence)
+    samples, stop = _budget(samples, deadline)
+    sweeps = None if samples is None else max(-(-samples // chains), 2)
+    rng = np.random.default_rng(seed)
+    shape = tuple(network.cards[t] for t in targets)
+    size = int(np.prod(shape))
+
+    # Start from a forward sample with the evidence clamped
+    states = np.empty((chains, len(network.nodes)), dtype=np.int64)
+    for node in range(len(network.nodes)):
+        states[:, node] = observed[node] if node in observed else \
+            _draw(rng, _conditional(network, node, states))
+
+    free = [node for node in range(len(network.nodes)) if node not in observed]
+    rows = np.arange(chains)
+    counts = np.zeros((chains, size))
+    kept, sweep = 0, 0
+    while True:
+        for node in free:
+            logp = np.empty((chains, network.cards[node]))
+            with np.errstate(divide='ignore'):
+                for s in range(network.cards[node]):
+                    states[:, node] = s
+                    logp[:, s] = np.log(_conditional(network, node, states)[:, s])
+                    for child in network._children[node]:
+                        logp[:, s] += np.log(_conditional(network, child, states)[rows, states[:, child]])
+            best = logp.max(axis=1, keepdims=True)
+            probs = np.exp(logp - np.where(np.isfinite(best), best, 0.0))
+            states[:, node] = _draw(rng, probs)
+        sweep += 1
+        late = stop is not None and time.perf_counter() >= stop
+        if sweep > burn_in or late:
+            index = np.ravel_multi_index(tuple(states[:, t] for t in targets), shape)
+            counts[rows, index] += 1
+            kept += 1
+        if (sweeps is not None and kept >= sweeps) or (late and kept >= 2):
+            break
+
+    means = counts / kept
+    posterior = means.mean(axis=0)
+    stderr = means.std(axis=0, ddof=1) / np.sqrt(chains)
+    # Gelman-Rubin on the indicator of every target state
+    within = (means * (1.0 - means)).mean(axis=0) * kept / max(kept - 1, 1)
+    between = kept * means.var(axis=0, ddof=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rhat = np.sqrt(((kept - 1) / kept * within + between / kept) / within)
+        ess = np.where(stderr > 0, posterior * (1.0 - posterior) / stderr ** 2, chains * kept)
+    rhat = float(np.nanmax(rhat)) if np.isfinite(rhat).any() else 1.0
+    return Estimate(posterior.reshape(shape), stderr.reshape(shape), _z(level) * stderr.max(), level,
+                    chains * kept, float(np.min(ess)), rhat, 'gibbs', time.perf_counter() - start)
+
+
+def query(model, variables, evidence=None, method='exact', **options):
+    """P(variables | evidence) with the inference ``method`` of this query.
+
+    ``method`` is 'exact' (compiled variable elimination), 'likelihood_weighting'
+    or 'gibbs'; ``options`` go to the sampler (samples, deadline, seed, ...).
+    Every method returns an Estimate; exact results have a zero error.
+    """
+    if method == 'likelihood_weighting':
+        return likelihood_weighting(model, variables, evidence, **options)
+    if method == 'gibbs':
+        return gibbs(model, variables, evidence, **options)
+    if method != 'exact':
+        raise ValueError("method must be 'exact', 'likelihood_weighting' or 'gibbs'")
+    start = time.perf_counter()
+    network = _network(model)
+    posterior = network.query(variables, evidence)
+    return Estimate(posterior, np.zeros_like(posterior), 0.0, options.get('level', 0.95), None,
+                    np.inf, None, 'exact', time.perf_counter() - start)
@@ -0,0 +1,255 @@
+# %* *****************************************************************************
+# %  *  Title:  Benchmarks for trust inference
+# %  *  Description:
+# %  *  Measures whether a change makes trust scoring faster or slower. The suite runs
+# %  *  on the three expert models and on synthetic trust networks with the same layered
+# %  *  shape (indicators -> determinants -> trust, at most three parents per node) at
+# %  *  20, 100, 500 and 2000 nodes. The measurements are:
+# - latency: one query, like q1 (worst, trust | robustness) and q4 (best, trust | security).
+# - throughput: rows per second of query_batch at several batch sizes.
+# - build: time to build modelactual/modelbest/modelworst and to compile the networks.
+# - memory: peak traced allocation while compiling and scoring a batch (tracemalloc).
+# - import: cold import time of the modules in a fresh interpreter.
+# Results are written as JSON and compared against a stored baseline; a metric that
+# is worse than the baseline by more than its threshold is reported as a regression.
+# bench_baseline.json is the stored baseline (its "meta" names the machine it was
+# recorded on); record a new one after an intended change or on another machine.
+#
+#    python BN_Benchmark.py --output bench.json --baseline bench_baseline.json
+#    python BN_Benchmark.py --output bench_baseline.json       (store a new baseline)
+# %  *
+# %  **************************************************************************** */
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from BN_Compiled import compile_tables
+
+SIZES = (20, 100, 500, 2000)
+BATCH_SIZES = (1, 100, 1000, 10000)
+
+# Largest evidence matrix (rows x columns) used for a throughput run
+MAX_CELLS = 4000000
+
+# Batch size of the peak memory run
+MEMORY_ROWS = 1000
+
+# Allowed relative change before a metric counts as a regression, per category
+THRESHOLDS = {'latency': 0.25, 'throughput': 0.25, 'build': 0.5, 'memory': 0.1, 'import': 0.5}
+
+IMPORTS = ('BN_Compiled', 'BN_DiscreteCPDs', 'BN_Stream')
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Synthetic trust networks
+# ------------------------------------------------------------------------------------------------------#
+
+def synthetic_tables(nodes, fan_in=3, states=2, seed=0):
+    """TabularCPD keyword dicts of a layered trust network with ``nodes`` nodes.
+
+    Level 0 is ``trust``; every node at level k has up to ``fan_in`` parents at level
+    k + 1, and the nodes without parents are the indicators (roots), as in the trust DAG.
+    """
+    rng = np.random.default_rng(seed)
+    levels = [1]
+    while sum(levels) < nodes:
+        levels.append(min(fan_in * levels[-1], nodes - sum(levels)))
+
+    names = [['trust']] + [['det%d_%d' % (k, j) for j in range(size)] for k, size in enumerate(levels[1:], 1)]
+    parents = {}
+    for k, level in enumerate(names):
+        below = names[k + 1] if k + 1 < len(names) else []
+        for j, name in enumerate(level):
+            parents[name] = below[fan_in * j:fan_in * (j + 1)]
+
+    tables = []
+    for level in names:
+        for name in level:
+            pa = parents[name]
+            if not pa:
+                name = name.replace('det', 'ind')
+            values = rng.dirichlet(np.ones(states), size=states ** len(pa)).T
+            tables.append(dict(variable=name, variable_card=states, values=values,
+                               evidence=[p if parents[p] else p.replace('det', 'ind') for p in pa],
+                               evidence_card=[states] * len(pa)))
+    return tables
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Measurements
+# ------------------------------------------------------------------------------------------------------#
+
+def _seconds(fn, repeat=5):
+    # Best time per call, with the number of calls per run chosen by timeit
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def _metric(results, key, value, unit, better):
+    results[key] = {'value': float(value), 'unit': unit, 'better': better}
+
+
+def bench_models(results):
+    """Latency of q1/q4 and build time of the three expert models."""
+    import BN_DiscreteCPDs as cpds
+
+    # Build times are best-of-repeat like the latencies; the first build also pays for
+    # one-off work (imports, caches) and is left out.
+    cpds.make_network('actual')
+    for case in ('actual', 'best', 'worst'):
+        _metric(results, 'build.compile.%s' % case, _seconds(lambda: cpds.make_network(case)), 's', 'lower')
+    worst, best = cpds.make_network('worst'), cpds.make_network('best')
+    _metric(results, 'latency.q1.compiled',
+            1e6 * _seconds(lambda: worst.query(['trust'], {'robustness': 0})), 'us', 'lower')
+    _metric(results, 'latency.q4.compiled',
+            1e6 * _seconds(lambda: best.query(['trust'], {'security': 1})), 'us', 'lower')
+
+    try:
+        import bnlearn as bn
+    except ImportError:
+        return
+    # bnlearn logs and prints every model it builds and every query it answers
+    logging.disable(logging.INFO)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpds.make_model('actual')
+            for case in ('actual', 'best', 'worst'):
+                _metric(results, 'build.model%s' % case,
+                        _seconds(lambda: cpds.make_model(case), repeat=3), 's', 'lower')
+            modelworst, modelbest = cpds.make_model('worst'), cpds.make_model('best')
+            q1 = _seconds(lambda: bn.inference.fit(modelworst, variables=['trust'],
+                                                   evidence={'robustness': 0}), repeat=3)
+            q4 = _seconds(lambda: bn.inference.fit(modelbest, variables=['trust'],
+                                                   evidence={'security': 1}), repeat=3)
+    finally:
+        logging.disable(logging.NOTSET)
+    _metric(results, 'latency.q1.bnlearn', 1e6 * q1, 'us', 'lower')
+    _metric(results, 'latency.q4.bnlearn', 1e6 * q4, 'us', 'lower')
+
+
+def bench_synthetic(results, sizes=SIZES, batch_sizes=BATCH_SIZES, seed=0):
+    """Build time, latency, throughput and peak memory on synthetic networks."""
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        tables = synthetic_tables(size, seed=seed)
+        network = compile_tables(tables)
+        _metric(results, 'build.synthetic.%d' % size,
+                _seconds(lambda: compile_tables(tables).plan(['trust']), repeat=3), 's', 'lower')
+
+        roots = [name for name, pa in zip(network.nodes, network.parents) if not pa]
+        determinant = next(name for name in network.nodes if name.startswith('det'))
+        _metric(results, 'latency.synthetic.%d.prior' % size,
+                1e6 * _seconds(lambda: network.query(['trust'])), 'us', 'lower')
+        _metric(results, 'latency.synthetic.%d.determinant' % size,
+                1e6 * _seconds(lambda: network.query(['trust'], {determinant: 0})), 'us', 'lower')
+
+        for rows in batch_sizes:
+            if rows * len(roots) > MAX_CELLS:
+                continue
+            evidence = rng.integers(-1, 2, size=(rows, len(roots)))
+            seconds = _seconds(lambda: network.query_batch(['trust'], evidence, columns=roots), repeat=3)
+            _metric(results, 'throughput.synthetic.%d.batch%d' % (size, rows), rows / seconds, 'rows/s', 'higher')
+
+        # Peak memory of compiling and scoring one batch of MEMORY_ROWS rows. Tracing
+        # slows every allocation down, so it is kept out of the timed runs.
+        evidence = rng.integers(-1, 2, size=(MEMORY_ROWS, len(roots)))
+        tracemalloc.start()
+        compile_tables(tables).query_batch(['trust'], evidence, columns=roots)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _metric(results, 'memory.synthetic.%d' % size, peak / 2 ** 20, 'MiB', 'lower')
+
+
+def bench_imports(results, modules=IMPORTS, repeat=3):
+    """Cold import time of each module in a fresh interpreter."""
+    code = 'import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)'
+    for module in modules:
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', code % module], capture_output=True,
+                                 text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            runs.append(float(out.stdout.split()[-1]))
+        _metric(results, 'import.%s' % module, min(runs), 's', 'lower')
+
+
+def run(sizes=SIZES, batch_sizes=BATCH_SIZES, models=True, imports=True, seed=0):
+    """Run the suite and return the report as a dict (meta + results)."""
+    results = {}
+    if models:
+        bench_models(results)
+    bench_synthetic(results, sizes, batch_sizes, seed)
+    if imports:
+        bench_imports(results)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'system': platform.system(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Baseline comparison
+# ------------------------------------------------------------------------------------------------------#
+
+def compare(report, baseline, thresholds=None):
+    """Metrics of ``report`` that are worse than in ``baseline`` by more than their threshold.
+
+    Returns a list of dicts (metric, baseline, current, change) where ``change`` is
+    the relative change in the bad direction, e.g. 0.3 for 30 % slower.
+    """
+    thresholds = dict(THRESHOLDS, **(thresholds or {}))
+    regressions = []
+    for key, current in report['results'].items():
+        old = baseline['results'].get(key)
+        if old is None or old['value'] <= 0:
+            continue
+        if current['better'] == 'lower':
+            change = current['value'] / old['value'] - 1.0
+        else:
+            change = old['value'] / current['value'] - 1.0 if current['value'] > 0 else np.inf
+        if change > thresholds[key.split('.')[0]]:
+            regressions.append({'metric': key, 'baseline': old['value'],
+                                'current': current['value'], 'change': change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark trust inference.')
+    parser.add_argument('--output', default='bench.json', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare against')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='synthetic network sizes')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--no-models', action='store_true', help='skip the expert models')
+    parser.add_argument('--no-imports', action='store_true', help='skip the cold import runs')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.batch_sizes, not args.no_models, not args.no_imports)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for key, metric in sorted(report['results'].items()):
+        print('%-45s %14.6g %s' % (key, metric['value'], metric['unit']))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f))
+        for r in regressions:
+            print('REGRESSION %s: %.6g -> %.6g (%+.0f%%)'
+                  % (r['metric'], r['baseline'], r['current'], 100 * r['change']))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# %* *****************************************************************************
+# %  *  Title:  Posterior cache for trust inference
+# %  *  Description:
+# %  *  Most trust queries repeat a handful of evidence patterns over the nine root
+# %  *  indicators. This module puts a bounded LRU memo in front of inference:
+# - Key: the fingerprint of the model's CPT values plus the normalized
+#    (variables, evidence) pair of the query.
+# - Eviction: least recently used entry once maxsize is reached.
+# - Invalidation: when the CPTs of a model change its fingerprint changes, and
+#    the entries computed for the old CPTs are dropped.
+# - The compiled network of a fingerprint is kept only while an entry uses it, and
+#    models are tracked through weak references, so the cache stays bounded.
+# %  *
+# %  **************************************************************************** */
+
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+from BN_Compiled import CompiledNetwork, compile_model, model_fingerprint
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def _normalize(variables, evidence):
+    # Same query, same key: evidence order does not matter and NumPy integers
+    # hash like Python integers.
+    variables = tuple(variables)
+    evidence = tuple(sorted((name, value.item() if hasattr(value, 'item') else value)
+                            for name, value in (evidence or {}).items()))
+    return variables, evidence
+
+
+class PosteriorCache:
+    """Memoized P(variables | evidence) with LRU eviction.
+
+    ``query`` accepts a CompiledNetwork or anything compile_model accepts (the
+    dict returned by bn.make_DAG, a pgmpy model, a list of TabularCPDs or their
+    keyword dicts).
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._compiled = {}     # fingerprint -> CompiledNetwork
+        self._users = {}        # fingerprint -> number of entries computed with it
+        self._owners = weakref.WeakKeyDictionary()  # model -> fingerprint last seen
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._compiled.clear()
+            self._users.clear()
+            self._owners.clear()
+            self.hits = self.misses = 0
+
+    def _track(self, model, fingerprint):
+        # A model whose CPTs changed since the last query invalidates its old entries.
+        # Models that cannot be weakly referenced (a list of CPDs) are not tracked;
+        # their stale entries simply age out.
+        owner = model['model'] if isinstance(model, dict) else model
+        try:
+            previous = self._owners.get(owner)
+            self._owners[owner] = fingerprint
+        except TypeError:
+            return
+        if previous is None or previous == fingerprint:
+            return
+        if previous in self._owners.values():
+            return
+        for key in [key for key in self._entries if key[0] == previous]:
+            self._drop(key)
+
+    def _drop(self, key):
+        # Remove an entry, and the compiled network once no entry uses it
+        del self._entries[key]
+        self._users[key[0]] -= 1
+        if not self._users[key[0]]:
+            del self._users[key[0]]
+            self._compiled.pop(key[0], None)
+
+    def query(self, model, variables, evidence=None):
+        fingerprint = model_fingerprint(model)
+        key = (fingerprint,) + _normalize(variables, evidence)
+        with self._lock:
+            self._track(model, fingerprint)
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+            network = self._compiled.get(fingerprint)
+        if network is None:
+            network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+
+        result = network.query(variables, evidence)
+        result.setflags(write=False)
+        with self._lock:
+            if key not in self._entries:
+                self._compiled.setdefault(fingerprint, network)
+                self._users[fingerprint] = self._users.get(fingerprint, 0) + 1
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+        return result
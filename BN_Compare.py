@@ -0,0 +1,369 @@
+# %* *****************************************************************************
+# %  *  Title:  Quantitative comparison of trust models
+# %  *  Description:
+# %  *  bn.compare_networks only plots the edges two models share. This module measures
+# %  *  how differently the models behave, from the CPTs and the compiled elimination
+# %  *  plans, without enumerating the joint distribution:
+# - KL divergence of the joints: the chain rule gives
+#    KL(P || Q) = sum_i E_P[log P(x_i | pa_i)] - E_P[log Q(x_i | pa'_i)],
+#    where each term only needs the marginal of P over one family. The terms are the
+#    per-node contributions (for models with the same DAG, the expected KL of the CPTs).
+#    A node whose CPD is the same in both models contributes 0 without a marginal.
+# - Bhattacharyya coefficient and Hellinger distance of the joints: sum_x sqrt(P(x) Q(x))
+#    is one contraction of the factors sqrt(P(x_i | pa_i)) and sqrt(Q(x_i | pa'_i)); a
+#    CPD shared by both models enters with its own factors, as sqrt(P P) = P.
+# - Total variation of the joints: |P - Q| does not factorize, so it is exact only while
+#    the joint is small enough to materialize (tv_limit). The Hellinger, Pinsker and
+#    Bretagnolle-Huber bounds are always reported.
+# - Posteriors of target variables: exact KL, TV and Hellinger, for one evidence dict or
+#    an (N x columns) evidence matrix.
+# - pairwise: all-pairs matrices for a family of CPT variants, from one scenario-stacked
+#    network (BN_Scenarios.py) so that every variant is queried by the same contractions.
+# %  *
+# %  **************************************************************************** */
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from BN_Compiled import _LETTERS, MISSING, CompiledNetwork, compile_model
+from BN_Scenarios import ScenarioNetwork, compile_scenarios
+from BN_Structured import StructuredCPD
+
+# Largest joint (number of cells) that is materialized for an exact total variation
+TV_LIMIT = 2 ** 20
+
+# Cells of stacked Bhattacharyya tables built at once by pairwise
+_MAX_CELLS = 4000000
+
+Comparison = namedtuple('Comparison', ['kl', 'contributions', 'bhattacharyya', 'hellinger',
+                                       'tv', 'tv_bounds'])
+PosteriorComparison = namedtuple('PosteriorComparison', ['kl', 'tv', 'hellinger', 'p', 'q'])
+
+
+class _Product(StructuredCPD):
+    # Non-normalized factors of one node, for contractions that are not a posterior
+    def __init__(self, variable, variable_card, evidence, evidence_card, factors, hidden=None):
+        super().__init__(variable, variable_card, evidence, evidence_card)
+        self.factors = list(factors)
+        self.hidden = dict(hidden or {})
+
+
+def _network(model):
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    if network.param_shape:
+        raise ValueError('Compare stacked networks with pairwise')
+    return network
+
+
+def _family(network, i):
+    # Names of (node, *parents), the factors of P(node | parents) as (scope, table) and
+    # the hidden variables in their scopes; structured CPDs are not expanded
+    cpt = network.cpts[i]
+    if isinstance(cpt, StructuredCPD):
+        return (cpt.variable,) + tuple(cpt.evidence), list(cpt.factors), dict(cpt.hidden)
+    names = (network.nodes[i],) + tuple(network.nodes[p] for p in network.parents[i])
+    return names, [(names, cpt)], {}
+
+
+def _same(first, second):
+    # Whether two families define the same P(node | parents)
+    (names, factors, _), (q_names, q_factors, _) = first, second
+    return names == q_names and len(factors) == len(q_factors) and all(
+        tuple(a) == tuple(b) and (x is y or np.array_equal(x, y))
+        for (a, x), (b, y) in zip(factors, q_factors))
+
+
+def _table(family):
+    # P(node | parents) over the family names: one contraction of the factors that
+    # sums out the hidden variables
+    names, factors, hidden = family
+    if len(factors) == 1 and tuple(factors[0][0]) == names:
+        return np.asarray(factors[0][1], dtype=float)
+    letter = {name: _LETTERS[k] for k, name in enumerate(names + tuple(hidden))}
+    present = [name for name in names if any(name in scope for scope, _ in factors)]
+    subscripts = ','.join(''.join(letter[v] for v in scope) for scope, _ in factors)
+    table = np.einsum(subscripts + '->' + ''.join(letter[v] for v in present),
+                      *[np.asarray(t, dtype=float) for _, t in factors], optimize=True)
+    # A parent that no factor mentions leaves the table constant along its axis
+    table = np.expand_dims(table, [k for k, name in enumerate(names) if name not in present])
+    cards = [dict(zip(scope, np.shape(t))) for scope, t in factors]
+    shape = [next((c[name] for c in cards if name in c), 1) for name in names]
+    return np.broadcast_to(table, shape)
+
+
+def _check(p, q):
+    if sorted(p.nodes) != sorted(q.nodes):
+        raise ValueError('The models have different variables')
+    for i, node in enumerate(p.nodes):
+        if q.cards[q._node(node)] != p.cards[i]:
+            raise ValueError('%r has %d states in one model and %d in the other'
+                             % (node, p.cards[i], q.cards[q._node(node)]))
+
+
+def _expected_log(marginal, table):
+    # sum_x marginal(x) log table(x), with 0 log 0 = 0 and -inf where the table has
+    # no mass on the support of the marginal
+    support = marginal > 0
+    if (support & (table == 0)).any():
+        return -math.inf
+    return float(np.sum(marginal[support] * np.log(table[support])))
+
+
+def _divergences(p, q, n_axes):
+    # KL(p || q), total variation and Hellinger distance over the last n_axes axes
+    axes = tuple(range(-n_axes, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(p > 0, p * (np.log(p) - np.log(q)), 0.0)
+    kl = terms.sum(axis=axes)
+    tv = 0.5 * np.abs(p - q).sum(axis=axes)
+    bc = np.sqrt(p * q).sum(axis=axes)
+    return kl, tv, np.sqrt(np.clip(1.0 - bc, 0.0, 1.0))
+
+
+def _log_total(network, tables=None):
+    # log of the sum over all states of the product of the network's factors. Every
+    # node is observed with a vector of ones, which keeps the non-normalized factors
+    # from being pruned as barren and leaves their product unchanged.
+    observed = list(network.nodes)
+    vectors = {i: np.ones(c) for i, c in enumerate(network.cards)}
+    plan = network.plan([], observed)
+    buf, scale = network._messages(plan, vectors, tables)
+    inputs, subscripts = plan.final
+    with np.errstate(divide='ignore'):
+        return np.log(np.einsum(subscripts, *[buf[i] for i in inputs])) + \
+            sum(scale[i] for i in inputs)
+
+
+def _bounds(kl, bc):
+    # TV >= 1 - BC (Hellinger); TV <= sqrt(1 - BC^2) (Le Cam), sqrt(KL / 2) (Pinsker)
+    # and sqrt(1 - exp(-KL)) (Bretagnolle-Huber)
+    lower = max(0.0, 1.0 - bc)
+    upper = min(1.0, math.sqrt(max(0.0, 1.0 - bc * bc)))
+    if math.isfinite(kl):
+        upper = min(upper, math.sqrt(kl / 2.0), math.sqrt(1.0 - math.exp(-kl)))
+    return lower, max(lower, upper)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Two models
+# ------------------------------------------------------------------------------------------------------#
+
+def kl_contributions(p, q):
+    """Per-node terms of KL(P || Q) between the joint distributions, as {node: nats}.
+
+    The terms sum to the KL divergence. When both models have the same DAG, the term
+    of a node is the KL divergence of its CPTs weighted by P(parents) and is never
+    negative; with different parents it is E_P[log P(x_i | pa_i) - log Q(x_i | pa'_i)].
+    """
+    p, q = _network(p), _network(q)
+    _check(p, q)
+    contributions = {}
+    for i, node in enumerate(p.nodes):
+        family, q_family = _family(p, i), _family(q, q._node(node))
+        if _same(family, q_family):
+            contributions[node] = 0.0
+            continue
+        names, q_names = family[0], q_family[0]
+        table, q_table = _table(family), _table(q_family)
+        marginal = p.query(list(names))
+        own = _expected_log(marginal, table)
+        if sorted(q_names) == sorted(names):
+            order = [q_names.index(name) for name in names]
+            cross = _expected_log(marginal, np.transpose(q_table, order))
+        else:
+            cross = _expected_log(p.query(list(q_names)), q_table)
+        contributions[node] = own - cross if math.isfinite(cross) else math.inf
+    return contributions
+
+
+def bhattacharyya(p, q):
+    """Bhattacharyya coefficient sum_x sqrt(P(x) Q(x)) of the joint distributions."""
+    p, q = _network(p), _network(q)
+    _check(p, q)
+    parents, cpts = [], []
+    for i, node in enumerate(p.nodes):
+        family, q_family = _family(p, i), _family(q, q._node(node))
+        names, q_names = family[0], q_family[0]
+        hidden = {}
+        if _same(family, q_family):
+            factors, hidden = family[1], family[2]
+        elif sorted(q_names) == sorted(names):
+            order = [q_names.index(name) for name in names]
+            factors = [(names, np.sqrt(_table(family) * np.transpose(_table(q_family), order)))]
+        else:
+            factors = [(names, np.sqrt(_table(family))), (q_names, np.sqrt(_table(q_family)))]
+        evidence = list(dict.fromkeys(names[1:] + q_names[1:]))
+        parents.append([p._node(name) for name in evidence])
+        cpts.append(_Product(node, p.cards[i], evidence, [p.cards[p._node(e)] for e in evidence],
+                             factors, hidden))
+    product = CompiledNetwork(p.nodes, p.cards, parents, cpts)
+    return float(min(1.0, np.exp(_log_total(product))))
+
+
+def total_variation(p, q, tv_limit=TV_LIMIT):
+    """Exact total variation distance of the joint distributions.
+
+    The absolute difference does not factorize, so both joints are materialized;
+    models with more than ``tv_limit`` joint states raise ValueError (use the bounds
+    of compare_joint instead).
+    """
+    p, q = _network(p), _network(q)
+    _check(p, q)
+    if math.prod(p.cards) > tv_limit:
+        raise ValueError('The joint has %d states (tv_limit %d)' % (math.prod(p.cards), tv_limit))
+    return float(0.5 * np.abs(p.query(list(p.nodes)) - q.query(list(p.nodes))).sum())
+
+
+def compare_joint(p, q, tv_limit=TV_LIMIT):
+    """Compare the joint distributions of two models over the same variables.
+
+    Returns a Comparison with the exact KL(P || Q) in nats, its per-node
+    ``contributions``, the Bhattacharyya coefficient, the Hellinger distance
+    sqrt(1 - BC), the exact total variation (None when the joint has more than
+    ``tv_limit`` states) and ``tv_bounds`` = (lower, upper) on the total variation.
+    """
+    p, q = _network(p), _network(q)
+    contributions = kl_contributions(p, q)
+    kl = sum(contributions.values())
+    bc = bhattacharyya(p, q)
+    tv = total_variation(p, q) if math.prod(p.cards) <= tv_limit else None
+    return Comparison(kl, contributions, bc, math.sqrt(max(0.0, 1.0 - bc)), tv, _bounds(kl, bc))
+
+
+def compare_posterior(p, q, variables, evidence=None, columns=None, missing=MISSING):
+    """Compare P(variables | evidence) under two models.
+
+    ``evidence`` is an evidence dict or an (N x columns) matrix as for query_batch;
+    the metrics then have one entry per row. Returns a PosteriorComparison with the
+    KL divergence, total variation and Hellinger distance and both posteriors.
+    """
+    p, q = _network(p), _network(q)
+    if evidence is None or isinstance(evidence, dict):
+        post_p, post_q = p.query(variables, evidence), q.query(variables, evidence)
+    else:
+        post_p = p.query_batch(variables, evidence, columns, missing)
+        post_q = q.query_batch(variables, evidence, columns, missing)
+    kl, tv, hellinger = _divergences(post_p, post_q, len(variables))
+    return PosteriorComparison(kl, tv, hellinger, post_p, post_q)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# All pairs
+# ------------------------------------------------------------------------------------------------------#
+
+def _variant_table(network, i):
+    # (scenarios, card, *parent cards)
+    table = network.cpts[i]
+    k = 1 + len(network.parents[i])
+    return np.broadcast_to(table, (len(network.scenarios),) + table.shape[table.ndim - k:])
+
+
+def _pairwise_kl(network):
+    n = len(network.scenarios)
+    matrix = np.zeros((n, n))
+    for i in range(len(network.nodes)):
+        names = [network.nodes[i]] + [network.nodes[p] for p in network.parents[i]]
+        table = _variant_table(network, i)
+        marginal = np.broadcast_to(network.query(names), table.shape).reshape(n, -1)
+        table = table.reshape(n, -1)
+        support = marginal > 0
+        with np.errstate(divide='ignore'):
+            log_table = np.where(table > 0, np.log(np.where(table > 0, table, 1.0)), 0.0)
+        own = np.where(support, marginal * log_table, 0.0).sum(axis=1)
+        cross = marginal @ log_table.T
+        matrix += own[:, None] - cross
+        matrix[(support.astype(float) @ (table == 0).T.astype(float)) > 0] = math.inf
+    # Same DAG: every term is a weighted KL of CPTs, so negatives are round-off
+    return np.maximum(matrix, 0.0)
+
+
+def _pairwise_bhattacharyya(network):
+    n = len(network.scenarios)
+    tables = [_variant_table(network, i) for i in range(len(network.nodes))]
+    cells = sum(t[0].size for t in tables)
+    rows = max(1, _MAX_CELLS // (n * cells))
+    matrix = np.empty((n, n))
+    for start in range(0, n, rows):
+        block = slice(start, min(n, start + rows))
+        cpts = [np.sqrt(t[block, None] * t[None, :]) for t in tables]
+        product = CompiledNetwork(network.nodes, network.cards, network.parents, cpts)
+        matrix[block] = np.exp(_log_total(product))
+    return np.minimum(matrix, 1.0)
+
+
+def _pairwise_tv(network, tv_limit):
+    if math.prod(network.cards) > tv_limit:
+        raise ValueError('The joint has %d states (tv_limit %d); use metric="hellinger"'
+                         % (math.prod(network.cards), tv_limit))
+    n = len(network.scenarios)
+    joints = np.broadcast_to(network.query(list(network.nodes)), (n,) + tuple(network.cards)).reshape(n, -1)
+    matrix = np.zeros((n, n))
+    for a in range(n):
+        matrix[a] = 0.5 * np.abs(joints[a] - joints).sum(axis=1)
+    return matrix
+
+
+def pairwise(variants, metric='kl', variables=None, evidence=None, columns=None, missing=MISSING,
+             tv_limit=TV_LIMIT):
+    """All-pairs comparison of a family of models, as (names, matrix).
+
+    ``variants`` is a ScenarioNetwork or anything compile_scenarios accepts (a dict
+    of scenario names to models or CPD lists); variants with a different DAG or with
+    structured CPDs are compared one pair at a time. ``matrix[a, b]`` compares
+    variant a with variant b; ``metric`` is 'kl' (KL(a || b), not symmetric), 'tv'
+    or 'hellinger'. Without ``variables`` the joint distributions are compared,
+    otherwise P(variables | evidence), and batched evidence adds a trailing axis
+    with one entry per row.
+    """
+    if metric not in ('kl', 'tv', 'hellinger'):
+        raise ValueError('Unknown metric %r' % (metric,))
+    if isinstance(variants, ScenarioNetwork):
+        network = variants
+    else:
+        try:
+            network = compile_scenarios(variants)
+        except (TypeError, ValueError):
+            return _pairwise_loop(variants, metric, variables, evidence, columns, missing, tv_limit)
+    names, n = network.scenarios, len(network.scenarios)
+
+    if variables is not None:
+        if evidence is None or isinstance(evidence, dict):
+            post = network.query(variables, evidence)
+        else:
+            post = network.query_batch(variables, evidence, columns, missing)
+        if not network.param_shape:
+            post = np.broadcast_to(post, (n,) + post.shape)
+        k = len(variables)
+        lead = post.shape[1:post.ndim - k]
+        p = post.reshape((n, 1) + lead + post.shape[post.ndim - k:])
+        q = post.reshape((1, n) + lead + post.shape[post.ndim - k:])
+        kl, tv, hellinger = _divergences(p, q, k)
+        return names, {'kl': kl, 'tv': tv, 'hellinger': hellinger}[metric]
+
+    if metric == 'kl':
+        return names, _pairwise_kl(network)
+    if metric == 'tv':
+        return names, _pairwise_tv(network, tv_limit)
+    return names, np.sqrt(np.clip(1.0 - _pairwise_bhattacharyya(network), 0.0, 1.0))
+
+
+def _pairwise_loop(variants, metric, variables, evidence, columns, missing, tv_limit):
+    names = tuple(variants)
+    networks = [_network(variants[name]) for name in names]
+    rows = []
+    for p in networks:
+        row = []
+        for q in networks:
+            if variables is not None:
+                result = compare_posterior(p, q, variables, evidence, columns, missing)
+                row.append(getattr(result, metric))
+            elif metric == 'kl':
+                row.append(sum(kl_contributions(p, q).values()))
+            elif metric == 'tv':
+                row.append(total_variation(p, q, tv_limit))
+            else:
+                row.append(math.sqrt(max(0.0, 1.0 - bhattacharyya(p, q))))
+        rows.append(row)
+    return names, np.array(rows, dtype=float)
@@ -0,0 +1,605 @@
+# %* *****************************************************************************
+# %  *  Title:  Compiled Trust Inference
+# %  *  Description:
+# %  *  This module freezes a discrete Bayesian Network (the trust DAG built in
+# %  *  BN_DiscreteCPDs.py) into NumPy tensors so that repeated queries do not pay
+# %  *  the cost of rebuilding the variable elimination machinery. The steps are:
+# - Compile: the structure, cardinalities and CPT arrays of the TabularCPDs are copied
+#    once into read-only arrays in topological order.
+# - Plan: for every query signature (query variables + observed variables) an
+#    elimination order is derived once and stored as a list of einsum contractions.
+# - Query: every later query with the same signature only runs the contractions.
+# Structured CPDs (BN_Structured.py) enter the plan as their small factors, and the
+# hidden variables of those factors are eliminated like any other variable.
+# %  *
+# %  **************************************************************************** */
+
+import copy
+import hashlib
+import heapq
+import math
+import string
+
+import numpy as np
+
+from BN_Structured import StructuredCPD
+
+# Letters used to label the axes of a single einsum contraction
+_LETTERS = string.ascii_letters
+
+# Sentinel for an unobserved node in a batched evidence matrix
+MISSING = -1
+
+# Most factors passed to one einsum call; larger groups are multiplied in chunks
+_MAX_OPERANDS = 16
+
+# Plans with more factors than this rescale their messages (see _contract)
+_RESCALE_FACTORS = 64
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Elimination plan: the frozen schedule of contractions for one query signature
+# ------------------------------------------------------------------------------------------------------#
+
+class EliminationPlan:
+    """Frozen variable elimination schedule for one query signature.
+
+    ``factors`` lists the initial factors as ``('factor', f)`` (an entry of the
+    network's factor list) or ``('evidence', node)``.
+    Each entry of ``steps`` is ``(inputs, subscripts)``: the factors at positions
+    ``inputs`` are contracted with ``np.einsum(subscripts, ...)`` and the result is
+    appended to the factor list. ``final`` contracts the remaining factors onto the
+    query variables; a plan built without the final join (the sum phase of
+    BN_Explain.map_query) has ``final = (inputs, scopes)`` of those factors instead.
+    """
+
+    __slots__ = ('targets', 'observed', 'order', 'factors', 'steps', 'final')
+
+    def __init__(self, targets, observed, order, factors, steps, final):
+        self.targets = tuple(targets)
+        self.observed = tuple(observed)
+        self.order = tuple(order)
+        self.factors = tuple(factors)
+        self.steps = tuple(steps)
+        self.final = final
+
+    def __repr__(self):
+        return 'EliminationPlan(targets=%r, observed=%r, steps=%d)' % (
+            self.targets, self.observed, len(self.steps))
+
+
+def _subscripts(scopes, output):
+    # Build an einsum expression with a leading ellipsis on every operand, so
+    # stacked CPTs (scenarios, samples) and batched evidence broadcast through.
+    letters = {}
+    for var in [v for scope in scopes for v in scope] + list(output):
+        if var not in letters:
+            if len(letters) == len(_LETTERS):
+                raise ValueError('Contraction involves more than %d variables' % len(_LETTERS))
+            letters[var] = _LETTERS[len(letters)]
+    operands = ','.join('...' + ''.join(letters[v] for v in scope) for scope in scopes)
+    return operands + '->...' + ''.join(letters[v] for v in output)
+
+
+def _frozen(values):
+    # A read-only float array of the values. Arrays that are already frozen (another
+    # network, a memory mapped file) are shared; anything else is copied.
+    if isinstance(values, np.ndarray) and values.dtype == float and not values.flags.writeable:
+        return values
+    table = np.array(values, dtype=float)
+    table.setflags(write=False)
+    return table
+
+
+def _rescale(message, subscripts):
+    # Divide a message by its maximum over its variable axes (one maximum per index
+    # of the leading axes). Returns the scaled message and the log of the maximum.
+    k = len(subscripts.rsplit('...', 1)[1])
+    peak = message.max(axis=tuple(range(message.ndim - k, message.ndim)), keepdims=True) if k else message
+    peak = np.where(peak > 0, peak, 1.0)
+    with np.errstate(divide='ignore'):
+        return message / peak, np.log(peak.reshape(peak.shape[:peak.ndim - k]))
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Compiled network
+# ------------------------------------------------------------------------------------------------------#
+
+class CompiledNetwork:
+    """A discrete Bayesian Network frozen into NumPy tensors.
+
+    ``cpts[i]`` follows the pgmpy layout ``(card of node i, *cards of parents[i])``.
+    A CPT may carry extra leading axes (``param_shape``) to stack several variants
+    of the same table, e.g. scenarios or samples; shared CPTs simply omit them and
+    every query then returns one posterior per variant.
+
+    ``cpts[i]`` may also be a StructuredCPD (noisy-MAX, deterministic, tree or
+    sparse). Inference then works on its factors: ``factor_scopes``,
+    ``factor_tables`` and ``factor_owner`` list the factors of all nodes, and the
+    hidden variables of structured CPDs are numbered after the nodes (``var_cards``).
+    """
+
+    def __init__(self, nodes, cards, parents, cpts, state_names=None):
+        self.nodes = tuple(nodes)
+        self.cards = tuple(int(c) for c in cards)
+        self.parents = tuple(tuple(p) for p in parents)
+        self.index = {name: i for i, name in enumerate(self.nodes)}
+
+        self._set_cpts(cpts)
+
+        if state_names is None:
+            state_names = [list(range(c)) for c in self.cards]
+        self.state_names = tuple(tuple(s) for s in state_names)
+        self._state_index = tuple({s: k for k, s in enumerate(names)} for names in self.state_names)
+
+        children = [[] for _ in self.nodes]
+        for j, ps in enumerate(self.parents):
+            for i in ps:
+                children[i].append(j)
+        self._children = tuple(tuple(c) for c in children)
+        self._plans = {}
+
+    def __repr__(self):
+        return 'CompiledNetwork(%d nodes)' % len(self.nodes)
+
+    def _set_cpts(self, cpts):
+        tables, param_shape = [], ()
+        for i, cpt in enumerate(cpts):
+            if isinstance(cpt, StructuredCPD):
+                expected = [self.nodes[p] for p in self.parents[i]]
+                if cpt.variable != self.nodes[i] or sorted(cpt.evidence) != sorted(expected) \
+                        or cpt.variable_card != self.cards[i]:
+                    raise ValueError('Structured CPD %r does not match node %r with parents %r'
+                                     % (cpt, self.nodes[i], expected))
+                tables.append(cpt)
+                continue
+            table = _frozen(cpt)
+            shape = (self.cards[i],) + tuple(self.cards[p] for p in self.parents[i])
+            extra = table.shape[:table.ndim - len(shape)]
+            if table.shape[len(extra):] != shape or (extra and param_shape and extra != param_shape):
+                raise ValueError('CPT of %r has shape %r, expected %r'
+                                 % (self.nodes[i], table.shape, param_shape + shape))
+            param_shape = param_shape or extra
+            tables.append(table)
+        self.cpts = tuple(tables)
+        self.param_shape = param_shape
+        self._set_factors()
+        self._batch_factors = None
+        self._fingerprint = None
+
+    def _set_factors(self):
+        # One factor per dense CPT; a structured CPD contributes its own factors
+        # and hidden variables.
+        var_cards, scopes, tables, owner = list(self.cards), [], [], []
+        for i, cpt in enumerate(self.cpts):
+            if not isinstance(cpt, StructuredCPD):
+                scopes.append((i,) + self.parents[i])
+                tables.append(cpt)
+                owner.append(i)
+                continue
+            local = {name: self.index[name] for name in [cpt.variable] + cpt.evidence}
+            for name, card in cpt.hidden.items():
+                local[name] = len(var_cards)
+                var_cards.append(card)
+            for scope, table in cpt.factors:
+                table = _frozen(table)
+                scopes.append(tuple(local[v] for v in scope))
+                tables.append(table)
+                owner.append(i)
+        if scopes != list(getattr(self, 'factor_scopes', scopes)):
+            # Different factors (another structured CPD): the cached plans do not apply
+            self._plans = {}
+        self.var_cards = tuple(var_cards)
+        self.factor_scopes = tuple(scopes)
+        self.factor_tables = tuple(tables)
+        self.factor_owner = tuple(owner)
+
+    def fingerprint(self):
+        """Stable hex digest of the structure and CPT values of this network."""
+        if self._fingerprint is None:
+            self._fingerprint = _fingerprint(self.nodes, self.cards, self.parents, self.cpts)
+        return self._fingerprint
+
+    def with_cpts(self, cpts):
+        """Return a network with the same structure (and cached plans) but new CPTs.
+
+        ``cpts`` maps variable names to arrays; variables not listed keep their table.
+        """
+        tables = list(self.cpts)
+        for name, table in cpts.items():
+            tables[self._node(name)] = table
+        other = copy.copy(self)
+        other._set_cpts(tables)
+        return other
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Helpers
+    # ------------------------------------------------------------------------------------------------------#
+
+    def _node(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError('Unknown variable %r' % (name,)) from None
+
+    def _state(self, node, value):
+        try:
+            return self._state_index[node][value]
+        except KeyError:
+            raise ValueError('Unknown state %r for variable %r'
+                             % (value, self.nodes[node])) from None
+
+    def _ancestors(self, nodes):
+        # The nodes themselves plus all their ancestors. Everything else is barren
+        # for the query and sums out to one, so it is pruned from the plan.
+        seen = set(nodes)
+        stack = list(nodes)
+        while stack:
+            for p in self.parents[stack.pop()]:
+                if p not in seen:
+                    seen.add(p)
+                    stack.append(p)
+        return seen
+
+    def align_cpd(self, cpd):
+        """Values of a TabularCPD (or its keyword dict) for a node of this network, in the
+        network's parent order."""
+        node = self._node(_variable(cpd))
+        parents = _evidence(cpd)
+        expected = [self.nodes[p] for p in self.parents[node]]
+        if sorted(parents) != sorted(expected):
+            raise ValueError('CPD of %r has parents %r, expected %r'
+                             % (_variable(cpd), parents, expected))
+        values = _values(cpd)
+        axes = [0] + [1 + parents.index(name) for name in expected]
+        return np.transpose(values, axes)
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Planning
+    # ------------------------------------------------------------------------------------------------------#
+
+    def plan(self, variables, observed=()):
+        """Return (and cache) the elimination plan for a query signature."""
+        targets = tuple(self._node(v) for v in variables)
+        if len(set(targets)) != len(targets):
+            raise ValueError('Query variables must be unique')
+        observed = tuple(sorted({self._node(v) for v in observed}))
+        key = (targets, observed)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = self._build_plan(targets, observed)
+        return plan
+
+    def _build_plan(self, targets, observed, join=True):
+        relevant = self._ancestors(set(targets) | set(observed))
+        kept = [f for f, i in enumerate(self.factor_owner) if i in relevant]
+        factors = [('factor', f) for f in kept] + [('evidence', i) for i in observed]
+        scopes = [self.factor_scopes[f] for f in kept] + [(i,) for i in observed]
+
+        # Greedy min-weight elimination: always eliminate the variable whose
+        # combined factor is smallest. A heap with lazy invalidation keeps this
+        # cheap on networks with thousands of nodes.
+        active = dict(enumerate(scopes))
+        holding = {}
+        for fid, scope in active.items():
+            for v in scope:
+                holding.setdefault(v, set()).add(fid)
+
+        def weight(v):
+            union = set()
+            for fid in holding[v]:
+                union.update(active[fid])
+            return math.prod(self.var_cards[u] for u in union)
+
+        remaining = set(holding) - set(targets)
+        current = {v: weight(v) for v in remaining}
+        heap = [(w, v) for v, w in current.items()]
+        heapq.heapify(heap)
+
+        order, steps = [], []
+
+        def chunked(inputs):
+            # Multiply the factors of a large group (e.g. all parents of a noisy-MAX
+            # node) in chunks, so that no contraction exceeds _MAX_OPERANDS.
+            inputs = list(inputs)
+            while len(inputs) > _MAX_OPERANDS:
+                chunk, inputs = inputs[:_MAX_OPERANDS], inputs[_MAX_OPERANDS:]
+                union = []
+                for fid in chunk:
+                    union.extend(u for u in scopes[fid] if u not in union)
+                steps.append((tuple(chunk), _subscripts([scopes[f] for f in chunk], union)))
+                inputs.append(len(scopes))
+                scopes.append(tuple(union))
+            return tuple(inputs)
+
+        while heap:
+            w, v = heapq.heappop(heap)
+            if v not in remaining or current[v] != w:
+                continue
+            remaining.discard(v)
+            inputs = sorted(holding.pop(v))
+            union = []
+            for fid in inputs:
+                union.extend(u for u in active[fid] if u not in union)
+            output = tuple(u for u in union if u != v)
+            grouped = chunked(inputs)
+            steps.append((grouped, _subscripts([scopes[f] for f in grouped], output)))
+            order.append(v)
+
+            new_id = len(scopes)
+            scopes.append(output)
+            for fid in inputs:
+                for u in active.pop(fid):
+                    if u != v:
+                        holding[u].discard(fid)
+            active[new_id] = output
+            for u in output:
+                holding[u].add(new_id)
+                if u in remaining:
+                    current[u] = weight(u)
+                    heapq.heappush(heap, (current[u], u))
+
+        if not join:
+            inputs = tuple(sorted(active))
+            return EliminationPlan(targets, observed, order, factors, steps,
+                                   (inputs, tuple(scopes[f] for f in inputs)))
+        inputs = chunked(sorted(active))
+        final = (inputs, _subscripts([scopes[f] for f in inputs], targets))
+        return EliminationPlan(targets, observed, order, factors, steps, final)
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Execution
+    # ------------------------------------------------------------------------------------------------------#
+
+    def _contract(self, plan, evidence, tables=None):
+        # Run the frozen contractions. ``evidence`` maps node -> likelihood vector.
+        # With many factors the messages can underflow (the probability of a
+        # thousand observations is far below the smallest double), so long plans
+        # divide every message by its maximum. This only scales the result by a
+        # constant per leading index, which the normalization removes.
+        tables = self.factor_tables if tables is None else tables
+        rescale = len(plan.factors) > _RESCALE_FACTORS
+        buf = [tables[i] if kind == 'factor' else evidence[i] for kind, i in plan.factors]
+        for inputs, subscripts in plan.steps:
+            message = np.einsum(subscripts, *[buf[i] for i in inputs])
+            if rescale:
+                message, _ = _rescale(message, subscripts)
+            buf.append(message)
+        inputs, subscripts = plan.final
+        return np.einsum(subscripts, *[buf[i] for i in inputs])
+
+    def _messages(self, plan, evidence, tables=None):
+        # Like _contract, for callers that need absolute values (P(evidence), MAP
+        # scores): every message is divided by its maximum and the log of that
+        # scale is kept. Returns all factors and messages and their log scales
+        # (arrays over the leading axes).
+        tables = self.factor_tables if tables is None else tables
+        buf = [tables[i] if kind == 'factor' else evidence[i] for kind, i in plan.factors]
+        scale = [0.0] * len(buf)
+        for inputs, subscripts in plan.steps:
+            message, log_peak = _rescale(np.einsum(subscripts, *[buf[i] for i in inputs]), subscripts)
+            buf.append(message)
+            scale.append(sum(scale[i] for i in inputs) + log_peak)
+        return buf, scale
+
+    def query(self, variables, evidence=None):
+        """P(variables | evidence) as an array with one axis per query variable.
+
+        ``evidence`` maps variable names to observed states, as in
+        ``bn.inference.fit(model, variables=[...], evidence={...})``.
+        """
+        vectors, _ = self._likelihoods(evidence or {})
+        plan = self.plan(variables, [self.nodes[i] for i in vectors])
+        return self._normalize(self._contract(plan, vectors), len(plan.targets))
+
+    def query_batch(self, variables, evidence, columns=None, missing=MISSING):
+        """P(variables | evidence) for every row of an (N x columns) evidence matrix.
+
+        Each row holds the observed state index of the node in the matching
+        column, or ``missing`` when that node is not observed. All rows are
+        scored by the same contractions with a leading batch axis, so the
+        result has shape ``(*param_shape, N, *cards of variables)``.
+        """
+        evidence = np.asarray(evidence)
+        vectors, _ = self._likelihoods(evidence, columns, missing)
+        plan = self.plan(variables, [self.nodes[i] for i in vectors])
+        result = self._normalize(self._contract(plan, vectors, self._batched_factors()),
+                                 len(plan.targets))
+        if not vectors:
+            # Nothing observed in any row: the contraction has no batch axis (or a
+            # singleton one from stacked CPTs); every row gets the prior
+            cards = result.shape[result.ndim - len(plan.targets):]
+            result = np.repeat(result.reshape(self.param_shape + (1,) + cards), len(evidence),
+                               axis=len(self.param_shape))
+        return result
+
+    def _likelihoods(self, evidence, columns=None, missing=MISSING):
+        # Likelihood vector per observed node for an evidence dict, or (N x card)
+        # vectors for an (N x columns) evidence matrix (all ones where ``missing``).
+        # Returns the vectors and whether they are batched.
+        vectors = {}
+        if isinstance(evidence, dict):
+            for name, value in evidence.items():
+                node = self._node(name)
+                vectors[node] = np.eye(self.cards[node])[self._state(node, value)]
+            return vectors, False
+        columns = self.nodes if columns is None else tuple(columns)
+        evidence = np.asarray(evidence)
+        if evidence.ndim != 2 or evidence.shape[1] != len(columns):
+            raise ValueError('Evidence must have shape (N, %d)' % len(columns))
+        for j, name in enumerate(columns):
+            node = self._node(name)
+            values = evidence[:, j]
+            unobserved = values == missing
+            if unobserved.all():
+                continue
+            if ((values < 0) | (values >= self.cards[node]))[~unobserved].any():
+                raise ValueError('Evidence for %r outside 0..%d' % (name, self.cards[node] - 1))
+            states = np.arange(self.cards[node])
+            vectors[node] = ((values[:, None] == states) | unobserved[:, None]).astype(float)
+        return vectors, True
+
+    def _batched_factors(self):
+        # Stacked CPTs get a singleton axis after the parameter axes so that
+        # they broadcast against the batch axis of the evidence vectors: the
+        # result then has shape (*param_shape, N, ...).
+        if not self.param_shape:
+            return self.factor_tables
+        if self._batch_factors is None:
+            k = len(self.param_shape)
+            self._batch_factors = tuple(
+                np.expand_dims(t, k) if t.ndim > len(scope) else t
+                for scope, t in zip(self.factor_scopes, self.factor_tables))
+        return self._batch_factors
+
+    @staticmethod
+    def _normalize(joint, n_targets):
+        axes = tuple(range(joint.ndim - n_targets, joint.ndim))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return joint / joint.sum(axis=axes, keepdims=True)
+
+    def evidence_matrix(self, records, columns=None, missing=MISSING):
+        """Stack evidence dicts (one per device) into a matrix for query_batch."""
+        columns = self.nodes if columns is None else tuple(columns)
+        nodes = [self._node(name) for name in columns]
+        matrix = np.full((len(records), len(columns)), missing, dtype=np.int64)
+        position = dict(zip(columns, range(len(columns))))
+        for row, record in enumerate(records):
+            for name, value in record.items():
+                if name not in position:
+                    raise KeyError('Variable %r is not one of the evidence columns' % (name,))
+                j = position[name]
+                matrix[row, j] = self._state(nodes[j], value)
+        return matrix
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Model fingerprints
+# ------------------------------------------------------------------------------------------------------#
+
+def _fingerprint(nodes, cards, parents, cpts):
+    digest = hashlib.sha1()
+    for name, card, pa, cpt in zip(nodes, cards, parents, cpts):
+        if isinstance(cpt, StructuredCPD):
+            # The factors define the distribution; the class is not part of it
+            digest.update(repr((name, card, tuple(pa), 'structured')).encode())
+            for scope, table in cpt.factors:
+                table = np.ascontiguousarray(table, dtype=float)
+                digest.update(repr((scope, table.shape)).encode())
+                digest.update(table.tobytes())
+            continue
+        table = np.ascontiguousarray(cpt, dtype=float)
+        digest.update(repr((name, card, tuple(pa), table.shape)).encode())
+        digest.update(table.tobytes())
+    return digest.hexdigest()
+
+
+def model_fingerprint(model):
+    """Fingerprint of a CompiledNetwork or anything compile_model accepts.
+
+    Any change to a CPT value or to the structure gives a different fingerprint.
+    """
+    if isinstance(model, CompiledNetwork):
+        return model.fingerprint()
+    cpds = sorted(_get_cpds(model), key=_variable)
+    return _fingerprint([_variable(cpd) for cpd in cpds],
+                        [_card(cpd) for cpd in cpds],
+                        [tuple(_evidence(cpd)) for cpd in cpds],
+                        [cpd if isinstance(cpd, StructuredCPD) else _values(cpd) for cpd in cpds])
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Compile a bnlearn / pgmpy model
+# ------------------------------------------------------------------------------------------------------#
+
+def _get_cpds(model):
+    # Accept the dict returned by bn.make_DAG, a pgmpy model or a list of TabularCPDs,
+    # TabularCPD keyword dicts and StructuredCPDs
+    if isinstance(model, dict):
+        model = model['model']
+    if hasattr(model, 'get_cpds'):
+        return list(model.get_cpds())
+    return list(model)
+
+
+def _variable(cpd):
+    return cpd['variable'] if isinstance(cpd, dict) else cpd.variable
+
+
+def _card(cpd):
+    if isinstance(cpd, StructuredCPD):
+        return cpd.variable_card
+    if isinstance(cpd, dict):
+        return int(cpd['variable_card'])
+    return int(cpd.cardinality[0])
+
+
+def _evidence(cpd):
+    if isinstance(cpd, StructuredCPD):
+        return list(cpd.evidence)
+    if isinstance(cpd, dict):
+        return list(cpd.get('evidence') or [])
+    return list(cpd.variables[1:])
+
+
+def _values(cpd):
+    # The values of a TabularCPD or keyword dict with the pgmpy layout (card, *parent cards)
+    if isinstance(cpd, dict):
+        shape = [_card(cpd)] + [int(c) for c in cpd.get('evidence_card') or []]
+        return np.asarray(cpd['values'], dtype=float).reshape(shape)
+    return np.asarray(cpd.values, dtype=float)
+
+
+def _entry(cpd):
+    # (card, parent names, values or the StructuredCPD, state names) for _compile
+    card = _card(cpd)
+    if isinstance(cpd, StructuredCPD):
+        return card, _evidence(cpd), cpd, list(range(card))
+    names = (cpd.get('state_names') if isinstance(cpd, dict) else getattr(cpd, 'state_names', None)) or {}
+    return card, _evidence(cpd), _values(cpd), list(names.get(_variable(cpd), range(card)))
+
+
+def _compile(entries):
+    # entries: {name: (card, parent names, values with pgmpy layout, state names)}
+    order, placed = [], set()
+    pending = list(entries)
+    while pending:
+        progressed = False
+        for name in list(pending):
+            parents = entries[name][1]
+            missing = [p for p in parents if p not in entries]
+            if missing:
+                raise ValueError('No CPD defined for %r (parent of %r)' % (missing[0], name))
+            if all(p in placed for p in parents):
+                order.append(name)
+                placed.add(name)
+                pending.remove(name)
+                progressed = True
+        if not progressed:
+            raise ValueError('The CPDs do not form a DAG')
+
+    index = {name: i for i, name in enumerate(order)}
+    cards, parents, cpts, state_names = [], [], [], []
+    for name in order:
+        card, pa, values, names = entries[name]
+        cards.append(card)
+        parents.append([index[p] for p in pa])
+        cpts.append(values)
+        state_names.append(names)
+    return CompiledNetwork(order, cards, parents, cpts, state_names)
+
+
+def compile_model(model):
+    """Compile a bnlearn/pgmpy model (or a list of TabularCPDs, their keyword dicts and
+    StructuredCPDs) into a CompiledNetwork."""
+    return _compile({_variable(cpd): _entry(cpd) for cpd in _get_cpds(model)})
+
+
+def compile_tables(tables):
+    """Compile CPTs given as TabularCPD keyword dicts, without importing pgmpy.
+
+    Each table is ``dict(variable=..., variable_card=..., values=[[...]], evidence=[...],
+    evidence_card=[...])``, i.e. the arguments that would be passed to TabularCPD.
+    StructuredCPDs may be mixed in.
+    """
+    return _compile({_variable(table): _entry(table) for table in tables})
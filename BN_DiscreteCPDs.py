@@ -10,18 +10,21 @@
 #    estimate the conditional probability distributions of the individual variables.
 # - Inference: Given the learned model determine the exact probability values for our queries.
 # %  *
+# %  *  The module can be imported without side effects: the CPTs are plain data and the
+# %  *  networks are built by the factory functions below. bnlearn, pgmpy, networkx and
+# %  *  matplotlib are only imported by the functions that need them (make_cpds, make_model,
+# %  *  plot_structure, print_cpds, compare_networks); make_network only needs NumPy.
+# %  *  BN_Compare.py measures how differently the cases behave (KL, Hellinger, TV).
+# %  *  Running the file as a script performs the original steps (see main()).
+# %  *
 # %  *  Written:       1September2021
 # %  *  Last updated:  5October2021
 # %  *
 # %  **************************************************************************** */
 
-
-import bnlearn as bn
-# Import the library
-from pgmpy.factors.discrete import TabularCPD
-
-import networkx as nx
-import matplotlib.pyplot as plt
+from BN_Compare import compare_joint, pairwise
+from BN_Compiled import compile_tables
+from BN_Scenarios import compile_scenarios
 
 # ------------------------------------------------------------------------------------------------------#
 # Firstly, Define the structure- the causal dependencies of the system.
@@ -34,54 +37,41 @@ import matplotlib.pyplot as plt
 # x19; x20; x21 represent robustness, security, privacy, and x22 represent trust.
 # ------------------------------------------------------------------------------------------------------#
 
-dag= nx.DiGraph()
-map(dag.add_node,range(6))
-pos={0:(-5,0),1:(-4,0),2:(-3,0),3:(-2,0),4:(-1,0),5:(0,0),6:(1,0),7:(2,0),8:(3,0),9:(4,0),10:(5,0),11:(6,0),
-     12:(-4,-0.2),13:(-2.5,-0.2),14:(-0.5,-0.2),15:(1.5,-0.2),16:(3,-0.2),17:(4,-0.2),
-     18:(-1.5,-0.6), 19:(0,-0.6),20:(1.5,-0.6),21:(0,-1)
-     }
-nx.draw(dag, pos)
-nx.draw_networkx_edges(dag,pos,
-edgelist=[(0,12),(1,12),(1,13),(2, 13),(3,13),
-(4,13),(4,14),(4,14),(5, 15),(6, 15),(7,15),
-(8,15),(8,16),(9,16),(10,17),(11,17),
-(12,18),(13,18),(13,19),(14,19),(15,19),
-(16,20),(17,20),(18,21) ,(19,21),(20,21)],edge_color='r')
-
-
-nx.draw_networkx_nodes(dag,pos, nodelist=[0,1,2,3,4,5,6,7,8,9,10,11],
-node_color='y',
-node_size=500,
-alpha=0.8)
-nx.draw_networkx_nodes(dag,pos, nodelist=[12,13,14,15,16,17,18,19,20,21],
-node_color='b',
-node_size=500,
-alpha=0.8)
-labels={}
-labels[0]=r'$x1$'
-labels[1]=r'$x2$'
-labels[2]=r'$x3$'
-labels[3]=r'$x4$'
-labels[4]=r'$x5$'
-labels[5]=r'$x6$'
-labels[6]=r'$x7$'
-labels[7]=r'$x8$'
-labels[8]=r'$x9$'
-labels[9]=r'$x10$'
-labels[10]=r'$x11$'
-labels[11]=r'$x12$'
-labels[12]=r'$x13$'
-labels[13]=r'$x14$'
-labels[14]=r'$x15$'
-labels[15]=r'$x16$'
-labels[16]=r'$x17$'
-labels[17]=r'$x18$'
-labels[18]=r'$x19$'
-labels[19]=r'$x20$'
-labels[20]=r'$x21$'
-labels[21]=r'$x22$'
-nx.draw_networkx_labels(dag, pos, labels, font_size=12)
-plt.show()
+def plot_structure(show=True):
+    """Draw the 22-node layout of the trust network (x1..x22) with networkx."""
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    dag= nx.DiGraph()
+    map(dag.add_node,range(6))
+    pos={0:(-5,0),1:(-4,0),2:(-3,0),3:(-2,0),4:(-1,0),5:(0,0),6:(1,0),7:(2,0),8:(3,0),9:(4,0),10:(5,0),11:(6,0),
+         12:(-4,-0.2),13:(-2.5,-0.2),14:(-0.5,-0.2),15:(1.5,-0.2),16:(3,-0.2),17:(4,-0.2),
+         18:(-1.5,-0.6), 19:(0,-0.6),20:(1.5,-0.6),21:(0,-1)
+         }
+    nx.draw(dag, pos)
+    nx.draw_networkx_edges(dag,pos,
+    edgelist=[(0,12),(1,12),(1,13),(2, 13),(3,13),
+    (4,13),(4,14),(4,14),(5, 15),(6, 15),(7,15),
+    (8,15),(8,16),(9,16),(10,17),(11,17),
+    (12,18),(13,18),(13,19),(14,19),(15,19),
+    (16,20),(17,20),(18,21) ,(19,21),(20,21)],edge_color='r')
+
+
+    nx.draw_networkx_nodes(dag,pos, nodelist=[0,1,2,3,4,5,6,7,8,9,10,11],
+    node_color='y',
+    node_size=500,
+    alpha=0.8)
+    nx.draw_networkx_nodes(dag,pos, nodelist=[12,13,14,15,16,17,18,19,20,21],
+    node_color='b',
+    node_size=500,
+    alpha=0.8)
+    labels={}
+    for i in range(22):
+        labels[i]=r'$x%d$' % (i + 1)
+    nx.draw_networkx_labels(dag, pos, labels, font_size=12)
+    if show:
+        plt.show()
+    return dag
 
 
 # Define the causal dependencies based on your expert/domain knowledge.
@@ -111,18 +101,6 @@ edges = [('memory', 'performance'),
         ('trust1', 'trust'),
         ('privacy', 'trust')]
 
-# Create the DAG
-DAG = bn.make_DAG(edges)
-
-# Plot the DAG (static)
-#bn.plot(DAG)
-
-# Plot the DAG (interactive)
-#bn.plot(DAG, interactive=True)
-
-# DAG is stored in an adjacency matrix
-DAG["adjmat"]
-
 # ------------------------------------------------------------------------------------------------------#
 # Next, we start building the probability table for non-descendant Nodes
 # (i.e. the nodes that have no parents) and no dependencies
@@ -134,64 +112,55 @@ DAG["adjmat"]
 # from an expert view - witnessed 70% of the time memory consumption is high.
 # As the probabilities should add up to 1, low consumption should be 30% of the time.
 # The CPT for memory looks as following:
-cpt_memory = TabularCPD(variable='memory', variable_card=2, values=[[0.7], [0.3]])
-print(cpt_memory)
+cpt_memory = dict(variable='memory', variable_card=2, values=[[0.7], [0.3]])
 
 # Power Node
 # The power node has two states (high or low (consumption)). Calculating the probability
 # from an expert view - witnessed 60% of the time power consumption is high.
 # As the probabilities should add up to 1, low consumption should be 40% of the time.
-cpt_power = TabularCPD(variable='power', variable_card=2, values=[[0.6], [0.4]])
-print(cpt_power)
+cpt_power = dict(variable='power', variable_card=2, values=[[0.6], [0.4]])
 
 # RSSI Node
 # The rssi node has two states (high or low (strength)). Calculating the probability
 # from an expert view - witnessed 50% of the time signal strength is high.
 # As the probabilities should add up to 1, low consumption should be 50% of the time.
-cpt_rssi = TabularCPD(variable='rssi', variable_card=2, values=[[0.5], [0.5]])
-print(cpt_rssi)
+cpt_rssi = dict(variable='rssi', variable_card=2, values=[[0.5], [0.5]])
 
 # Latency Node
 # The latency node has two states (high or low (strength)). Calculating the probability
 # from an expert view - witnessed 70% of the time signal latency is low .
 # As the probabilities should add up to 1, low consumption should be 30% of the time the latency is high.
-cpt_latency = TabularCPD(variable='latency', variable_card=2, values=[[0.3], [0.7]])
-print(cpt_latency)
+cpt_latency = dict(variable='latency', variable_card=2, values=[[0.3], [0.7]])
 
 # Confidentiality Node
 # The confidentiality node has two states (high or low (encryption)). Calculating the probability
 # from an expert view - witnessed 60% of the time the system has high encryption and 40% of the time conf. is low.
-cpt_confidentiality = TabularCPD(variable='confidentiality', variable_card=2, values=[[0.4], [0.6]])
-print(cpt_confidentiality)
+cpt_confidentiality = dict(variable='confidentiality', variable_card=2, values=[[0.4], [0.6]])
 
 # Integrity Node
 # The integrity node has two states (high or low (high means high chance that no outsider can change sensor data))
 # Calculating the probability from an expert view - witnessed 80% of the time
 # the system has high encryption and 20% of the time integrity. is low.
-cpt_integrity = TabularCPD(variable='integrity', variable_card=2, values=[[0.2], [0.8]])
-print(cpt_integrity)
+cpt_integrity = dict(variable='integrity', variable_card=2, values=[[0.2], [0.8]])
 
 # Compliance Node
 # The Compliance node has two states (high or low (high means high chance that system is compliant with security
 # standards & protocols). Calculating the probability from an expert view - witnessed 90% of the time
 # the system is compliant and 10% of the time compliance. is low.
-cpt_compliance = TabularCPD(variable='compliance', variable_card=2, values=[[0.1], [0.9]])
-print(cpt_compliance)
+cpt_compliance = dict(variable='compliance', variable_card=2, values=[[0.1], [0.9]])
 
 # Threatsafe Node
 # The threatsafe node has two states (high or low (high means high chance that no threat happens/system is safe.
 # Calculating the probability from an expert view - witnessed 60% of the time
 # the system is safe and 40% of the time integrity. is low.
-cpt_threatsafe = TabularCPD(variable='threatsafe', variable_card=2, values=[[0.4], [0.6]])
-print(cpt_threatsafe)
+cpt_threatsafe = dict(variable='threatsafe', variable_card=2, values=[[0.4], [0.6]])
 
 
 # # Datastorage Node
 # # The datastorage node has two states (high or low (high means high chance that data stored is safe.
 # # Calculating the probability from an expert view - witnessed 60% of the time
 # # the system is safe and 40% of the time integrity. is low.
-# cpt_datastorage = TabularCPD(variable='datastorage', variable_card=2, values=[[0.4], [0.6]])
-# print(cpt_datastorage)
+# cpt_datastorage = dict(variable='datastorage', variable_card=2, values=[[0.4], [0.6]])
 #
 #
 # # DataUsage Node
@@ -199,24 +168,21 @@ print(cpt_threatsafe)
 # # specific application and not used for unrelated purpose.
 # # Calculating the probability from an expert view - witnessed 80% of the time
 # # the data is not used for unethical purpose while 20% of the time is use was not clear.
-# cpt_datausage = TabularCPD(variable='datausage', variable_card=2, values=[[0.2], [0.8]])
-# print(cpt_datausage)
+# cpt_datausage = dict(variable='datausage', variable_card=2, values=[[0.2], [0.8]])
 
 
 # Transparent Node
 # The Transparent node has two states (high or low (high means the data flow is transparent to the
 # patient and primary SH.Calculating the probability from an expert view - witnessed 60% of the time
 # the system is safe and 40% of the time data flow is not transparent.
-cpt_transparent = TabularCPD(variable='transparent', variable_card=2, values=[[0.4], [0.6]])
-print(cpt_transparent)
+cpt_transparent = dict(variable='transparent', variable_card=2, values=[[0.4], [0.6]])
 
 
 # Anonymize Node
 # The Anonymize node has two states (high or low (high means high chance that patients private data is anonymized .
 # Calculating the probability from an expert view - witnessed 40% of the time
 # the data was strongly anonymized and 60% of the time not.
-# cpt_anonymize = TabularCPD(variable='anonymize', variable_card=2, values=[[0.6], [0.4]])
-# print(cpt_anonymize)
+# cpt_anonymize = dict(variable='anonymize', variable_card=2, values=[[0.6], [0.4]])
 
 
 # ------------------------------------------------------------------------------------------------------#
@@ -228,12 +194,11 @@ print(cpt_transparent)
 # The performance  node has two states and is conditioned by two-parent nodes; memory and power.
 # Here we define the probability of performance given the state of memory and power.
 # In total, we have to specify 8 conditional probabilities (2 states ^ 3 nodes).
-cpt_performance = TabularCPD(variable='performance', variable_card=2,
+cpt_performance = dict(variable='performance', variable_card=2,
                              values=[[0.9, 0.6, 0.6, 0.1],
                                      [0.1, 0.4, 0.4, 0.9]],
                              evidence=['memory', 'power'],
                              evidence_card=[2, 2])
-print(cpt_performance)
 
 
 # Reliability Node
@@ -241,51 +206,46 @@ print(cpt_performance)
 # Here we define the probability of performance given the state of memory,latency and rssi.
 # In total, we have to specify 16 conditional probabilities (2 states ^ 4 nodes).
 # 3 evidence is still showing error , so for now using 2 evidence, as shown below
-# cpt_reliability = TabularCPD(variable='reliability', variable_card=2,
+# cpt_reliability = dict(variable='reliability', variable_card=2,
 #                       values=[[0.3,0.1,0.7,0.4,0.6,0.4,0.99,0.7],
 #                               [0.7,0.9,0.3,0.6,0.4,0.6,0.01,0.3]],
 #                       evidence=['memory','latency', 'rssi'], evidence_card=[3,2])
-cpt_reliability = TabularCPD(variable='reliability', variable_card=2,
+cpt_reliability = dict(variable='reliability', variable_card=2,
                              values=[[0.9, 0.6, 0.6, 0.1],
                                      [0.1, 0.4, 0.4, 0.9]],
                              evidence=['latency', 'rssi'], evidence_card=[2, 2])
-print(cpt_reliability)
 
 
 
 # Operations Node
-cpt_operations = TabularCPD(variable='operations', variable_card=2,
+cpt_operations = dict(variable='operations', variable_card=2,
                             values=[[0.9, 0.5, 0.5, 0.01],
                                     [0.1, 0.5, 0.5, 0.99]],
                             evidence=['confidentiality', 'integrity'],
                             evidence_card=[2, 2])
-print(cpt_operations)
 
 
 # Standards Node
-cpt_standards = TabularCPD(variable='standards', variable_card=2,
+cpt_standards = dict(variable='standards', variable_card=2,
                             values=[[0.9, 0.5, 0.5, 0.01],
                                     [0.1, 0.5, 0.5, 0.99]],
                             evidence=['compliance', 'threatsafe'],
                             evidence_card=[2, 2])
-print(cpt_standards)
 
 # Reuse Node
-# cpt_reuse = TabularCPD(variable='reuse', variable_card=2,
+# cpt_reuse = dict(variable='reuse', variable_card=2,
 #                             values=[[0.9, 0.6, 0.6, 0.01],
 #                                     [0.1, 0.4, 0.4, 0.99]],
 #                             evidence=['datastorage', 'datausage'],
 #                             evidence_card=[2, 2])
-# print(cpt_reuse)
 
 
 # Protection Node
-# cpt_protection = TabularCPD(variable='protection', variable_card=2,
+# cpt_protection = dict(variable='protection', variable_card=2,
 #                             values=[[0.9, 0.6, 0.6, 0.01],
 #                                     [0.1, 0.4, 0.4, 0.99]],
 #                             evidence=['transparent', 'anonymize'],
 #                             evidence_card=[2, 2])
-# print(cpt_protection)
 
 
 # ------------------------------------------------------------------------------------------------------#
@@ -293,183 +253,226 @@ print(cpt_standards)
 # ------------------------------------------------------------------------------------------------------#
 
 # Robustness Node
-cpt_robustness = TabularCPD(variable='robustness', variable_card=2,
+cpt_robustness = dict(variable='robustness', variable_card=2,
                             values=[[0.6, 0.5, 0.5, 0.4],
                                     [0.4, 0.5, 0.5, 0.6]],
                             evidence=['performance', 'reliability'],
                             evidence_card=[2, 2])
-print(cpt_robustness)
 
-cpt_robustnessbest = TabularCPD(variable='robustness', variable_card=2,
+cpt_robustnessbest = dict(variable='robustness', variable_card=2,
                             values=[[1, 0.6, 0.6, 0.01],
                                     [0, 0.4, 0.4, 0.99]],
                             evidence=['performance', 'reliability'],
                             evidence_card=[2, 2])
-print(cpt_robustnessbest)
 
-cpt_robustnessworst = TabularCPD(variable='robustness', variable_card=2,
+cpt_robustnessworst = dict(variable='robustness', variable_card=2,
                             values=[[0, 0.5, 0.6, 0.5],
                                     [1, 0.5, 0.4, 0.5]],
                             evidence=['performance', 'reliability'],
                             evidence_card=[2, 2])
-print(cpt_robustnessworst)
 
 # Security Node
-cpt_security = TabularCPD(variable='security', variable_card=2,
+cpt_security = dict(variable='security', variable_card=2,
                             values=[[0.6, 0.5, 0.5, 0.4],
                                     [0.4, 0.5, 0.5, 0.6]],
                             evidence=['operations', 'standards'],
                             evidence_card=[2, 2])
-print(cpt_security)
 ##
-cpt_securitybest = TabularCPD(variable='security', variable_card=2,
+cpt_securitybest = dict(variable='security', variable_card=2,
                             values=[[1, 0.1, 0.1, 0.01],
                                     [0, 0.9, 0.9, 0.99]],
                             evidence=['operations', 'standards'],
                             evidence_card=[2, 2])
-print(cpt_securitybest)
 
 ##
-cpt_securityworst = TabularCPD(variable='security', variable_card=2,
+cpt_securityworst = dict(variable='security', variable_card=2,
                             values=[[0.2, 0.1, 0.1, 0.6],
                                     [0.8, 0.9, 0.9, 0.4]],
                             evidence=['operations', 'standards'],
                             evidence_card=[2, 2])
-print(cpt_securityworst)
 
 #Privacy Node
-cpt_privacy = TabularCPD(variable='privacy', variable_card=2,
+cpt_privacy = dict(variable='privacy', variable_card=2,
                          values=[[0.6, 0.3],
                                  [0.4, 0.7]],
                          evidence=['transparent'], evidence_card=[2])
-print(cpt_privacy)
 
 #Privacy Node
-cpt_privacybest = TabularCPD(variable='privacy', variable_card=2,
+cpt_privacybest = dict(variable='privacy', variable_card=2,
                          values=[[0.8, 0.2],
                                  [0.2, 0.8]],
                          evidence=['transparent'], evidence_card=[2])
-print(cpt_privacybest)
 
 
 
 ##
-cpt_privacyworst = TabularCPD(variable='privacy', variable_card=2,
+cpt_privacyworst = dict(variable='privacy', variable_card=2,
                          values=[[0.4, 0.5],
                                  [0.6, 0.5]],
                          evidence=['transparent'], evidence_card=[2])
-print(cpt_privacyworst)
 
 
-# cpt_privacy = TabularCPD(variable='privacy', variable_card=2,
+# cpt_privacy = dict(variable='privacy', variable_card=2,
 #                             values=[[1, 0.1, 0.1, 0.01],
 #                                     [0, 0.9, 0.9, 0.99]],
 #                             evidence=['reuse', 'protection'],
 #                             evidence_card=[2, 2])
-# print(cpt_privacy)
 
 
 # ------------------------------------------------------------------------------------------------------#
 # Fourthly, we build the probability table for Trust#
 # ------------------------------------------------------------------------------------------------------#
 # Trust1 Node
-cpt_trust1 = TabularCPD(variable='trust1', variable_card=2,
+cpt_trust1 = dict(variable='trust1', variable_card=2,
                        values=[[1, 0.7, 0.7, 0.01],
                                 [0, 0.3, 0.3, 0.99]],
                         evidence=['robustness', 'security'],
                             #evidence=['robustness', 'security', 'privacy'],
                             evidence_card=[2,2])
-print(cpt_trust1)
 
 # Trust Node
-cpt_trust = TabularCPD(variable='trust', variable_card=2,
+cpt_trust = dict(variable='trust', variable_card=2,
                        values=[[0.9, 0.1, 0.1, 0.01],
                              [0.1, 0.9, 0.9, 0.99]],
                         evidence=['trust1', 'privacy'],
                             #evidence=['robustness', 'security', 'privacy'],
                             evidence_card=[2,2])
-print(cpt_trust)
 
-# cpt_trust = TabularCPD(variable='trust', variable_card=2,
+# cpt_trust = dict(variable='trust', variable_card=2,
 #                        values=[[0.9, 0.1, 0.1, 0.01],
 #                                 [0.1, 0.9, 0.9, 0.99]],
 #                         evidence=['trust1', 'privacy'],
 #                             #evidence=['robustness', 'security', 'privacy'],
 #                             evidence_card=[2,2])
-#print(cpt_trust)
-
-
 
 # ------------------------------------------------------------------------------------------------------#
 # Fifth,, we Update DAG with the CPTs
+# The three cases share all CPTs except robustness, security and privacy.
 # ------------------------------------------------------------------------------------------------------#
 
-# model = bn.make_DAG(DAG, CPD=[cpt_memory, cpt_power, cpt_rssi, cpt_latency, cpt_confidentiality,cpt_integrity, cpt_compliance, cpt_threatsafe,
-#                                 cpt_reliability, cpt_performance, cpt_operations, cpt_standards,
-#                               cpt_robustness,cpt_security,
-#                               cpt_trust1,  cpt_trust])
-
-modelactual = bn.make_DAG(DAG, CPD=[cpt_memory, cpt_power, cpt_rssi, cpt_latency, cpt_confidentiality,cpt_integrity, cpt_compliance,
-                              cpt_threatsafe,
-                              #cpt_datausage, cpt_datastorage,
-                              cpt_transparent, #cpt_anonymize,
-                              cpt_reliability, cpt_performance, cpt_operations, cpt_standards,
-                              #cpt_reuse,
-                              #cpt_protection,
-                              cpt_robustness,cpt_security,cpt_privacy, cpt_trust1,
-                              cpt_trust])
-
-# Print the CPTs
-bn.print_CPD(modelactual)
-#
+_shared = [cpt_memory, cpt_power, cpt_rssi, cpt_latency, cpt_confidentiality,cpt_integrity, cpt_compliance,
+           cpt_threatsafe,
+           #cpt_datausage, cpt_datastorage,
+           cpt_transparent, #cpt_anonymize,
+           cpt_reliability, cpt_performance, cpt_operations, cpt_standards,
+           #cpt_reuse,
+           #cpt_protection,
+           ]
 
-modelbest = bn.make_DAG(DAG, CPD=[cpt_memory, cpt_power, cpt_rssi, cpt_latency, cpt_confidentiality,cpt_integrity, cpt_compliance,
-                              cpt_threatsafe,
-                              #cpt_datausage, cpt_datastorage,
-                              cpt_transparent, #cpt_anonymize,
-                              cpt_reliability, cpt_performance, cpt_operations, cpt_standards,
-                              #cpt_reuse,
-                              #cpt_protection,
-                              cpt_robustnessbest,cpt_securitybest,cpt_privacybest, cpt_trust1,
-                              cpt_trust])
-# Print the CPTs
-bn.print_CPD(modelbest)
-
-
-modelworst= bn.make_DAG(DAG, CPD=[cpt_memory, cpt_power, cpt_rssi, cpt_latency, cpt_confidentiality,cpt_integrity, cpt_compliance,
-                              cpt_threatsafe,
-                              #cpt_datausage, cpt_datastorage,
-                              cpt_transparent, #cpt_anonymize,
-                              cpt_reliability, cpt_performance, cpt_operations, cpt_standards,
-                              #cpt_reuse,
-                              #cpt_protection,
-                              cpt_robustnessworst,cpt_securityworst,cpt_privacyworst, cpt_trust1,
-                              cpt_trust])
-# Print the CPTs
-bn.print_CPD(modelworst)
+CASES = {'actual': _shared + [cpt_robustness, cpt_security, cpt_privacy, cpt_trust1, cpt_trust],
+         'best': _shared + [cpt_robustnessbest, cpt_securitybest, cpt_privacybest, cpt_trust1, cpt_trust],
+         'worst': _shared + [cpt_robustnessworst, cpt_securityworst, cpt_privacyworst, cpt_trust1, cpt_trust]}
 
-# ------------------------------------------------------------------------------------------------------#
-# Finally, we start making Inferences
-# ------------------------------------------------------------------------------------------------------#
 
-# # Make inference on robustness given power is high
-q1 = bn.inference.fit(modelworst, variables=['trust'], evidence={'robustness': 0})
-print(q1.df)
-# q2 = bn.inference.fit(modelbest, variables=['trust1'], evidence={'robustness': 0})
-# print(q2.df)
-#
-# q3 = bn.inference.fit(modelactual, variables=['trust'], evidence={'privacy': 1})
-# print(q3.df)
-q4 = bn.inference.fit(modelbest, variables=['trust'], evidence={'security': 1})
-print(q4.df)
+def make_network(case='actual'):
+    """CompiledNetwork of one case ('actual', 'best' or 'worst'); only needs NumPy."""
+    return compile_tables(CASES[case])
 
 
-# ------------------------------------------------------------------------------------------------------#
-# Lastly, we compare the models
-# ------------------------------------------------------------------------------------------------------#
-# Compare networks and make plot
-#bn.compare_networks(modelactual, modelbest, pos=DAG['pos'])
-# bn.compare_networks(modelbest, modelactual)
-# bn.compare_networks(modelactual,modelbest)
-bn.compare_networks(modelworst,modelbest)
-# bn.compare_networks(modelworst,modelactual)
+def make_scenarios(cases=('actual', 'best', 'worst')):
+    """ScenarioNetwork with the given cases stacked along the scenario axis."""
+    return compile_scenarios({case: make_network(case) for case in cases})
+
+
+def make_cpds(case='actual'):
+    """The pgmpy TabularCPDs of one case."""
+    from pgmpy.factors.discrete import TabularCPD
+
+    return [TabularCPD(**cpt) for cpt in CASES[case]]
+
+
+def make_model(case='actual'):
+    """bnlearn model (DAG + CPDs) of one case, as built with bn.make_DAG."""
+    import bnlearn as bn
+
+    DAG = bn.make_DAG(edges)
+    return bn.make_DAG(DAG, CPD=make_cpds(case))
+
+
+def print_cpds(model):
+    """Print the CPTs of a bnlearn model."""
+    import bnlearn as bn
+
+    bn.print_CPD(model)
+
+
+def compare_networks(model1, model2, **kwargs):
+    """Structural comparison plot of two bnlearn models (bn.compare_networks).
+
+    For how differently the models behave, see compare_joint and pairwise."""
+    import bnlearn as bn
+
+    return bn.compare_networks(model1, model2, **kwargs)
+
+
+def main():
+    import bnlearn as bn
+
+    plot_structure()
+
+    # Create the DAG
+    DAG = bn.make_DAG(edges)
+
+    # Plot the DAG (static)
+    #bn.plot(DAG)
+
+    # Plot the DAG (interactive)
+    #bn.plot(DAG, interactive=True)
+
+    # DAG is stored in an adjacency matrix
+    DAG["adjmat"]
+
+    # Print the CPTs
+    modelactual = make_model('actual')
+    print_cpds(modelactual)
+    modelbest = make_model('best')
+    print_cpds(modelbest)
+    modelworst = make_model('worst')
+    print_cpds(modelworst)
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Finally, we start making Inferences
+    # ------------------------------------------------------------------------------------------------------#
+
+    # # Make inference on robustness given power is high
+    q1 = bn.inference.fit(modelworst, variables=['trust'], evidence={'robustness': 0})
+    print(q1.df)
+    # q2 = bn.inference.fit(modelbest, variables=['trust1'], evidence={'robustness': 0})
+    # print(q2.df)
+    #
+    # q3 = bn.inference.fit(modelactual, variables=['trust'], evidence={'privacy': 1})
+    # print(q3.df)
+    q4 = bn.inference.fit(modelbest, variables=['trust'], evidence={'security': 1})
+    print(q4.df)
+
+    # For repeated queries, compile the model once: the CPTs and the elimination order are
+    # frozen into NumPy tensors and every later query only runs the stored contractions.
+    compiledworst = make_network('worst')
+    print(compiledworst.query(['trust'], evidence={'robustness': 0}))
+
+    # The three cases can also be compiled as one scenario family: the shared CPTs are stored
+    # once and a single query returns P(trust | evidence) for the actual, best and worst case.
+    scenarios = make_scenarios()
+    print(scenarios.query_scenarios(['trust'], evidence={'robustness': 0}))
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Lastly, we compare the models
+    # ------------------------------------------------------------------------------------------------------#
+    # Compare networks and make plot
+    #bn.compare_networks(modelactual, modelbest, pos=DAG['pos'])
+    # bn.compare_networks(modelbest, modelactual)
+    # bn.compare_networks(modelactual,modelbest)
+    compare_networks(modelworst,modelbest)
+    # bn.compare_networks(modelworst,modelactual)
+
+    # Quantitative comparison: KL divergence of the joint distributions with the
+    # contribution of every node, Hellinger and total variation distance
+    comparison = compare_joint(make_network('worst'), make_network('best'))
+    print(comparison.kl, comparison.hellinger, comparison.tv)
+    print(comparison.contributions)
+    # All pairs of cases: total variation of P(trust | robustness = 0)
+    print(pairwise(scenarios, 'tv', variables=['trust'], evidence={'robustness': 0}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# %* *****************************************************************************
+# %  *  Title:  Most probable explanations of low trust
+# %  *  Description:
+# %  *  When P(trust) of a device drops, the question is which indicators most likely
+# %  *  explain it. map_query returns the k jointly most likely assignments of the
+# %  *  chosen nodes given the evidence (MAP; MPE when all unobserved nodes are chosen),
+# %  *  for one evidence dict or a whole (N x columns) batch of devices at once:
+# - Sum: an elimination plan sums out every other node, as for a posterior query, but
+#    stops before the final product of the factors over the chosen nodes (for MPE on
+#    a large network that product is the full joint). Messages are rescaled and the
+#    log scale is tracked.
+# - Max: the remaining factors over the chosen nodes are eliminated by max-product.
+#    Every message carries a rank axis with its k best values and a back pointer to
+#    the ranks and state that produced each of them.
+# - Trace back: following the back pointers in reverse order gives the assignments,
+#    for all devices and all k ranks in one vectorized sweep.
+# - Normalize: P(evidence) from the plan without query variables turns P(assignment,
+#    evidence) into P(assignment | evidence).
+# %  *
+# %  **************************************************************************** */
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from BN_Compiled import MISSING, CompiledNetwork, compile_model
+
+Explanation = namedtuple('Explanation', ['variables', 'states', 'probability'])
+
+
+def _top(values, k):
+    # Indices of the k largest values along axis 1, largest first
+    order = np.argsort(-values, axis=1, kind='stable')
+    return order[:, :k]
+
+
+def map_query(model, variables=None, evidence=None, k=1, columns=None, missing=MISSING):
+    """The ``k`` most probable joint assignments of ``variables`` given ``evidence``.
+
+    ``variables`` defaults to every unobserved node (MPE); for a batch, to every node
+    that is not observed in all rows. ``evidence`` is a dict or
+    an (N x columns) matrix as for query_batch. The Explanation holds ``states`` with
+    shape (*lead, k, len(variables)) and ``probability`` = P(assignment | evidence)
+    with shape (*lead, k), where lead is (*param_shape, N) for a batch and
+    param_shape otherwise.
+    """
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    vectors, batched = network._likelihoods({} if evidence is None else evidence, columns, missing)
+    if variables is None:
+        # A batch column is observed in every row when its vectors are all one-hot
+        observed = {i for i, vec in vectors.items() if not batched or (vec.sum(axis=-1) == 1).all()}
+        variables = [name for i, name in enumerate(network.nodes) if i not in observed]
+    targets = tuple(network._node(v) for v in variables)
+    if len(set(targets)) != len(targets):
+        raise ValueError('Explained variables must be unique')
+    if not batched and set(targets) & set(vectors):
+        raise ValueError('Explained variables must not be observed')
+    observed = [network.nodes[i] for i in vectors]
+
+    # Sum phase: eliminate every other node and keep the factors over the targets
+    plan = network._build_plan(targets, tuple(sorted(vectors)), join=False)
+    tables = network._batched_factors() if batched else None
+    buf, scale = network._messages(plan, vectors, tables)
+    inputs, scopes = plan.final
+    arrays = [buf[i] for i in inputs]
+    lead = np.broadcast_shapes(*[a.shape[:a.ndim - len(s)] for a, s in zip(arrays, scopes)],
+                               *[np.shape(scale[i]) for i in inputs])
+    size = math.prod(lead)
+    log_scale = np.broadcast_to(sum(scale[i] for i in inputs), lead).reshape(size)
+
+    # Max phase with k best values: factor = (values (B, R, *scope), scope)
+    factors = {}
+    for f, (a, s) in enumerate(zip(arrays, scopes)):
+        shape = tuple(network.cards[v] for v in s)
+        factors[f] = (np.broadcast_to(a, lead + shape).reshape((size, 1) + shape), s)
+    pointers = []
+    remaining = set(targets)
+    while remaining:
+        def weight(v):
+            union = {u for _, s in factors.values() if v in s for u in s}
+            ranks = math.prod(a.shape[1] for a, s in factors.values() if v in s)
+            return ranks * math.prod(network.cards[u] for u in union)
+        v = min(remaining, key=weight)
+        remaining.discard(v)
+        used = [f for f, (_, s) in factors.items() if v in s]
+        union = []
+        for f in used:
+            union.extend(u for u in factors[f][1] if u not in union)
+        out = tuple(u for u in union if u != v)
+        ranks = tuple(factors[f][0].shape[1] for f in used)
+
+        # Product over (B, R_1..R_n, v, *out)
+        layout = [v] + list(out)
+        product = 1.0
+        for n, f in enumerate(used):
+            a, s = factors.pop(f)
+            a = np.transpose(a, [0, 1] + [2 + s.index(u) for u in sorted(s, key=layout.index)])
+            shape = [size] + [1] * len(ranks) + [network.cards[u] if u in s else 1 for u in layout]
+            shape[1 + n] = a.shape[1]
+            product = product * a.reshape(shape)
+        product = np.broadcast_to(product, (size,) + ranks + tuple(network.cards[u] for u in layout))
+        flat = product.reshape((size, -1) + product.shape[2 + len(ranks):])
+        best = _top(flat, k)
+        new = len(arrays) + len(pointers)
+        factors[new] = (np.take_along_axis(flat, best, axis=1), out)
+        pointers.append((new, best, used, ranks + (network.cards[v],), v, out))
+
+    # Combine the remaining scalar factors and pick the k best overall
+    used = list(factors)
+    ranks = tuple(factors[f][0].shape[1] for f in used)
+    product = 1.0
+    for n, f in enumerate(used):
+        shape = [size] + [1] * len(ranks)
+        shape[1 + n] = ranks[n]
+        product = product * factors[f][0].reshape(shape)
+    flat = np.broadcast_to(product, (size,) + ranks).reshape(size, -1)
+    best = _top(flat, k)
+    values = np.take_along_axis(flat, best, axis=1)
+
+    # Trace back
+    rows = np.arange(size)[:, None]
+    rank = dict(zip(used, np.unravel_index(best, ranks) if ranks else []))
+    assign = {}
+    for new, pointer, sources, shape, v, out in reversed(pointers):
+        index = pointer[(rows, rank[new]) + tuple(assign[u] for u in out)]
+        parts = np.unravel_index(index, shape)
+        for f, r in zip(sources, parts[:-1]):
+            rank[f] = r
+        assign[v] = parts[-1]
+
+    # Normalize by P(evidence)
+    empty = network.plan([], observed)
+    buf_e, scale_e = network._messages(empty, vectors, tables)
+    e_inputs, e_subscripts = empty.final
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if e_inputs:
+            log_evidence = np.log(np.einsum(e_subscripts, *[buf_e[i] for i in e_inputs])) + \
+                sum(scale_e[i] for i in e_inputs)
+        else:
+            log_evidence = 0.0
+        log_evidence = np.broadcast_to(log_evidence, lead).reshape(size, 1)
+        probability = np.exp(np.log(values) + log_scale[:, None] - log_evidence)
+
+    states = np.stack([assign[t] for t in targets], axis=-1)
+    kept = states.shape[1]
+    return Explanation(tuple(variables), states.reshape(lead + (kept, len(targets))),
+                       probability.reshape(lead + (kept,)))
+
+
+def describe(model, explanation, index=()):
+    """The explanations of one device (``index`` into the leading axes) as a list of
+    {'assignment': {variable: state name}, 'probability': p}, most probable first."""
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    states = explanation.states[index]
+    probability = explanation.probability[index]
+    rows = []
+    for assignment, p in zip(states, probability):
+        rows.append({'assignment': {name: network.state_names[network._node(name)][s]
+                                    for name, s in zip(explanation.variables, assignment)},
+                     'probability': float(p)})
+    return rows
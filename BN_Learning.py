@@ -0,0 +1,158 @@
+# %* *****************************************************************************
+# %  *  Title:  Chunked CPD learning from discretized telemetry
+# %  *  Description:
+# %  *  The CPTs in BN_DiscreteCPDs.py are expert opinion. This module learns or
+# %  *  refreshes them from labelled, discretized device data for the same DAG
+# %  *  (``edges``). The steps are:
+# - Read: CSV or Parquet files are streamed in chunks, so memory use does not
+#    depend on the size of the file.
+# - Count: for every family (node + parents) the rows are mapped to a flat index
+#    with ravel_multi_index and counted with np.bincount; the counts of all chunks
+#    are added up. Rows with a missing value in a family are skipped for that family.
+# - Smooth: every CPT column is the posterior mean of a Dirichlet whose prior is the
+#    expert column with weight ``prior_weight`` (a number of pseudo observations),
+#    so columns with little data stay close to the expert values.
+# - Emit: TabularCPDs, TabularCPD keyword dicts or a CompiledNetwork.
+# %  *
+# %  **************************************************************************** */
+
+import os
+
+import numpy as np
+
+from BN_Compiled import CompiledNetwork, compile_model, compile_tables
+from BN_Structured import StructuredCPD
+
+
+def read_chunks(path, columns, chunksize=1000000):
+    """Yield {column: array} chunks of a CSV or Parquet file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=list(columns)):
+            yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in columns}
+    else:
+        import pandas as pd
+
+        for chunk in pd.read_csv(path, usecols=list(columns), chunksize=chunksize):
+            yield {name: chunk[name].to_numpy() for name in columns}
+
+
+class FamilyCounts:
+    """Accumulated counts of every family (node, *parents) of a DAG.
+
+    ``parents`` maps every node to its parent list (in the order used for the
+    CPT axes) and ``cards`` maps every node to its number of states.
+    """
+
+    def __init__(self, parents, cards):
+        self.parents = {node: list(pa) for node, pa in parents.items()}
+        self.cards = {node: int(cards[node]) for node in self.parents}
+        self.shapes = {node: tuple(self.cards[v] for v in [node] + pa)
+                       for node, pa in self.parents.items()}
+        self.counts = {node: np.zeros(int(np.prod(shape)), dtype=np.int64)
+                       for node, shape in self.shapes.items()}
+        self.rows = 0
+
+    def update(self, chunk):
+        """Add the counts of one chunk ({column: array}, e.g. a DataFrame)."""
+        states, valid = {}, {}
+        for node in self.parents:
+            values = np.asarray(chunk[node])
+            if values.dtype.kind == 'f':
+                ok = ~np.isnan(values)
+                values = np.where(ok, values, 0).astype(np.int64)
+            else:
+                values = values.astype(np.int64)
+                ok = np.ones(len(values), dtype=bool)
+            if ((values < 0) | (values >= self.cards[node]))[ok].any():
+                raise ValueError('Column %r has states outside 0..%d' % (node, self.cards[node] - 1))
+            states[node], valid[node] = values, ok
+
+        for node, pa in self.parents.items():
+            family = [node] + pa
+            ok = np.logical_and.reduce([valid[v] for v in family])
+            index = np.ravel_multi_index([states[v][ok] for v in family], self.shapes[node])
+            self.counts[node] += np.bincount(index, minlength=self.counts[node].size)
+        self.rows += len(next(iter(states.values()))) if states else 0
+        return self
+
+    def cpts(self, prior=None, prior_weight=10.0):
+        """Smoothed CPTs {node: array (card, *parent cards)}.
+
+        ``prior`` maps nodes to expert CPT arrays of the same layout; nodes without
+        a prior use a uniform prior.
+        """
+        tables = {}
+        for node, shape in self.shapes.items():
+            counts = self.counts[node].reshape(shape).astype(float)
+            base = None if prior is None else prior.get(node)
+            base = np.full(shape, 1.0 / shape[0]) if base is None else np.asarray(base, float)
+            pseudo = counts + prior_weight * base
+            total = pseudo.sum(axis=0, keepdims=True)
+            tables[node] = np.where(total > 0, pseudo / np.where(total > 0, total, 1.0), 1.0 / shape[0])
+        return tables
+
+
+def learn_cpds(source, edges=None, prior=None, prior_weight=10.0, cards=None,
+               chunksize=1000000, output='tabular'):
+    """Learn the CPTs of the ``edges`` DAG from a data file or an iterable of chunks.
+
+    ``source`` is a CSV/Parquet path (str or os.PathLike) or an iterable of
+    {column: array} chunks. ``edges`` defaults to the trust DAG of BN_DiscreteCPDs.
+    ``prior`` (a model, list of TabularCPDs or CompiledNetwork) supplies the expert
+    CPTs, the cardinalities and the parent order; structured prior CPDs are
+    expanded to dense tables, the layout of the learned CPTs. ``output`` is 'tabular' (pgmpy
+    TabularCPDs), 'tables' (TabularCPD keyword dicts) or 'network'.
+    """
+    if edges is None:
+        from BN_DiscreteCPDs import edges
+    parents = {}
+    for parent, child in edges:
+        parents.setdefault(parent, [])
+        parents.setdefault(child, []).append(parent)
+
+    # The expert CPTs fix the parent order, so the learned CPTs line up with them
+    expert, network = {}, None
+    if prior is not None:
+        network = prior if isinstance(prior, CompiledNetwork) else compile_model(prior)
+        for node in parents:
+            if node not in network.index:
+                continue
+            i = network._node(node)
+            order = [network.nodes[p] for p in network.parents[i]]
+            if sorted(order) != sorted(parents[node]):
+                raise ValueError('Prior CPT of %r has parents %r, the DAG has %r'
+                                 % (node, order, parents[node]))
+            parents[node] = order
+            cpt = network.cpts[i]
+            # The counts of a family are a dense table anyway
+            expert[node] = cpt.to_dense() if isinstance(cpt, StructuredCPD) else cpt
+    cards = dict(cards or {})
+    for node in parents:
+        if node not in cards:
+            cards[node] = network.cards[network._node(node)] if node in expert else 2
+
+    counts = FamilyCounts(parents, cards)
+    chunks = read_chunks(source, list(parents), chunksize) if isinstance(source, (str, os.PathLike)) else source
+    for chunk in chunks:
+        counts.update(chunk)
+    learned = counts.cpts(expert, prior_weight)
+
+    tables = []
+    for node, pa in parents.items():
+        values = learned[node].reshape(cards[node], -1)
+        table = dict(variable=node, variable_card=cards[node], values=values.tolist())
+        if pa:
+            table.update(evidence=list(pa), evidence_card=[cards[p] for p in pa])
+        tables.append(table)
+    if output == 'tables':
+        return tables
+    if output == 'network':
+        return compile_tables(tables)
+    if output == 'tabular':
+        from pgmpy.factors.discrete import TabularCPD
+
+        return [TabularCPD(**table) for table in tables]
+    raise ValueError('Unknown output %r' % (output,))
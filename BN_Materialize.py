@@ -0,0 +1,154 @@
+# %* *****************************************************************************
+# %  *  Title:  Materialized posterior table over the root indicators
+# %  *  Description:
+# %  *  The nine root indicators of the trust network are binary, so there are only
+# %  *  3^9 = 19,683 partial evidence patterns over them (each node is 0, 1 or not
+# %  *  observed). This module computes P(trust) and the determinant posteriors for
+# %  *  every pattern once, so online scoring becomes a table lookup. The steps are:
+# - Every root gets a pseudo child "pattern" whose table maps the pattern code
+#    (one state per observed value plus one for "not observed") to a likelihood.
+# - One contraction per determinant keeps the pattern axes as outputs, so the
+#    messages of the shared sub-networks are computed once for all patterns.
+# - The table is rebuilt when the fingerprint of the source model changes. Lookups
+#    only recompute the fingerprint when a CPD or its value array was replaced.
+# %  *
+# %  **************************************************************************** */
+
+import numpy as np
+
+from BN_Compiled import MISSING, CompiledNetwork, _get_cpds, compile_model, model_fingerprint
+from BN_Structured import StructuredCPD
+
+# Root indicators and determinants of the trust network in BN_DiscreteCPDs.py
+ROOT_INDICATORS = ('memory', 'power', 'rssi', 'latency', 'confidentiality', 'integrity',
+                   'compliance', 'threatsafe', 'transparent')
+DETERMINANTS = ('robustness', 'security', 'privacy', 'trust1', 'trust')
+
+
+def _pattern_network(network, roots):
+    # Append one pseudo node per root. Its "CPT" has shape (card + 1, card):
+    # row k < card is the indicator of state k and the last row is all ones.
+    nodes, cards = list(network.nodes), list(network.cards)
+    parents, cpts = list(network.parents), list(network.cpts)
+    for name in roots:
+        node = network._node(name)
+        card = network.cards[node]
+        nodes.append('__pattern_' + name)
+        cards.append(card + 1)
+        parents.append((node,))
+        cpts.append(np.vstack([np.eye(card), np.ones((1, card))]))
+    return CompiledNetwork(nodes, cards, parents, cpts)
+
+
+class MaterializedTable:
+    """Precomputed posteriors of ``targets`` for every evidence pattern over ``roots``.
+
+    ``model`` is a CompiledNetwork or anything compile_model accepts. With
+    ``auto_refresh`` every lookup first checks whether the model, one of its CPDs or
+    a CPD's value array was replaced (``add_cpds``, assigning ``cpd.values``) and then
+    rebuilds the table if the fingerprint changed. After writing into a value array
+    in place, call refresh().
+    """
+
+    def __init__(self, model, roots=ROOT_INDICATORS, targets=DETERMINANTS, auto_refresh=True):
+        self.model = model
+        self.roots = tuple(roots)
+        self.targets = tuple(targets)
+        self.auto_refresh = auto_refresh
+        self.fingerprint = None
+        self.tables = {}
+        self._seen = ()
+        self.refresh()
+
+    def __repr__(self):
+        return 'MaterializedTable(%d patterns, targets=%r)' % (int(np.prod(self.radix)), self.targets)
+
+    def refresh(self):
+        """Rebuild the table if the CPTs of the model changed. Returns True if rebuilt."""
+        self._seen = self._sources()
+        fingerprint = model_fingerprint(self.model)
+        if fingerprint == self.fingerprint:
+            return False
+        self._build(fingerprint)
+        return True
+
+    def _sources(self):
+        # The objects holding the CPT values; a CompiledNetwork is immutable
+        if isinstance(self.model, CompiledNetwork):
+            return (self.model,)
+        sources = []
+        for cpd in _get_cpds(self.model):
+            sources.append(cpd)
+            if isinstance(cpd, StructuredCPD):
+                sources.extend(table for _, table in cpd.factors)
+            else:
+                sources.append(cpd['values'] if isinstance(cpd, dict) else cpd.values)
+        return tuple(sources)
+
+    def _auto_refresh(self):
+        sources = self._sources()
+        if len(sources) != len(self._seen) or any(a is not b for a, b in zip(sources, self._seen)):
+            self.refresh()
+
+    def build(self):
+        """Rebuild the table unconditionally."""
+        self._seen = self._sources()
+        self._build(model_fingerprint(self.model))
+
+    def _build(self, fingerprint):
+        network = self.model if isinstance(self.model, CompiledNetwork) else compile_model(self.model)
+        self.network = network
+        self.radix = tuple(network.cards[network._node(name)] + 1 for name in self.roots)
+        patterns = _pattern_network(network, self.roots)
+        pattern_nodes = ['__pattern_' + name for name in self.roots]
+
+        tables = {}
+        for target in self.targets:
+            # Joint over (patterns..., target), then normalized over the target axis
+            joint = patterns._contract(patterns.plan(pattern_nodes + [target]), {})
+            joint = joint.reshape(joint.shape[:joint.ndim - len(self.roots) - 1] + (-1, joint.shape[-1]))
+            table = CompiledNetwork._normalize(joint, 1)
+            table.setflags(write=False)
+            tables[target] = table
+        self.tables = tables
+        self.fingerprint = fingerprint
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Lookups
+    # ------------------------------------------------------------------------------------------------------#
+
+    def codes(self, evidence, missing=MISSING):
+        """Row index of an (N x roots) evidence matrix (``missing`` = not observed)."""
+        evidence = np.asarray(evidence)
+        if evidence.ndim != 2 or evidence.shape[1] != len(self.roots):
+            raise ValueError('Evidence must have shape (N, %d)' % len(self.roots))
+        cards = np.asarray(self.radix) - 1
+        unobserved = evidence == missing
+        # Check the observed states before "not observed" becomes the extra digit card
+        if (((evidence < 0) | (evidence >= cards)) & ~unobserved).any():
+            raise ValueError('Evidence outside the states of the root indicators')
+        digits = np.where(unobserved, cards, evidence)
+        return np.ravel_multi_index(digits.T, self.radix)
+
+    def lookup(self, evidence=None):
+        """{target: P(target | evidence)} for evidence on the root indicators."""
+        if self.auto_refresh:
+            self._auto_refresh()
+        evidence = evidence or {}
+        row = np.full((1, len(self.roots)), MISSING)
+        for name, value in evidence.items():
+            if name not in self.roots:
+                raise KeyError('%r is not a root indicator of this table' % (name,))
+            node = self.network._node(name)
+            row[0, self.roots.index(name)] = self.network._state(node, value)
+        return {target: posterior[..., 0, :] for target, posterior in self._lookup(row).items()}
+
+    def lookup_batch(self, evidence, missing=MISSING):
+        """{target: posteriors} for every row of an (N x roots) evidence matrix."""
+        if self.auto_refresh:
+            self._auto_refresh()
+        return self._lookup(evidence, missing)
+
+    def _lookup(self, evidence, missing=MISSING):
+        index = self.codes(evidence, missing)
+        return {target: table[..., index, :] for target, table in self.tables.items()}
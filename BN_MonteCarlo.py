@@ -0,0 +1,219 @@
+# %* *****************************************************************************
+# %  *  Title:  Monte Carlo trust cases (port of BayesianTrustNetworkcaseAllCase_rev1.m)
+# %  *  Description:
+# %  *  This module runs the worst, average and best case simulations of the MATLAB
+# %  *  program as a vectorized NumPy engine. In every iteration the mean of each
+# %  *  non-descendant node x1..x12 is drawn uniformly from its range, the SD is a
+# %  *  multiple of the mean, and the posterior curves (Performance ... OverallTrust)
+# %  *  are products of the normpdf curves of the nodes. The steps are:
+# - Iterations are drawn in chunks as 2-D arrays (iterations x nodes).
+# - Every posterior curve is a product of Gaussian pdfs, i.e. exp(c0 + c1*x + c2*x^2),
+#    so its score trapz(X.*curve)*dx is computed in closed form ('analytic') or, as in
+#    MATLAB, on the 1001 point grid x = 0:0.01:10 ('grid').
+# - Chunks get independent seeded RNG streams and can run on a process pool; the
+#    result does not depend on the number of workers.
+# - The per-iteration scores are summarized (mean, SD, quantiles) instead of plotted.
+# %  *
+# %  **************************************************************************** */
+
+import math
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ------------------------------------------------------------------------------------------------------#
+# Cases: range of the mean of x1..x12 and SD = sd_scale * mean
+# ------------------------------------------------------------------------------------------------------#
+
+Case = namedtuple('Case', ['name', 'low', 'high', 'sd_scale'])
+
+_LOW = (5, 4, 3, 2, 1, 3, 6, 7, 4, 6, 3, 2)
+_HIGH = (10, 8, 7, 8, 5, 6, 10, 10, 9, 8, 6, 4)
+
+CASES = {
+    'worst': Case('worst', _LOW, _HIGH, 100.0),
+    'average': Case('average', _LOW, _HIGH, 5.0),
+    'best': Case('best', (5, 4, 3, 5, 2, 4, 6, 7, 6, 6, 3, 2), (8, 6, 5, 8, 3, 6, 8, 9, 8, 8, 6, 4), 0.5),
+}
+
+# Grid of the MATLAB program: dx=0.01; x=0:dx:10; X=1:1001
+DX = 0.01
+GRID = np.arange(1001) * DX
+
+# ------------------------------------------------------------------------------------------------------#
+# Posterior curves as products of the node pdfs: (log of the constant factor, power of p_x1..p_x12)
+# ------------------------------------------------------------------------------------------------------#
+
+def _pdf(i):
+    power = np.zeros(12)
+    power[i - 1] = 1.0
+    return (0.0, power)
+
+
+def _mul(*terms, scale=1.0):
+    return (math.log(scale) + sum(t[0] for t in terms), sum(t[1] for t in terms))
+
+
+p = {i: _pdf(i) for i in range(1, 13)}
+p13 = _mul(p[1], p[2], scale=3)
+p14 = _mul(p[3], p[4], scale=3)
+p15 = _mul(p[5], p[6], scale=3)
+p16 = _mul(p[7], p[8], scale=3)
+p17 = _mul(p[9], p[10], scale=3)
+p18 = _mul(p[11], p[12], scale=3)
+p19 = _mul(p13, p14, scale=5)
+p20 = _mul(p15, p16, scale=5)
+p21 = _mul(p17, p18, scale=5)
+p22 = _mul(p19, p20, p21, scale=7)
+
+CURVES = OrderedDict([
+    ('Performance', _mul(p13, p[1], p[2])),
+    ('Reliability', _mul(p14, p[3], p[4], p[5])),
+    ('Operation', _mul(p15, p[6], p[7])),
+    ('Standard', _mul(p16, p[7], p[8], p[9])),
+    ('Reuse', _mul(p17, p[9], p[10])),
+    ('Protection', _mul(p18, p[11], p[12])),
+    ('Robustness', _mul(p19, p13, p14, *[p[i] for i in range(1, 6)])),
+    ('Security', _mul(p20, p15, p16, *[p[i] for i in range(5, 10)])),
+    ('Privacy', _mul(p21, p17, p18, *[p[i] for i in range(9, 13)])),
+    ('OverallTrust', _mul(p22, p19, p20, p21, p13, p14, p15, p16, p17, p18,
+                          *[p[i] for i in range(1, 13)])),
+])
+del p
+
+_LOG_SCALE = np.array([c[0] for c in CURVES.values()])
+_POWERS = np.array([c[1] for c in CURVES.values()])
+
+# Score columns: E of every curve plus the log AUC of the OverallTrust curve
+SCORES = tuple(CURVES) + ('LogAUC',)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Scores of a chunk of iterations
+# ------------------------------------------------------------------------------------------------------#
+
+def _coefficients(means, sds):
+    # log normpdf(x, m, s) = c0 + c1*x + c2*x^2, summed over the nodes with the curve powers
+    inv = 1.0 / sds ** 2
+    c0 = -0.5 * means ** 2 * inv - np.log(sds) - 0.5 * math.log(2 * math.pi)
+    c1 = means * inv
+    c2 = -0.5 * inv
+    return (_LOG_SCALE + c0 @ _POWERS.T, c1 @ _POWERS.T, c2 @ _POWERS.T)
+
+
+def _scores_grid(c0, c1, c2):
+    # trapz(X.*curve)*dx and log(trapz(X, curve)) on the MATLAB grid
+    X = np.arange(1, GRID.size + 1)
+    weights = np.ones(GRID.size)
+    weights[[0, -1]] = 0.5
+    scores = np.empty(c0.shape)
+    for j in range(c0.shape[1]):
+        curve = np.exp(c0[:, j:j + 1] + GRID * (c1[:, j:j + 1] + GRID * c2[:, j:j + 1]))
+        scores[:, j] = curve @ (weights * X) * DX
+    trust = np.exp(c0[:, -1:] + GRID * (c1[:, -1:] + GRID * c2[:, -1:]))
+    return scores, np.log(trust @ weights)
+
+
+def _scores_analytic(c0, c1, c2):
+    # exp(c0 + c1*x + c2*x^2) = K * exp(-(x - mu)^2 / (2 sigma^2)); the grid sums are
+    # replaced by the integrals over [0, 10] (trapz(X.*y)*dx ~ int (1 + x/dx) y dx).
+    from scipy.special import erf, erfc
+
+    a = -c2
+    mu = c1 / (2 * a)
+    sigma = np.sqrt(0.5 / a)
+    log_k = c0 + c1 ** 2 / (4 * a)
+    lo = (GRID[0] - mu) / (sigma * math.sqrt(2))
+    hi = (GRID[-1] - mu) / (sigma * math.sqrt(2))
+    mass = np.where(lo > 0, erfc(lo) - erfc(hi), erf(hi) - erf(lo))
+    i0 = sigma * math.sqrt(math.pi / 2) * mass
+    i1 = mu * i0 + sigma ** 2 * (np.exp(-lo ** 2) - np.exp(-hi ** 2))
+    scores = np.exp(log_k) * (i0 + i1 / DX)
+    return scores, log_k[:, -1:] + np.log(i0[:, -1:] / DX)
+
+
+def case_scores(case, means, sds, method='analytic'):
+    """Scores (iterations x SCORES) for given means and SDs (iterations x 12)."""
+    c0, c1, c2 = _coefficients(np.asarray(means, float), np.asarray(sds, float))
+    if method == 'grid':
+        scores, log_auc = _scores_grid(c0, c1, c2)
+    elif method == 'analytic':
+        scores, log_auc = _scores_analytic(c0, c1, c2)
+    else:
+        raise ValueError('Unknown method %r' % (method,))
+    return np.hstack([scores, log_auc.reshape(-1, 1)])
+
+
+def draw(case, n, rng):
+    """Means and SDs of x1..x12 for n iterations of a case."""
+    low, high = np.asarray(case.low, float), np.asarray(case.high, float)
+    means = (high - low) * rng.random((n, 12)) + low
+    return means, np.asarray(case.sd_scale, float) * means
+
+
+def _run_chunk(args):
+    case, n, seed, method = args
+    means, sds = draw(case, n, np.random.default_rng(seed))
+    return case_scores(case, means, sds, method)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Simulation
+# ------------------------------------------------------------------------------------------------------#
+
+def summarize(scores, names=SCORES):
+    """Summary statistics per score column."""
+    quantiles = np.quantile(scores, [0.05, 0.25, 0.5, 0.75, 0.95], axis=0)
+    mean = scores.mean(axis=0)
+    std = scores.std(axis=0, ddof=1) if len(scores) > 1 else np.zeros(scores.shape[1])
+    summary = OrderedDict()
+    for j, name in enumerate(names):
+        summary[name] = OrderedDict([
+            ('mean', mean[j]), ('std', std[j]), ('sem', std[j] / math.sqrt(len(scores))),
+            ('min', scores[:, j].min()), ('q05', quantiles[0, j]), ('q25', quantiles[1, j]),
+            ('median', quantiles[2, j]), ('q75', quantiles[3, j]), ('q95', quantiles[4, j]),
+            ('max', scores[:, j].max())])
+    return summary
+
+
+def simulate(case='average', iterations=1000000, seed=None, workers=1, chunk=65536,
+             method='analytic', keep_scores=False):
+    """Run ``iterations`` iterations of a case and return the summary statistics.
+
+    ``case`` is a name in CASES or a Case. The iterations are split into chunks of
+    ``chunk`` iterations, each with its own RNG stream spawned from ``seed``, and the
+    chunks are spread over ``workers`` processes (None = all CPUs).
+    """
+    case = CASES[case] if isinstance(case, str) else case
+    sizes = [chunk] * (iterations // chunk) + ([iterations % chunk] if iterations % chunk else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(case, n, s, method) for n, s in zip(sizes, seeds)]
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, tasks))
+    else:
+        parts = [_run_chunk(task) for task in tasks]
+
+    scores = np.vstack(parts) if parts else np.empty((0, len(SCORES)))
+    result = {'case': case.name, 'iterations': iterations, 'summary': summarize(scores)}
+    if keep_scores:
+        result['scores'] = scores
+    return result
+
+
+def report(result):
+    """Print the mean scores like the MATLAB program does."""
+    print('%s Case Scores' % result['case'].capitalize())
+    print('--------------------')
+    for name, stats in result['summary'].items():
+        print('%s Score is: %g (SD %g, 90%% range %g .. %g)'
+              % (name, stats['mean'], stats['std'], stats['q05'], stats['q95']))
+
+
+if __name__ == '__main__':
+    for name in ('worst', 'average', 'best'):
+        report(simulate(name, iterations=100000, seed=0))
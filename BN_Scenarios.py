@@ -0,0 +1,83 @@
+# %* *****************************************************************************
+# %  *  Title:  Scenario family of trust networks
+# %  *  Description:
+# %  *  The actual, best and worst case models in BN_DiscreteCPDs.py share the DAG and
+# %  *  most of their CPTs; they differ only in the robustness, security and privacy
+# %  *  tables. Instead of building and querying one model per case, this module
+# %  *  compiles a single network in which the CPTs that differ are stacked along a
+# %  *  scenario axis. The unchanged CPTs are stored once and shared, and one query
+# %  *  returns P(variables | evidence) for every scenario at once.
+# %  *
+# %  **************************************************************************** */
+
+import numpy as np
+
+from BN_Compiled import CompiledNetwork, _get_cpds, _variable, compile_model
+
+
+class ScenarioNetwork(CompiledNetwork):
+    """A CompiledNetwork whose stacked CPT axis is labelled with scenario names."""
+
+    def __init__(self, nodes, cards, parents, cpts, state_names=None, scenarios=()):
+        super().__init__(nodes, cards, parents, cpts, state_names)
+        self.scenarios = tuple(scenarios)
+        if self.param_shape not in ((), (len(self.scenarios),)):
+            raise ValueError('Stacked CPTs do not match the %d scenarios' % len(self.scenarios))
+
+    def __repr__(self):
+        return 'ScenarioNetwork(%d nodes, scenarios=%r)' % (len(self.nodes), self.scenarios)
+
+    def by_scenario(self, result):
+        """Split a query result along the scenario axis into {scenario: posterior}."""
+        result = np.asarray(result)
+        if not self.param_shape:
+            return {name: result for name in self.scenarios}
+        return dict(zip(self.scenarios, result))
+
+    def query_scenarios(self, variables, evidence=None):
+        """P(variables | evidence) for every scenario, as {scenario: posterior}."""
+        return self.by_scenario(self.query(variables, evidence))
+
+
+def compile_scenarios(variants):
+    """Compile a family of models into one ScenarioNetwork.
+
+    ``variants`` maps scenario names to a CompiledNetwork, a bnlearn/pgmpy model or
+    a list of TabularCPDs or their keyword dicts. The first entry is the base scenario; later entries may list only
+    the CPDs they change, e.g.::
+
+        compile_scenarios({'actual': modelactual,
+                           'best': [cpt_robustnessbest, cpt_securitybest, cpt_privacybest],
+                           'worst': [cpt_robustnessworst, cpt_securityworst, cpt_privacyworst]})
+    """
+    names = list(variants)
+    if not names:
+        raise ValueError('At least one scenario is required')
+    base = variants[names[0]]
+    if not isinstance(base, CompiledNetwork):
+        base = compile_model(base)
+
+    layers = [list(base.cpts)]
+    for name in names[1:]:
+        tables = list(base.cpts)
+        variant = variants[name]
+        if isinstance(variant, CompiledNetwork):
+            for i, node in enumerate(variant.nodes):
+                parents = [variant.nodes[p] for p in variant.parents[i]]
+                if parents != [base.nodes[p] for p in base.parents[base._node(node)]]:
+                    raise ValueError('Scenario %r changes the parents of %r' % (name, node))
+                tables[base._node(node)] = variant.cpts[i]
+        else:
+            for cpd in _get_cpds(variant):
+                tables[base._node(_variable(cpd))] = base.align_cpd(cpd)
+        layers.append(tables)
+
+    # Tables that are identical in every scenario are shared, the rest are stacked
+    cpts = []
+    for i in range(len(base.nodes)):
+        tables = [layer[i] for layer in layers]
+        if all(np.array_equal(tables[0], t) for t in tables[1:]):
+            cpts.append(tables[0])
+        else:
+            cpts.append(np.stack(tables))
+    return ScenarioNetwork(base.nodes, base.cards, base.parents, cpts, base.state_names, names)
@@ -0,0 +1,160 @@
+# %* *****************************************************************************
+# %  *  Title:  Sensitivity of the trust posterior to every CPT entry
+# %  *  Description:
+# %  *  Instead of editing one CPT at a time, rebuilding the model and re-querying,
+# %  *  this module returns the derivative of P(target = state | evidence) with
+# %  *  respect to every CPT entry of the network in one forward/backward pass:
+# - Forward: run the elimination plan of the query and keep every intermediate factor.
+#    Every message is divided by its maximum so that large networks do not underflow;
+#    the scales are constants of the computation, so the backward pass divides the
+#    gradient of a message by the same scale and the derivatives stay exact.
+# - Backward: every contraction is an einsum, whose derivative with respect to one
+#    operand is the einsum of the output gradient with the other operands. Every
+#    factor is used by exactly one contraction, so one reverse sweep gives the
+#    gradient of every CPT.
+# - Evidence can be a dict or a batch matrix; gradients then have a leading N axis.
+# Besides the plain partial derivatives, the "covarying" derivative changes one entry
+# while scaling the other entries of its column so that the column still sums to one.
+# %  *
+# %  **************************************************************************** */
+
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from BN_Compiled import MISSING, CompiledNetwork, _rescale, compile_model
+
+Sensitivity = namedtuple('Sensitivity', ['target', 'state', 'posterior', 'gradients', 'covarying'])
+
+
+def _split(subscripts):
+    inputs, output = subscripts.split('->')
+    return [s[3:] for s in inputs.split(',')], output[3:]
+
+
+def _einsum_grad(subscripts, operands, grad, i):
+    # d(sum)/d(operand i): contract the output gradient with the other operands.
+    # Letters summed out only in operand i do not appear elsewhere; the gradient is
+    # constant along them and is broadcast back afterwards.
+    inputs, output = _split(subscripts)
+    others = [output] + [s for j, s in enumerate(inputs) if j != i]
+    present = set(''.join(others))
+    keep = ''.join(c for c in inputs[i] if c in present)
+    ops = [grad] + [op for j, op in enumerate(operands) if j != i]
+    result = np.einsum(','.join('...' + s for s in others) + '->...' + keep, *ops)
+
+    shape = operands[i].shape[operands[i].ndim - len(inputs[i]):]
+    batch = result.shape[:result.ndim - len(keep)]
+    for axis, c in enumerate(inputs[i]):
+        if c not in present:
+            result = np.expand_dims(result, len(batch) + axis)
+    return np.broadcast_to(result, batch + shape)
+
+
+def _covarying(table, grad):
+    # Derivative when entry x of a column moves and the other entries of the column
+    # are scaled proportionally: g_x - sum_{x' != x} g_x' * theta_x' / (1 - theta_x).
+    # A column with theta_x = 1 spreads the change uniformly over the other states.
+    card = table.shape[0]
+    axis = grad.ndim - table.ndim
+    weighted = (grad * table).sum(axis=axis, keepdims=True) - grad * table
+    rest = 1.0 - table
+    uniform = (grad.sum(axis=axis, keepdims=True) - grad) / max(card - 1, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shifted = np.where(rest > 0, weighted / np.where(rest > 0, rest, 1.0), uniform)
+    return grad - shifted
+
+
+def _dense(network):
+    # (name, CPT) of the nodes with a dense table
+    return [(name, table) for name, table in zip(network.nodes, network.cpts)
+            if isinstance(table, np.ndarray)]
+
+
+def sensitivity(model, target='trust', state=1, evidence=None, columns=None, missing=MISSING):
+    """Derivatives of P(target = state | evidence) with respect to every CPT entry.
+
+    ``evidence`` is a dict or an (N x columns) matrix as for query_batch. The result
+    holds the posterior and, per node, arrays shaped like its CPT (with a leading N
+    axis for batched evidence): the plain partial derivatives and the covarying ones.
+    """
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    if network.param_shape:
+        raise ValueError('Sensitivity needs a network without stacked CPTs')
+    node = network._node(target)
+    k = network._state(node, state)
+
+    tables = network.factor_tables
+    vectors, _ = network._likelihoods({} if evidence is None else evidence, columns, missing)
+    plan = network.plan([target], [network.nodes[i] for i in vectors])
+
+    # Forward pass, keeping every (rescaled) factor and the scale of every message
+    buf = [tables[i] if kind == 'factor' else vectors[i] for kind, i in plan.factors]
+    peaks = []
+    for inputs, subscripts in plan.steps:
+        message, log_peak = _rescale(np.einsum(subscripts, *[buf[i] for i in inputs]), subscripts)
+        buf.append(message)
+        peaks.append(np.exp(log_peak).reshape(np.shape(log_peak) + (1,) * len(_split(subscripts)[1])))
+    final_inputs, final_subscripts = plan.final
+    joint = np.einsum(final_subscripts, *[buf[i] for i in final_inputs])
+    z = joint.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        posterior = joint[..., k] / z[..., 0]
+        # d(joint_k / z) / d(joint_t) = (delta_tk * z - joint_k) / z^2
+        grad = (np.eye(joint.shape[-1])[k] * z - joint[..., k:k + 1]) / z ** 2
+
+    # Backward pass
+    grads = [None] * len(buf)
+    for i in final_inputs:
+        grads[i] = _einsum_grad(final_subscripts, [buf[j] for j in final_inputs],
+                                grad, final_inputs.index(i))
+    offset = len(plan.factors)
+    for step in range(len(plan.steps) - 1, -1, -1):
+        inputs, subscripts = plan.steps[step]
+        g = grads[offset + step] / peaks[step]
+        for pos, i in enumerate(inputs):
+            grads[i] = _einsum_grad(subscripts, [buf[j] for j in inputs], g, pos)
+
+    # Structured CPDs have no table of CPT entries and are left out
+    batch = posterior.shape
+    gradients, covarying = {}, {}
+    for name, table in _dense(network):
+        gradients[name] = np.zeros(batch + table.shape)
+    for slot, (kind, f) in enumerate(plan.factors):
+        if kind == 'factor' and network.nodes[network.factor_owner[f]] in gradients:
+            gradients[network.nodes[network.factor_owner[f]]] = np.array(np.broadcast_to(
+                grads[slot], batch + tables[f].shape))
+    for name, table in _dense(network):
+        covarying[name] = _covarying(table, gradients[name])
+    return Sensitivity(target, state, posterior, gradients, covarying)
+
+
+def ranked_report(model, result, top=10, covary=True):
+    """The ``top`` most influential CPT entries as a list of dicts, largest first.
+
+    For batched evidence the derivatives are averaged over the rows (the mean
+    absolute derivative is used for the ranking).
+    """
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    source = result.covarying if covary else result.gradients
+    rows = []
+    for name, table in _dense(network):
+        grad = source[name]
+        lead = grad.ndim - table.ndim
+        mean = grad.reshape((-1,) + table.shape).mean(axis=0) if lead else grad
+        influence = np.abs(grad).reshape((-1,) + table.shape).mean(axis=0) if lead else np.abs(grad)
+        node = network._node(name)
+        parents = [network.nodes[p] for p in network.parents[node]]
+        for index in itertools.product(*[range(c) for c in table.shape]):
+            rows.append({
+                'node': name,
+                'state': network.state_names[node][index[0]],
+                'parents': {p: network.state_names[network._node(p)][s]
+                            for p, s in zip(parents, index[1:])},
+                'value': float(table[index]),
+                'derivative': float(mean[index]),
+                'influence': float(influence[index]),
+            })
+    rows.sort(key=lambda row: row['influence'], reverse=True)
+    return rows[:top]
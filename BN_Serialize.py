@@ -0,0 +1,156 @@
+# %* *****************************************************************************
+# %  *  Title:  Binary model files for fast worker startup
+# %  *  Description:
+# %  *  Every process that scores trust otherwise rebuilds the TabularCPDs, the DAG and
+# %  *  the elimination plans before its first query. save_network writes a prepared
+# %  *  CompiledNetwork to one file and load_network maps it back:
+# - Layout: MAGIC, a little endian uint32 version, a uint64 header length, a JSON
+#    header (node order, cardinalities, parents, state names, array offsets and
+#    shapes, elimination plans, fingerprint) and then the CPT arrays, each starting
+#    at a multiple of ALIGN bytes.
+# - Load: the file is memory mapped read-only and the CPTs are NumPy views of the
+#    mapping, so loading takes milliseconds and all workers on one host share the
+#    same pages of CPT data. The stored plans are installed, so the first query
+#    does not plan either.
+# Structured CPDs are stored as their factors: the scopes and hidden variables go into
+# the header and the factor tables into the array section, like the CPTs. They load as
+# plain StructuredCPDs, which compute their conditionals from the factors. The file
+# holds only JSON and raw float arrays, so loading it never runs code.
+# %  *
+# %  **************************************************************************** */
+
+import json
+import math
+import mmap
+import struct
+
+import numpy as np
+
+from BN_Compiled import CompiledNetwork, EliminationPlan
+from BN_Structured import StructuredCPD
+
+MAGIC = b'BNTRUST\0'
+VERSION = 2
+ALIGN = 64
+
+_PREFIX = struct.Struct('<8sIQ')
+
+
+def _pad(offset):
+    return -offset % ALIGN
+
+
+def _plan_json(plan):
+    return {'targets': plan.targets, 'observed': plan.observed, 'order': plan.order,
+            'factors': plan.factors, 'steps': plan.steps, 'final': plan.final}
+
+
+def _plan(data):
+    steps = [(tuple(inputs), subscripts) for inputs, subscripts in data['steps']]
+    inputs, subscripts = data['final']
+    return EliminationPlan(data['targets'], data['observed'], data['order'],
+                           [tuple(f) for f in data['factors']], steps, (tuple(inputs), subscripts))
+
+
+def save_network(network, path, queries=()):
+    """Write ``network`` with its cached elimination plans to ``path``.
+
+    ``queries`` lists extra (variables, observed) signatures to plan before saving,
+    e.g. ``[(['trust'], ROOT_INDICATORS)]``.
+    """
+    for variables, observed in queries:
+        network.plan(variables, observed)
+
+    arrays, cpts = [], []
+    offset = 0
+
+    def add(values):
+        nonlocal offset
+        table = np.ascontiguousarray(values, dtype='<f8')
+        entry = {'offset': offset, 'shape': table.shape}
+        arrays.append(table)
+        offset += table.nbytes + _pad(table.nbytes)
+        return entry
+
+    for cpt in network.cpts:
+        if isinstance(cpt, StructuredCPD):
+            cpts.append({'structured': {
+                'variable_card': cpt.variable_card, 'evidence': cpt.evidence,
+                'evidence_card': cpt.evidence_card, 'hidden': cpt.hidden,
+                'factors': [dict(add(table), scope=scope) for scope, table in cpt.factors]}})
+            continue
+        cpts.append(add(cpt))
+
+    header = {
+        'class': type(network).__name__,
+        'nodes': network.nodes,
+        'cards': network.cards,
+        'parents': network.parents,
+        'state_names': network.state_names,
+        'scenarios': getattr(network, 'scenarios', None),
+        'cpts': cpts,
+        'plans': [_plan_json(plan) for plan in network._plans.values()],
+        'fingerprint': network.fingerprint(),
+    }
+    text = json.dumps(header).encode('utf-8')
+    start = _PREFIX.size + len(text)
+    start += _pad(start)
+
+    with open(path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(text)))
+        f.write(text)
+        f.write(b'\0' * (start - _PREFIX.size - len(text)))
+        for table in arrays:
+            f.write(table.tobytes())
+            f.write(b'\0' * _pad(table.nbytes))
+
+
+def load_network(path, verify=False):
+    """Load a network written by save_network; its CPTs are read-only views of the file.
+
+    With ``verify`` the fingerprint is recomputed from the data (this reads every page).
+    """
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, length = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('%s is not a trust model file' % (path,))
+    if version != VERSION:
+        raise ValueError('%s has format version %d, expected %d' % (path, version, VERSION))
+    header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + length]).decode('utf-8'))
+    start = _PREFIX.size + length
+    start += _pad(start)
+
+    def array(entry):
+        shape = tuple(entry['shape'])
+        count = math.prod(shape)
+        return np.frombuffer(buf, dtype='<f8', count=count, offset=start + entry['offset']).reshape(shape)
+
+    cpts = []
+    for node, entry in zip(header['nodes'], header['cpts']):
+        if 'structured' in entry:
+            data = entry['structured']
+            cpd = StructuredCPD(node, data['variable_card'], data['evidence'], data['evidence_card'])
+            cpd.hidden = {name: int(card) for name, card in data['hidden'].items()}
+            cpd.factors = [(tuple(factor['scope']), array(factor)) for factor in data['factors']]
+            cpts.append(cpd)
+            continue
+        cpts.append(array(entry))
+
+    if header['scenarios'] is not None:
+        from BN_Scenarios import ScenarioNetwork
+        network = ScenarioNetwork(header['nodes'], header['cards'], header['parents'], cpts,
+                                  header['state_names'], header['scenarios'])
+    else:
+        network = CompiledNetwork(header['nodes'], header['cards'], header['parents'], cpts,
+                                  header['state_names'])
+    for data in header['plans']:
+        plan = _plan(data)
+        network._plans[(plan.targets, plan.observed)] = plan
+
+    if verify:
+        if network.fingerprint() != header['fingerprint']:
+            raise ValueError('Fingerprint of %s does not match its data' % (path,))
+    else:
+        network._fingerprint = header['fingerprint']
+    return network
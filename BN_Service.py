@@ -0,0 +1,404 @@
+# %* *****************************************************************************
+# %  *  Title:  Micro-batching trust scoring service
+# %  *  Description:
+# %  *  An asyncio HTTP/1.1 server (TCP and/or Unix socket) in front of the compiled
+# %  *  trust network, replacing the loop around bn.inference.fit that answers one
+# %  *  request at a time. The steps are:
+# - Accept: POST /query with {"evidence": {...}, "variables": ["trust"]}. The evidence
+#    is validated and turned into a row of the evidence matrix right away, so bad
+#    requests fail alone with 400. A full queue answers 503 instead of growing the
+#    latency of everything behind it. With a scenario file the posterior has one entry
+#    per scenario (listed in "scenarios").
+# - Coalesce: the batcher takes the first waiting request, waits ``window`` seconds
+#    (or until ``max_batch`` requests wait) and scores everything queued as one batch.
+# - Dispatch: batches run on a process pool; each worker memory maps the model file
+#    written by BN_Serialize.save_network. While all workers are busy requests keep
+#    queueing, so batches grow with the load.
+# - Observe: GET /metrics reports queue depth, batches in flight and latency percentiles.
+# The bundled client (replay) sends recorded evidence, one JSON object per line, and
+# reports throughput and client side latencies; it serves as the load test.
+#
+#    python BN_Service.py serve --model worst --port 8080 --unix /tmp/trust.sock
+#    python BN_Service.py replay evidence.jsonl --port 8080 --concurrency 64
+# %  *
+# %  **************************************************************************** */
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from BN_Serialize import load_network, save_network
+
+# Network of a worker process (set by _init_worker)
+_NETWORK = None
+
+
+def _init_worker(path):
+    global _NETWORK
+    _NETWORK = load_network(path)
+
+
+def _score(variables, evidence):
+    return _NETWORK.query_batch(variables, evidence)
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': p50, 'p90': p90, 'p99': p99, 'max': max(values)}
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Minimal HTTP/1.1
+# ------------------------------------------------------------------------------------------------------#
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error',
+            503: 'Service Unavailable'}
+
+
+async def _read_message(reader):
+    # Start line, headers and body (Content-Length only); None at end of stream.
+    # A Content-Length that is not a length raises ValueError.
+    line = await reader.readline()
+    if not line:
+        return None
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length < 0:
+        raise ValueError('negative Content-Length')
+    body = await reader.readexactly(length) if length else b''
+    return line.decode('latin-1').split(), headers, body
+
+
+def _response(status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    head = 'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % (
+        status, _REASONS[status], len(body))
+    return head.encode('latin-1') + body
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Service
+# ------------------------------------------------------------------------------------------------------#
+
+class TrustService:
+    """Micro-batching scorer for one model file (see BN_Serialize.save_network).
+
+    ``workers`` processes score the batches; with ``workers=0`` they are scored on a
+    thread of this process. At most ``queue_size`` requests wait; more are rejected.
+    """
+
+    def __init__(self, path, window=0.002, max_batch=1024, workers=1, queue_size=10000,
+                 variables=('trust',), history=10000):
+        self.path = path
+        self.network = load_network(path)
+        self.window = window
+        self.max_batch = max_batch
+        self.workers = workers
+        self.queue_size = queue_size
+        self.variables = tuple(variables)
+        self.latencies = deque(maxlen=history)
+        self.stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'batches': 0, 'batched': 0}
+        self._queue = deque()
+        self._servers = []
+
+    async def start(self, host=None, port=None, unix_path=None):
+        """Start the batcher, the workers and the listeners."""
+        if self.workers:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                 initargs=(self.path,))
+        else:
+            _init_worker(self.path)
+            self._executor = ThreadPoolExecutor(1)
+        self._slots = asyncio.Semaphore(max(self.workers, 1))
+        self._waiting = asyncio.Event()
+        self._full = asyncio.Event()
+        self._in_flight = 0
+        self._batcher = asyncio.create_task(self._run_batcher())
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._handle, host, port))
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._handle, unix_path))
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._batcher.cancel()
+        self._executor.shutdown(wait=True)
+
+    async def serve_forever(self):
+        await asyncio.gather(*[server.serve_forever() for server in self._servers])
+
+    def metrics(self):
+        """Queue depth, batches in flight, counters and latency percentiles (ms)."""
+        latencies = [1e3 * x for x in self.latencies]
+        batches = self.stats['batches']
+        return dict(self.stats, queue_depth=len(self._queue), in_flight=self._in_flight,
+                    mean_batch=self.stats['batched'] / batches if batches else None,
+                    latency_ms=_percentiles(latencies))
+
+    # ------------------------------------------------------------------------------------------------------#
+    # Requests
+    # ------------------------------------------------------------------------------------------------------#
+
+    async def submit(self, evidence, variables=None):
+        """Score one evidence dict; returns the posterior as nested lists."""
+        start = time.perf_counter()
+        variables = self.variables if variables is None else tuple(variables)
+        if len(self._queue) >= self.queue_size:
+            self.stats['rejected'] += 1
+            raise ServiceError(503, 'queue full')
+        try:
+            for name in variables:
+                self.network._node(name)
+            row = self.network.evidence_matrix([evidence])[0]
+        except (KeyError, ValueError, AttributeError) as exc:
+            raise self._bad_request(exc.args[0] if exc.args else str(exc)) from None
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((variables, row, future))
+        self.stats['requests'] += 1
+        self._waiting.set()
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+        result = await future
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def _bad_request(self, message):
+        self.stats['errors'] += 1
+        return ServiceError(400, message)
+
+    async def _run_batcher(self):
+        while True:
+            await self._waiting.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            await self._slots.acquire()
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            if len(self._queue) < self.max_batch:
+                self._full.clear()
+            if not self._queue:
+                self._waiting.clear()
+            self._in_flight += 1
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for variables, items in groups.items():
+                evidence = np.vstack([row for _, row, _ in items])
+                try:
+                    result = await loop.run_in_executor(self._executor, _score, variables, evidence)
+                except Exception as exc:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                # Rows first: a scenario network puts its scenario axis before the rows
+                result = np.moveaxis(result, len(self.network.param_shape), 0)
+                for (_, _, future), posterior in zip(items, result.tolist()):
+                    # The request of a cancelled future is gone; answer the others
+                    if not future.done():
+                        future.set_result(posterior)
+            self.stats['batches'] += 1
+            self.stats['batched'] += len(batch)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await _read_message(reader)
+                except ValueError as exc:
+                    # Without a valid Content-Length the next request cannot be found
+                    error = self._bad_request('bad Content-Length (%s)' % exc)
+                    writer.write(_response(error.status, {'error': str(error)}))
+                    await writer.drain()
+                    break
+                if message is None:
+                    break
+                start, headers, body = message
+                try:
+                    if len(start) < 2:
+                        raise self._bad_request('malformed request line')
+                    method, target = start[:2]
+                    if method == 'GET' and target == '/metrics':
+                        payload = self.metrics()
+                    elif method == 'GET' and target == '/health':
+                        payload = {'status': 'ok', 'fingerprint': self.network.fingerprint()}
+                    elif method == 'POST' and target == '/query':
+                        try:
+                            request = json.loads(body or b'{}')
+                        except ValueError:
+                            raise self._bad_request('body is not JSON') from None
+                        if not isinstance(request, dict):
+                            raise self._bad_request('body is not a JSON object')
+                        variables = request.get('variables') or self.variables
+                        if isinstance(variables, str):
+                            variables = (variables,)
+                        if not (isinstance(variables, (list, tuple))
+                                and all(isinstance(v, str) for v in variables)):
+                            raise self._bad_request('variables must be a name or a list of names')
+                        posterior = await self.submit(request.get('evidence') or {}, variables)
+                        payload = {'variables': list(variables), 'posterior': posterior}
+                        if getattr(self.network, 'scenarios', None):
+                            payload['scenarios'] = list(self.network.scenarios)
+                    else:
+                        raise ServiceError(404, 'no route for %s %s' % (method, target))
+                    writer.write(_response(200, payload))
+                except ServiceError as exc:
+                    writer.write(_response(exc.status, {'error': str(exc)}))
+                except Exception as exc:
+                    # A failed batch: answer this request and keep the connection
+                    self.stats['errors'] += 1
+                    writer.write(_response(500, {'error': '%s: %s' % (type(exc).__name__, exc)}))
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Load generator
+# ------------------------------------------------------------------------------------------------------#
+
+def read_evidence(path):
+    """Recorded requests, one JSON object per line: an evidence dict, or
+    {"evidence": {...}, "variables": [...], "t": seconds since the start}."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record if 'evidence' in record else {'evidence': record}
+
+
+async def replay(records, host='127.0.0.1', port=None, unix_path=None, concurrency=32, speed=None):
+    """Send recorded requests over ``concurrency`` keep-alive connections.
+
+    With ``speed`` the recorded ``t`` offsets are replayed (2.0 = twice as fast),
+    reproducing the bursts of the recording; otherwise requests are sent as fast
+    as the connections allow. Returns counts, throughput and latencies (ms).
+    """
+    records = iter(records)
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+
+    async def connection():
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for record in records:
+                if speed and 't' in record:
+                    delay = start + record['t'] / speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                body = json.dumps({k: v for k, v in record.items() if k != 't'}).encode('utf-8')
+                sent = time.perf_counter()
+                writer.write(b'POST /query HTTP/1.1\r\nHost: trust\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n\r\n' % len(body) + body)
+                (_, status, *_), _, _ = await _read_message(reader)
+                latencies.append(1e3 * (time.perf_counter() - sent))
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*[connection() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {'requests': len(latencies), 'status': statuses, 'elapsed': elapsed,
+            'throughput': len(latencies) / elapsed if elapsed else None,
+            'latency_ms': _percentiles(latencies)}
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Command line
+# ------------------------------------------------------------------------------------------------------#
+
+def _model_path(model):
+    # A model file as is, or a case of BN_DiscreteCPDs.py saved to a temporary file
+    if os.path.exists(model):
+        return model
+    from BN_DiscreteCPDs import make_network
+    from BN_Materialize import ROOT_INDICATORS
+
+    path = os.path.join(tempfile.mkdtemp(prefix='trust-'), '%s.bnt' % model)
+    save_network(make_network(model), path, queries=[(['trust'], ROOT_INDICATORS)])
+    return path
+
+
+async def _serve(args):
+    service = TrustService(_model_path(args.model), args.window_ms / 1e3, args.max_batch,
+                           args.workers, args.queue_size)
+    await service.start(args.host, args.port, args.unix)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Trust scoring service.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run the service')
+    serve.add_argument('--model', default='worst', help='model file or case of BN_DiscreteCPDs.py')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int)
+    serve.add_argument('--unix', help='path of a Unix socket')
+    serve.add_argument('--window-ms', type=float, default=2.0)
+    serve.add_argument('--max-batch', type=int, default=1024)
+    serve.add_argument('--workers', type=int, default=1)
+    serve.add_argument('--queue-size', type=int, default=10000)
+    client = commands.add_parser('replay', help='replay recorded evidence against a running service')
+    client.add_argument('records', help='JSON lines file of evidence')
+    client.add_argument('--host', default='127.0.0.1')
+    client.add_argument('--port', type=int)
+    client.add_argument('--unix')
+    client.add_argument('--concurrency', type=int, default=32)
+    client.add_argument('--speed', type=float, help='replay the recorded timing, scaled')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        if args.port is None and args.unix is None:
+            parser.error('serve needs --port and/or --unix')
+        asyncio.run(_serve(args))
+    else:
+        result = asyncio.run(replay(read_evidence(args.records), args.host, args.port, args.unix,
+                                    args.concurrency, args.speed))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
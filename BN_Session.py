@@ -0,0 +1,145 @@
+# %* *****************************************************************************
+# %  *  Title:  Incremental trust inference session
+# %  *  Description:
+# %  *  Device telemetry usually changes one indicator between two readings. A
+# %  *  TrustSession keeps the intermediate messages of the elimination plans of the
+# %  *  trust network and, when an observation changes, recomputes only the
+# %  *  contractions that depend on it:
+# - Every observable node has an evidence vector (all ones while unobserved).
+# - The plans of all tracked variables are merged into one set of messages;
+#    contractions that are identical in several plans are computed once.
+# - An update reruns only the messages downstream of the changed evidence
+#    vectors, then the final contraction of every tracked variable.
+# - As in CompiledNetwork._contract, the plans of large networks divide every
+#    message by its maximum, so that the messages of networks with thousands of
+#    observations do not underflow; the normalization of the final contraction
+#    removes the scale. Small networks skip this, which keeps updates cheap.
+# %  *
+# %  **************************************************************************** */
+
+import numpy as np
+
+from BN_Compiled import _RESCALE_FACTORS, CompiledNetwork, _rescale, compile_model
+from BN_Materialize import DETERMINANTS
+
+
+class TrustSession:
+    """Stateful P(targets | evidence) that is updated one observation at a time.
+
+    ``targets[0]`` is the primary query variable (``trust`` by default); the other
+    targets are reported by ``update`` only when their posterior changed.
+    ``observable`` lists the nodes that may receive evidence (default: all).
+    """
+
+    def __init__(self, model, targets=('trust',) + DETERMINANTS[:-1], observable=None, atol=1e-12):
+        network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+        self.network = network
+        self.targets = tuple(targets)
+        self.observable = network.nodes if observable is None else tuple(observable)
+        self.atol = atol
+        self.evidence = {}
+
+        # Merge the plans: every message gets one slot, keyed by what it is built
+        # from, so a contraction shared by several plans is stored (and updated) once.
+        self._buf, self._steps, self._slot = [], [], {}
+        self._finals = {}
+        plans = [network.plan([target], self.observable) for target in self.targets]
+        self._rescale = any(len(plan.factors) > _RESCALE_FACTORS for plan in plans)
+        for target, plan in zip(self.targets, plans):
+            local = []
+            for kind, node in plan.factors:
+                if (kind, node) not in self._slot:
+                    self._slot[(kind, node)] = len(self._buf)
+                    self._buf.append(network.factor_tables[node] if kind == 'factor'
+                                     else np.ones(network.cards[node]))
+                    self._steps.append(None)
+                local.append(self._slot[(kind, node)])
+            for inputs, subscripts in plan.steps:
+                key = (subscripts, tuple(local[i] for i in inputs))
+                if key not in self._slot:
+                    self._slot[key] = len(self._buf)
+                    self._buf.append(self._message(key))
+                    self._steps.append(key)
+                local.append(self._slot[key])
+            inputs, subscripts = plan.final
+            self._finals[target] = (subscripts, tuple(local[i] for i in inputs))
+
+        # For every evidence node, the messages that depend on it (in build order)
+        depends = []
+        for slot, step in enumerate(self._steps):
+            if step is None:
+                depends.append({slot})
+            else:
+                depends.append(set().union(*[depends[i] for i in step[1]]) | {slot})
+        self._paths = {}
+        for name in self.observable:
+            node = network._node(name)
+            source = self._slot[('evidence', node)]
+            self._paths[node] = [slot for slot, deps in enumerate(depends)
+                                 if source in deps and self._steps[slot] is not None]
+
+        self.posteriors = {target: self._final(target) for target in self.targets}
+
+    def __repr__(self):
+        return 'TrustSession(targets=%r, evidence=%r)' % (self.targets, self.evidence)
+
+    def _message(self, step):
+        subscripts, inputs = step
+        message = np.einsum(subscripts, *[self._buf[i] for i in inputs])
+        if self._rescale:
+            message, _ = _rescale(message, subscripts)
+        return message
+
+    def _final(self, target):
+        subscripts, inputs = self._finals[target]
+        joint = np.einsum(subscripts, *[self._buf[i] for i in inputs])
+        return CompiledNetwork._normalize(joint, 1)
+
+    def update(self, evidence):
+        """Apply changed observations and return the new posteriors.
+
+        ``evidence`` maps node names to a state, or to None to withdraw an
+        observation. The result always holds the primary target plus every other
+        target whose posterior moved by more than ``atol``.
+        """
+        network = self.network
+        # Validate every observation before changing anything, so that a bad one
+        # leaves the session as it was
+        changes = []
+        for name, value in evidence.items():
+            node = network._node(name)
+            if node not in self._paths:
+                raise KeyError('%r is not observable in this session' % (name,))
+            vec = np.ones(network.cards[node])
+            if value is not None:
+                vec[:] = 0.0
+                vec[network._state(node, value)] = 1.0
+            changes.append((name, value, node, vec))
+
+        dirty = set()
+        for name, value, node, vec in changes:
+            if value is None:
+                self.evidence.pop(name, None)
+            else:
+                self.evidence[name] = value
+            slot = self._slot[('evidence', node)]
+            if not np.array_equal(vec, self._buf[slot]):
+                self._buf[slot] = vec
+                dirty.update(self._paths[node])
+
+        for slot in sorted(dirty):
+            self._buf[slot] = self._message(self._steps[slot])
+
+        result = {}
+        for target in self.targets:
+            before = self.posteriors[target]
+            if dirty:
+                self.posteriors[target] = self._final(target)
+            after = self.posteriors[target]
+            if target == self.targets[0] or np.abs(after - before).max() > self.atol:
+                result[target] = after
+        return result
+
+    def reset(self):
+        """Withdraw all observations."""
+        return self.update({name: None for name in list(self.evidence)})
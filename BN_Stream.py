@@ -0,0 +1,251 @@
+# %* *****************************************************************************
+# %  *  Title:  Streaming telemetry to trust scores
+# %  *  Description:
+# %  *  The CPTs in BN_DiscreteCPDs.py describe raw quantities (memory and power
+# %  *  consumption, signal strength, latency, encryption level). This module turns a
+# %  *  stream of raw metric records into per-device trust scores. The steps are:
+# - Discretize: configurable thresholds map every raw metric to a state of its node.
+# - Micro-batch: records are grouped into column arrays and scored in one call,
+#    through the materialized root table when only root indicators are observed.
+# - Roll: every device keeps an exponentially weighted trust score; the number
+#    of devices kept is bounded (least recently seen devices are dropped).
+# Both the generator and the asyncio pipeline pull from their source, so a slow
+# consumer applies backpressure, and the scores only depend on record order:
+# replaying a recorded stream gives the same output as scoring it offline.
+# %  *
+# %  **************************************************************************** */
+
+import asyncio
+import json
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from BN_Compiled import MISSING, CompiledNetwork, compile_model
+from BN_Materialize import ROOT_INDICATORS, MaterializedTable
+
+# A raw metric is mapped to a node state by np.digitize(value, bins); with
+# reverse=True the states are flipped, so that (as in BN_DiscreteCPDs.py) the
+# highest state is the one that is good for trust.
+Rule = namedtuple('Rule', ['node', 'bins', 'reverse'])
+
+# Example thresholds for the raw metrics named in the CPT comments
+DEFAULT_RULES = {
+    'memory_pct': Rule('memory', (70.0,), True),            # high memory consumption -> 0
+    'power_mw': Rule('power', (500.0,), True),              # high power consumption -> 0
+    'rssi_dbm': Rule('rssi', (-70.0,), False),              # strong signal -> 1
+    'latency_ms': Rule('latency', (100.0,), True),          # high latency -> 0
+    'encryption_bits': Rule('confidentiality', (128.0,), False),  # strong encryption -> 1
+}
+
+Batch = namedtuple('Batch', ['devices', 'columns'])
+ScoredBatch = namedtuple('ScoredBatch', ['devices', 'scores', 'rolling'])
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Sources and micro-batching
+# ------------------------------------------------------------------------------------------------------#
+
+def _to_float(value):
+    return math.nan if value is None or value == '' else float(value)
+
+
+def make_batch(records, fields, device_field='device'):
+    """Turn a list of record dicts into a Batch of column arrays (missing -> NaN)."""
+    devices = np.array([r[device_field] for r in records], dtype=object)
+    columns = {f: np.fromiter((_to_float(r.get(f)) for r in records), float, len(records))
+               for f in fields}
+    return Batch(devices, columns)
+
+
+def micro_batches(records, fields, size=4096, device_field='device'):
+    """Group an iterable of record dicts into Batches of at most ``size`` records."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield make_batch(chunk, fields, device_field)
+            chunk = []
+    if chunk:
+        yield make_batch(chunk, fields, device_field)
+
+
+def read_jsonl(path, fields, size=4096, device_field='device'):
+    """Batches from a file with one JSON record per line."""
+    with open(path) as f:
+        records = (json.loads(line) for line in f if line.strip())
+        yield from micro_batches(records, fields, size, device_field)
+
+
+def read_csv(path, fields, size=65536, device_field='device'):
+    """Batches from a CSV file with a header row, parsed in chunks by pandas."""
+    import pandas as pd
+
+    for chunk in pd.read_csv(path, chunksize=size):
+        devices = chunk[device_field].to_numpy(dtype=object)
+        columns = {f: (chunk[f].to_numpy(dtype=float) if f in chunk
+                       else np.full(len(chunk), math.nan)) for f in fields}
+        yield Batch(devices, columns)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Scoring
+# ------------------------------------------------------------------------------------------------------#
+
+class TrustScorer:
+    """Discretize raw metric batches, infer P(target = state) and roll it per device.
+
+    ``alpha`` is the weight of the newest reading in the rolling score and
+    ``max_devices`` bounds the number of devices whose rolling score is kept.
+    """
+
+    def __init__(self, model, rules=None, target='trust', state=1, alpha=0.2, max_devices=100000):
+        self.network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self.target = target
+        self.state = self.network._state(self.network._node(target), state)
+        self.alpha = alpha
+        self.max_devices = max_devices
+        self.rolling = OrderedDict()
+        for field, rule in self.rules.items():
+            card = self.network.cards[self.network._node(rule.node)]
+            if len(rule.bins) + 1 != card:
+                raise ValueError('Rule %r has %d bins, %r has %d states (expected %d bins)'
+                                 % (field, len(rule.bins), rule.node, card, card - 1))
+
+        self.nodes = tuple(OrderedDict.fromkeys(rule.node for rule in self.rules.values()))
+        self.fields = tuple(self.rules)
+        self.table = None
+        if all(node in ROOT_INDICATORS for node in self.nodes):
+            self.table = MaterializedTable(self.network, roots=self.nodes, targets=(target,),
+                                           auto_refresh=False)
+
+    def discretize(self, columns):
+        """Evidence matrix (N x nodes) for a dict of raw metric columns."""
+        n = len(next(iter(columns.values()))) if columns else 0
+        evidence = np.full((n, len(self.nodes)), MISSING, dtype=np.int64)
+        for field, rule in self.rules.items():
+            values = columns.get(field)
+            if values is None:
+                continue
+            values = np.asarray(values, dtype=float)
+            states = np.digitize(values, rule.bins)
+            if rule.reverse:
+                states = len(rule.bins) - states
+            observed = ~np.isnan(values)
+            j = self.nodes.index(rule.node)
+            evidence[observed, j] = states[observed]
+        return evidence
+
+    def infer(self, evidence):
+        """P(target = state) for every row of an evidence matrix."""
+        if self.table is not None:
+            posterior = self.table.lookup_batch(evidence)[self.target]
+        else:
+            posterior = self.network.query_batch([self.target], evidence, columns=self.nodes)
+        return posterior[..., self.state]
+
+    def _roll(self, devices, scores):
+        rolling = np.empty_like(scores)
+        state, alpha = self.rolling, self.alpha
+        for k, (device, score) in enumerate(zip(devices, scores)):
+            previous = state.pop(device, None)
+            value = score if previous is None else previous + alpha * (score - previous)
+            state[device] = value
+            rolling[k] = value
+            # Evict per record, so the scores do not depend on the batch size
+            if len(state) > self.max_devices:
+                state.popitem(last=False)
+        return rolling
+
+    def score_batch(self, batch):
+        scores = self.infer(self.discretize(batch.columns))
+        if scores.ndim != 1:
+            raise ValueError('Rolling scores need a network without stacked CPTs')
+        return ScoredBatch(batch.devices, scores, self._roll(batch.devices, scores))
+
+    def score(self, batches):
+        """Generator of ScoredBatches, one per input Batch."""
+        for batch in batches:
+            yield self.score_batch(batch)
+
+
+def score_records(model, records, rules=None, size=4096, device_field='device', **kwargs):
+    """Offline scoring of a list of records; returns one ScoredBatch for all of them."""
+    scorer = TrustScorer(model, rules, **kwargs)
+    scored = list(scorer.score(micro_batches(records, scorer.fields, size, device_field)))
+    if not scored:
+        return ScoredBatch(np.array([], dtype=object), np.array([]), np.array([]))
+    return ScoredBatch(*(np.concatenate(parts) for parts in zip(*scored)))
+
+
+# ------------------------------------------------------------------------------------------------------#
+# asyncio pipeline
+# ------------------------------------------------------------------------------------------------------#
+
+async def read_records(reader):
+    """Async generator of JSON records from an asyncio StreamReader (socket or pipe)."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if line.strip():
+            yield json.loads(line)
+
+
+async def stream_scores(records, scorer, size=4096, max_delay=0.05, queue_size=8, device_field='device'):
+    """Async generator of ScoredBatches from an async iterable of record dicts.
+
+    Records are cut into micro-batches of at most ``size`` records or ``max_delay``
+    seconds. At most ``queue_size`` batches wait for scoring; when the queue is
+    full the reader stops pulling from the source (backpressure). ``device_field``
+    names the device id of the records.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+    lock = asyncio.Lock()
+    done = object()
+    chunk = []
+    started = [0.0]
+
+    async def flush():
+        # Take the chunk under the lock so batches enter the queue in record order
+        async with lock:
+            if chunk:
+                batch = make_batch(chunk[:], scorer.fields, device_field)
+                del chunk[:]
+                await queue.put(batch)
+
+    async def produce():
+        loop = asyncio.get_running_loop()
+        try:
+            async for record in records:
+                if not chunk:
+                    started[0] = loop.time()
+                chunk.append(record)
+                if len(chunk) >= size:
+                    await flush()
+            await flush()
+        finally:
+            await queue.put(done)
+
+    async def tick():
+        # Flush partial batches that have waited for max_delay seconds
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max_delay)
+            if chunk and loop.time() - started[0] >= max_delay:
+                await flush()
+
+    producer = asyncio.ensure_future(produce())
+    ticker = asyncio.ensure_future(tick())
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is done:
+                break
+            yield scorer.score_batch(batch)
+        await producer
+    finally:
+        producer.cancel()
+        ticker.cancel()
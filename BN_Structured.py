@@ -0,0 +1,314 @@
+# %* *****************************************************************************
+# %  *  Title:  Structured CPDs for large trust networks
+# %  *  Description:
+# %  *  A full TabularCPD of a node with n parents of k states holds k^(n+1) numbers,
+# %  *  which is what keeps the trust model at two-parent binary nodes. The CPDs in
+# %  *  this module describe P(node | parents) with a number of parameters that is
+# %  *  linear in the number of parents, and hand the compiled network a product of
+# %  *  small factors over hidden variables instead of a dense table:
+# - NoisyMaxCPD (noisy-MAX / noisy-MIN, noisy_or): P(Y <= y | x) = leak(y) * prod_i C_i(y | x_i).
+#    With a hidden copy Y' of Y, P(Y = y | x) = sum_Y' d(Y, Y') * leak(Y') * prod_i C_i(Y' | x_i),
+#    where d(y, y') = +1 for y' = y and -1 for y' = y - 1.
+# - DeterministicCPD: Y = max, min or (clipped) sum of the parent states. max and min
+#    use the decomposition above; sum is a chain of hidden partial sums.
+# - TreeCPD / SparseCPD: context specific tables. A hidden leaf selector L gives
+#    P(Y = y | x) = sum_L theta(y, L) * prod_p h_p(L, x_p) with one indicator per parent.
+# Every CPD can also compute P(Y | parent states) directly (conditional) and expand to a
+# dense table (to_dense) for checks against TabularCPD. A plain StructuredCPD (e.g. one
+# loaded by BN_Serialize.py) computes them from its factors.
+# %  *
+# %  **************************************************************************** */
+
+import string
+
+import numpy as np
+
+
+def _multiply(factors):
+    # Product of (scope, table) factors whose tables have a leading row axis
+    scope, table = factors[0]
+    for other, values in factors[1:]:
+        union = scope + tuple(v for v in other if v not in scope)
+        letters = dict(zip(union, string.ascii_letters))
+        subscripts = '...%s,...%s->...%s' % tuple(''.join(letters[v] for v in s) for s in (scope, other, union))
+        scope, table = union, np.einsum(subscripts, table, values)
+    return scope, table
+
+
+class StructuredCPD:
+    """Base class: P(variable | evidence) as a product of small factors.
+
+    ``factors`` is a list of (scope, table) where the scope names the variable, its
+    parents and hidden variables (``hidden`` maps hidden names to cardinalities).
+    Hidden variables are summed out by inference and cannot be queried.
+    """
+
+    def __init__(self, variable, variable_card, evidence=(), evidence_card=()):
+        self.variable = variable
+        self.variable_card = int(variable_card)
+        self.evidence = list(evidence)
+        self.evidence_card = [int(c) for c in evidence_card]
+        if len(self.evidence) != len(self.evidence_card):
+            raise ValueError('evidence and evidence_card of %r differ in length' % (variable,))
+        self.hidden = {}
+        self.factors = []
+
+    def __repr__(self):
+        return '%s(%r | %d parents)' % (type(self).__name__, self.variable, len(self.evidence))
+
+    def _hidden(self, name, card):
+        name = '%s#%s' % (self.variable, name)
+        self.hidden[name] = int(card)
+        return name
+
+    def _states(self, states):
+        states = np.asarray(states, dtype=np.int64)
+        if states.ndim != 2 or states.shape[1] != len(self.evidence):
+            raise ValueError('Parent states must have shape (N, %d)' % len(self.evidence))
+        return states
+
+    def conditional(self, states):
+        """P(variable | parents) for an (N x parents) matrix of parent states: (N x card).
+
+        The base class indexes the parent axes of every factor with the parent states
+        and sums out the hidden variables one at a time; subclasses use closed forms.
+        """
+        states = self._states(states)
+        position = {name: i for i, name in enumerate(self.evidence)}
+        factors = []
+        for scope, table in self.factors:
+            table = np.asarray(table, dtype=float)
+            axes = [k for k, v in enumerate(scope) if v in position]
+            rest = tuple(v for v in scope if v not in position)
+            if axes:
+                index = tuple(states[:, position[scope[k]]] for k in axes)
+                table = np.moveaxis(table, axes, range(len(axes)))[index]
+            else:
+                table = np.broadcast_to(table, (len(states),) + table.shape)
+            factors.append((rest, table))
+        for name in self.hidden:
+            group = [f for f in factors if name in f[0]]
+            factors = [f for f in factors if name not in f[0]]
+            scope, table = _multiply(group)
+            factors.append((tuple(v for v in scope if v != name), table.sum(axis=1 + scope.index(name))))
+        scope, table = _multiply(factors)
+        return table
+
+    def to_dense(self):
+        """The equivalent dense table, laid out like TabularCPD.values."""
+        grid = np.indices(self.evidence_card).reshape(len(self.evidence), -1).T
+        values = self.conditional(grid)
+        return values.T.reshape([self.variable_card] + self.evidence_card)
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Noisy-MAX / noisy-MIN
+# ------------------------------------------------------------------------------------------------------#
+
+def _difference(card, mode):
+    # d(y, y') turns the cumulative product back into a distribution
+    d = np.eye(card)
+    if mode == 'max':
+        d[1:, :-1] -= np.eye(card - 1)
+    else:
+        d[:-1, 1:] -= np.eye(card - 1)
+    return d
+
+
+def _cumulative(table, mode, axis=0):
+    # P(Y <= y) for max, P(Y >= y) for min
+    if mode == 'max':
+        return np.cumsum(table, axis=axis)
+    return np.flip(np.cumsum(np.flip(table, axis=axis), axis=axis), axis=axis)
+
+
+class NoisyMaxCPD(StructuredCPD):
+    """Noisy-MAX (or noisy-MIN with ``mode='min'``) over ordered states.
+
+    ``weights[i]`` has shape (variable_card, evidence_card[i]): column s is the
+    distribution of the contribution of parent i when it is in state s. ``leak`` is
+    the distribution of the contribution of unmodelled causes (default: the lowest
+    state for max, the highest for min, i.e. no leak).
+    """
+
+    def __init__(self, variable, variable_card, evidence, evidence_card, weights, leak=None, mode='max'):
+        super().__init__(variable, variable_card, evidence, evidence_card)
+        if mode not in ('max', 'min'):
+            raise ValueError("mode must be 'max' or 'min'")
+        self.mode = mode
+        card = self.variable_card
+        self.weights = []
+        for parent, parent_card, w in zip(self.evidence, self.evidence_card, weights):
+            w = np.asarray(w, dtype=float)
+            if w.shape != (card, parent_card):
+                raise ValueError('Weights of %r have shape %r, expected %r'
+                                 % (parent, w.shape, (card, parent_card)))
+            self.weights.append(w)
+        if len(self.weights) != len(self.evidence):
+            raise ValueError('One weight table per parent is required')
+        if leak is None:
+            leak = np.zeros(card)
+            leak[0 if mode == 'max' else -1] = 1.0
+        self.leak = np.asarray(leak, dtype=float)
+
+        y = self._hidden('y', card)
+        self.factors.append(((self.variable, y), _difference(card, mode)))
+        self.factors.append(((y,), _cumulative(self.leak, mode)))
+        for parent, w in zip(self.evidence, self.weights):
+            self.factors.append(((y, parent), _cumulative(w, mode)))
+
+    def conditional(self, states):
+        states = self._states(states)
+        total = np.tile(_cumulative(self.leak, self.mode), (len(states), 1))
+        for i, w in enumerate(self.weights):
+            total *= _cumulative(w, self.mode)[:, states[:, i]].T
+        return total @ _difference(self.variable_card, self.mode).T
+
+
+def noisy_or(variable, evidence, probabilities, leak=0.0):
+    """Binary noisy-OR: each parent in state 1 independently sets the node to 1
+    with its probability; ``leak`` is the probability of 1 with all parents at 0."""
+    weights = [[[1.0, 1.0 - p], [0.0, p]] for p in probabilities]
+    return NoisyMaxCPD(variable, 2, evidence, [2] * len(evidence), weights, [1.0 - leak, leak])
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Deterministic aggregation
+# ------------------------------------------------------------------------------------------------------#
+
+class DeterministicCPD(StructuredCPD):
+    """Y = max, min or sum of the parent states (clipped to 0..variable_card-1)."""
+
+    def __init__(self, variable, variable_card, evidence, evidence_card, function='max'):
+        super().__init__(variable, variable_card, evidence, evidence_card)
+        if function not in ('max', 'min', 'sum'):
+            raise ValueError("function must be 'max', 'min' or 'sum'")
+        self.function = function
+        card = self.variable_card
+
+        if function in ('max', 'min'):
+            y = self._hidden('y', card)
+            leak = np.zeros(card)
+            leak[0 if function == 'max' else -1] = 1.0
+            self.factors.append(((self.variable, y), _difference(card, function)))
+            self.factors.append(((y,), _cumulative(leak, function)))
+            for parent, parent_card in zip(self.evidence, self.evidence_card):
+                hit = np.minimum(np.arange(parent_card), card - 1)
+                w = (np.arange(card)[:, None] == hit).astype(float)
+                self.factors.append(((y, parent), _cumulative(w, function)))
+            return
+
+        # Chain of partial sums s_k = min(s_{k-1} + x_k, card - 1)
+        if not self.evidence:
+            self.factors.append(((self.variable,), np.eye(card)[0]))
+            return
+        previous = None
+        for k, (parent, parent_card) in enumerate(zip(self.evidence, self.evidence_card)):
+            last = k == len(self.evidence) - 1
+            current = self.variable if last else self._hidden('s%d' % k, card)
+            if previous is None:
+                hit = np.minimum(np.arange(parent_card), card - 1)
+                table = (np.arange(card)[:, None] == hit).astype(float)
+                self.factors.append(((current, parent), table))
+            else:
+                hit = np.minimum(np.arange(card)[:, None] + np.arange(parent_card), card - 1)
+                table = (np.arange(card)[:, None, None] == hit).astype(float)
+                self.factors.append(((current, previous, parent), table))
+            previous = current
+
+    def conditional(self, states):
+        states = self._states(states)
+        if not self.evidence:
+            value = np.zeros(len(states), dtype=np.int64)
+        elif self.function == 'max':
+            value = states.max(axis=1)
+        elif self.function == 'min':
+            value = states.min(axis=1)
+        else:
+            value = states.sum(axis=1)
+        return np.eye(self.variable_card)[np.minimum(value, self.variable_card - 1)]
+
+
+# ------------------------------------------------------------------------------------------------------#
+# Context specific tables
+# ------------------------------------------------------------------------------------------------------#
+
+class _ContextCPD(StructuredCPD):
+    # P(Y | x) = sum_L theta(Y, L) * prod_p h_p(L, x_p); h_p(L, s) = 1 unless the
+    # context of L fixes p to another state.
+
+    def _build(self, theta, contexts):
+        self.theta = np.asarray(theta, dtype=float)
+        self.contexts = contexts
+        leaf = self._hidden('leaf', self.theta.shape[1])
+        self.factors.append(((self.variable, leaf), self.theta))
+        self.indicators = []
+        for i, (parent, parent_card) in enumerate(zip(self.evidence, self.evidence_card)):
+            if not any(parent in ctx for ctx in contexts):
+                continue
+            h = np.ones((len(contexts), parent_card))
+            for k, ctx in enumerate(contexts):
+                if parent in ctx:
+                    h[k] = np.arange(parent_card) == ctx[parent]
+            self.indicators.append((i, h))
+            self.factors.append(((leaf, parent), h))
+
+    def conditional(self, states):
+        states = self._states(states)
+        selected = np.ones((len(states), len(self.contexts)))
+        for i, h in self.indicators:
+            selected *= h[:, states[:, i]].T
+        return selected @ self.theta.T
+
+
+class TreeCPD(_ContextCPD):
+    """Tree structured CPD.
+
+    ``tree`` is either a leaf (a distribution over the states of the variable) or
+    a split ``(parent, [subtree for each state of parent])``.
+    """
+
+    def __init__(self, variable, variable_card, evidence, evidence_card, tree):
+        super().__init__(variable, variable_card, evidence, evidence_card)
+        leaves, contexts = [], []
+
+        def walk(node, context):
+            if isinstance(node, tuple) and len(node) == 2 and isinstance(node[0], str):
+                parent, branches = node
+                if parent not in self.evidence:
+                    raise ValueError('%r is not a parent of %r' % (parent, variable))
+                if parent in context:
+                    raise ValueError('%r is tested twice on one path' % (parent,))
+                card = self.evidence_card[self.evidence.index(parent)]
+                if len(branches) != card:
+                    raise ValueError('Split on %r needs %d branches' % (parent, card))
+                for state, branch in enumerate(branches):
+                    walk(branch, dict(context, **{parent: state}))
+            else:
+                leaf = np.asarray(node, dtype=float)
+                if leaf.shape != (self.variable_card,):
+                    raise ValueError('Leaf of %r must have %d probabilities' % (variable, self.variable_card))
+                leaves.append(leaf)
+                contexts.append(context)
+
+        walk(tree, {})
+        self._build(np.stack(leaves, axis=1), contexts)
+
+
+class SparseCPD(_ContextCPD):
+    """CPD with a default distribution and explicit exceptions.
+
+    ``entries`` maps full parent configurations (tuples in evidence order) to the
+    distribution used for that configuration; all others use ``default``.
+    """
+
+    def __init__(self, variable, variable_card, evidence, evidence_card, default, entries):
+        super().__init__(variable, variable_card, evidence, evidence_card)
+        default = np.asarray(default, dtype=float)
+        columns, contexts = [default], [{}]
+        for config, values in entries.items():
+            if len(config) != len(self.evidence):
+                raise ValueError('Configuration %r does not match the parents of %r' % (config, variable))
+            columns.append(np.asarray(values, dtype=float) - default)
+            contexts.append(dict(zip(self.evidence, config)))
+        self._build(np.stack(columns, axis=1), contexts)
@@ -0,0 +1,76 @@
+# %* *****************************************************************************
+# %  *  Title:  Uncertainty propagation for the expert CPTs
+# %  *  Description:
+# %  *  The expert CPT values in BN_DiscreteCPDs.py are point estimates. This module
+# %  *  treats every CPT column (the distribution of a node for one configuration of
+# %  *  its parents) as a Dirichlet around the expert values and propagates the
+# %  *  uncertainty to the trust posterior. The steps are:
+# - Sample: column ~ Dirichlet(concentration * expert column), drawn for all
+#    samples at once with normalized Gamma variates.
+# - Stack: the sampled CPTs become the parameter axis of one CompiledNetwork, so
+#    all samples are evaluated by the same contractions in a single query.
+# - Summarize: mean, SD and credible interval of P(variables | evidence).
+# A larger concentration means more confidence in the expert values.
+# %  *
+# %  **************************************************************************** */
+
+from collections import namedtuple
+
+import numpy as np
+
+from BN_Compiled import CompiledNetwork, compile_model
+
+Interval = namedtuple('Interval', ['mean', 'std', 'lower', 'upper', 'level'])
+
+
+def sample_networks(model, samples=10000, concentration=50.0, nodes=None, seed=None):
+    """CompiledNetwork whose CPTs hold ``samples`` Dirichlet draws along the parameter axis.
+
+    ``concentration`` is a number or a dict {node: number}; ``nodes`` limits the
+    sampling to some CPTs (the others stay at their expert values). Entries that
+    are exactly zero stay zero.
+    """
+    network = model if isinstance(model, CompiledNetwork) else compile_model(model)
+    if network.param_shape:
+        raise ValueError('The network already has stacked CPTs')
+    rng = np.random.default_rng(seed)
+    if nodes is None:
+        nodes = [name for name, cpt in zip(network.nodes, network.cpts) if isinstance(cpt, np.ndarray)]
+
+    tables = {}
+    for name in nodes:
+        node = network._node(name)
+        weight = concentration.get(name) if isinstance(concentration, dict) else concentration
+        if weight is None:
+            continue
+        if weight <= 0:
+            raise ValueError('Concentration of %r must be positive' % (name,))
+        if not isinstance(network.cpts[node], np.ndarray):
+            raise ValueError('CPD of %r is structured and cannot be sampled' % (name,))
+        alpha = weight * network.cpts[node]
+        draws = rng.gamma(alpha, size=(samples,) + alpha.shape)
+        tables[name] = draws / draws.sum(axis=1, keepdims=True)
+    return network.with_cpts(tables)
+
+
+def credible_interval(posteriors, level=0.95, axis=0):
+    """Mean, SD and central credible interval of sampled posteriors along ``axis``."""
+    posteriors = np.asarray(posteriors)
+    tail = (1.0 - level) / 2.0
+    lower, upper = np.quantile(posteriors, [tail, 1.0 - tail], axis=axis)
+    return Interval(posteriors.mean(axis=axis), posteriors.std(axis=axis), lower, upper, level)
+
+
+def posterior_interval(model, variables, evidence=None, samples=10000, concentration=50.0,
+                       level=0.95, nodes=None, seed=None):
+    """Credible interval of P(variables | evidence) under Dirichlet CPT uncertainty.
+
+    ``evidence`` is a dict (single query) or an (N x nodes) evidence matrix as
+    accepted by CompiledNetwork.query_batch; the interval then has a leading N axis.
+    """
+    sampled = sample_networks(model, samples, concentration, nodes, seed)
+    if evidence is None or isinstance(evidence, dict):
+        posteriors = sampled.query(variables, evidence)
+    else:
+        posteriors = sampled.query_batch(variables, evidence)
+    return credible_interval(posteriors, level)
@@ -0,0 +1,28 @@
+# Shared fixtures of the test modules (test_*.py next to the BN_*.py modules)
+
+import numpy as np
+import pytest
+
+from BN_Benchmark import synthetic_tables
+from BN_Compiled import compile_tables
+from BN_DiscreteCPDs import make_network
+
+
+@pytest.fixture(scope='session')
+def network():
+    """The compiled 'actual' trust network."""
+    return make_network('actual')
+
+
+@pytest.fixture(scope='session')
+def large():
+    """A 2000-node synthetic trust network (1333 indicator roots)."""
+    return compile_tables(synthetic_tables(2000))
+
+
+@pytest.fixture(scope='session')
+def large_evidence(large):
+    """An observation of every root of the large network: its likelihood is far below
+    the smallest double, so unscaled contractions underflow."""
+    rng = np.random.default_rng(0)
+    return {name: int(rng.integers(2)) for name in large.nodes if name.startswith('ind')}
@@ -0,0 +1,61 @@
+# Tests of BN_Approximate.py: sampled posteriors against exact inference
+
+import numpy as np
+import pytest
+
+from BN_Approximate import gibbs, likelihood_weighting, query
+
+EVIDENCE = {'trust': 0, 'rssi': 1}
+
+
+def test_likelihood_weighting_is_within_its_bound(network):
+    result = likelihood_weighting(network, ['robustness'], EVIDENCE, samples=40000, seed=0)
+    exact = network.query(['robustness'], EVIDENCE)
+    assert np.abs(result.posterior - exact).max() <= 2 * result.bound
+    assert 0 < result.ess < 40000
+    assert result.samples == 40000
+
+
+def test_gibbs_is_within_its_bound(network):
+    result = gibbs(network, ['robustness'], EVIDENCE, samples=20000, chains=200, burn_in=50, seed=0)
+    exact = network.query(['robustness'], EVIDENCE)
+    assert np.abs(result.posterior - exact).max() <= 2 * result.bound
+    assert result.rhat < 1.1
+
+
+@pytest.mark.parametrize('observed', [400, 1333])
+def test_likelihood_weighting_on_a_large_network(large, large_evidence, observed):
+    evidence = dict(list(large_evidence.items())[:observed])
+    result = likelihood_weighting(large, ['trust'], evidence, samples=2000, seed=0)
+    assert np.isfinite(result.posterior).all()
+    assert np.isfinite(result.ess) and result.ess > 0
+    assert np.isfinite(result.bound)
+    assert np.abs(result.posterior - large.query(['trust'], evidence)).max() <= 2 * result.bound
+
+
+def test_gibbs_honours_the_deadline(network):
+    result = gibbs(network, ['trust'], {'robustness': 0}, deadline=0.01, burn_in=2000, seed=0)
+    assert result.elapsed < 0.5
+    assert result.samples >= 2 * 256
+
+
+def test_likelihood_weighting_honours_the_deadline(network):
+    result = likelihood_weighting(network, ['trust'], {'robustness': 0}, deadline=0.01, chunk=1000, seed=0)
+    assert result.elapsed < 0.5
+
+
+def test_query_methods(network):
+    exact = query(network, ['trust'], {'robustness': 0})
+    np.testing.assert_array_equal(exact.posterior, network.query(['trust'], {'robustness': 0}))
+    assert exact.bound == 0.0
+    sampled = query(network, ['trust'], {'robustness': 0}, method='gibbs', samples=1000, seed=0)
+    assert sampled.method == 'gibbs'
+    with pytest.raises(ValueError):
+        query(network, ['trust'], method='rejection')
+
+
+@pytest.mark.parametrize('method', ['likelihood_weighting', 'gibbs'])
+@pytest.mark.parametrize('samples', [0, -5])
+def test_sample_budget_must_be_positive(network, method, samples):
+    with pytest.raises(ValueError, match='samples must be at least 1'):
+        query(network, ['trust'], {'robustness': 0}, method=method, samples=samples)
@@ -0,0 +1,95 @@
+# Tests of BN_Benchmark.py: synthetic networks, metrics and regression checks
+
+import json
+import os
+import timeit
+
+import numpy as np
+import pytest
+
+import BN_Benchmark
+import BN_DiscreteCPDs
+from BN_Benchmark import bench_models, compare, main, run, synthetic_tables
+from BN_Compiled import compile_tables
+
+
+@pytest.fixture
+def fast_timing(monkeypatch):
+    # A short best-of-three timing keeps the tests fast
+    monkeypatch.setattr(BN_Benchmark, '_seconds', lambda fn, repeat=5: min(timeit.repeat(fn, number=1, repeat=3)))
+
+
+@pytest.mark.parametrize('nodes, fan_in, states', [(20, 3, 2), (100, 4, 3)])
+def test_synthetic_tables(nodes, fan_in, states):
+    network = compile_tables(synthetic_tables(nodes, fan_in, states))
+    assert len(network.nodes) == nodes
+    assert max(len(p) for p in network.parents) == fan_in
+    assert set(network.cards) == {states}
+    for cpt in network.cpts:
+        np.testing.assert_allclose(cpt.sum(axis=0), 1.0)
+    assert all(name.startswith('ind') for name, p in zip(network.nodes, network.parents) if not p)
+
+
+def test_run_and_baseline(tmp_path, fast_timing):
+    report = run(sizes=[20], batch_sizes=[1, 100], models=False, imports=False)
+    results = report['results']
+    assert {'build.synthetic.20', 'latency.synthetic.20.prior', 'throughput.synthetic.20.batch100',
+            'memory.synthetic.20'} <= set(results)
+    assert compare(report, report) == []
+
+    slower = json.loads(json.dumps(report))
+    slower['results']['latency.synthetic.20.prior']['value'] *= 10
+    slower['results']['throughput.synthetic.20.batch100']['value'] /= 10
+    regressions = {r['metric'] for r in compare(slower, report)}
+    assert regressions == {'latency.synthetic.20.prior', 'throughput.synthetic.20.batch100'}
+    assert compare(report, slower) == []
+
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps({'results': {key: slower['results'][key] for key in regressions}}))
+    args = ['--output', str(tmp_path / 'bench.json'), '--sizes', '20', '--batch-sizes', '1',
+            '--no-models', '--no-imports']
+    assert main(args + ['--baseline', str(path)]) == 0
+    path.write_text(json.dumps({'results': {'latency.synthetic.20.prior': {'value': 1e-9}}}))
+    assert main(args + ['--baseline', str(path)]) == 1
+
+
+def test_model_builds_exclude_warm_up(monkeypatch):
+    # Every build that is recorded runs inside _seconds; the first build of the
+    # session (imports, caches) runs before any of them and is not recorded
+    events = []
+    timing = []
+
+    def seconds(fn, repeat=5):
+        timing.append(True)
+        fn()
+        timing.pop()
+        return 1e-3
+
+    def logged(name, build):
+        def wrapper(case):
+            events.append((name, case, bool(timing)))
+            return build(case)
+        return wrapper
+
+    monkeypatch.setattr(BN_Benchmark, '_seconds', seconds)
+    monkeypatch.setattr(BN_DiscreteCPDs, 'make_network', logged('network', BN_DiscreteCPDs.make_network))
+    monkeypatch.setattr(BN_DiscreteCPDs, 'make_model', logged('model', BN_DiscreteCPDs.make_model))
+    results = {}
+    bench_models(results)
+    assert events[0] == ('network', 'actual', False)
+    for case in ('actual', 'best', 'worst'):
+        assert ('network', case, True) in events
+        assert results['build.compile.%s' % case]['value'] == 1e-3
+    if 'build.modelactual' in results:
+        first = next(event for event in events if event[0] == 'model')
+        assert first == ('model', 'actual', False)
+        assert {'latency.q1.bnlearn', 'latency.q4.bnlearn'} <= set(results)
+
+
+def test_stored_baseline_covers_the_suite(fast_timing):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')) as f:
+        baseline = json.load(f)
+    report = run(sizes=[20], batch_sizes=[1, 100], models=True, imports=False)
+    assert set(report['results']) <= set(baseline['results'])
+    for key, metric in report['results'].items():
+        assert baseline['results'][key]['unit'] == metric['unit'] and baseline['results'][key]['value'] > 0
@@ -0,0 +1,80 @@
+# Tests of BN_Cache.py: hits, LRU eviction, invalidation and bounded memory
+
+import gc
+import warnings
+
+import numpy as np
+import pytest
+
+from BN_Cache import PosteriorCache
+from BN_Compiled import model_fingerprint
+from BN_DiscreteCPDs import CASES, edges, make_cpds, make_network
+
+
+def test_hits_and_evidence_order(network):
+    cache = PosteriorCache()
+    first = cache.query(network, ['trust'], {'robustness': 0, 'rssi': 1})
+    second = cache.query(network, ['trust'], {'rssi': np.int64(1), 'robustness': 0})
+    assert second is first
+    assert cache.cache_info()[:2] == (1, 1)
+    np.testing.assert_allclose(first, network.query(['trust'], {'robustness': 0, 'rssi': 1}))
+    with pytest.raises(ValueError):
+        first[0] = 1.0
+
+
+def test_lru_eviction(network):
+    cache = PosteriorCache(maxsize=2)
+    cache.query(network, ['trust'], {'robustness': 0})
+    cache.query(network, ['trust'], {'robustness': 1})
+    cache.query(network, ['trust'], {'robustness': 0})
+    cache.query(network, ['trust'], {'security': 0})
+    assert len(cache) == 2
+    cache.query(network, ['trust'], {'robustness': 0})
+    assert cache.cache_info().hits == 2
+
+
+def test_compiled_networks_are_bounded(network):
+    cache = PosteriorCache(maxsize=4)
+    rng = np.random.default_rng(0)
+    for _ in range(51):
+        table = rng.dirichlet([1, 1], size=2).T
+        cache.query(network.with_cpts({'privacy': table}), ['trust'])
+    gc.collect()
+    assert len(cache) == 4
+    assert len(cache._compiled) <= 4
+    assert len(cache._owners) <= 4
+
+
+def test_changed_model_invalidates_its_entries():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from pgmpy.models import DiscreteBayesianNetwork
+    model = DiscreteBayesianNetwork(edges)
+    model.add_cpds(*make_cpds('actual'))
+    cache = PosteriorCache()
+    cache.query(model, ['trust'])
+    cache.query(model, ['trust'], {'robustness': 0})
+
+    best = {cpd.variable: cpd for cpd in make_cpds('best')}
+    model.remove_cpds(*[model.get_cpds(name) for name in ('robustness', 'security', 'privacy')])
+    model.add_cpds(best['robustness'], best['security'], best['privacy'])
+    result = cache.query(model, ['trust'])
+    np.testing.assert_allclose(result, make_network('best').query(['trust']))
+    assert len(cache) == 1
+    assert len(cache._compiled) == 1
+
+
+def test_untracked_models_still_key_on_values():
+    cache = PosteriorCache()
+    actual = cache.query(make_cpds('actual'), ['trust'])
+    best = cache.query(make_cpds('best'), ['trust'])
+    np.testing.assert_allclose(actual, make_network('actual').query(['trust']))
+    np.testing.assert_allclose(best, make_network('best').query(['trust']))
+
+
+def test_keyword_dict_models():
+    cache = PosteriorCache()
+    assert model_fingerprint(CASES['actual']) == model_fingerprint(make_cpds('actual'))
+    result = cache.query(CASES['worst'], ['trust'], {'robustness': 0})
+    np.testing.assert_allclose(result, make_network('worst').query(['trust'], {'robustness': 0}))
+    assert cache.query(CASES['worst'], ['trust'], {'robustness': 0}) is result
@@ -0,0 +1,147 @@
+# Tests of BN_Compare.py: divergences against the materialized joint distributions
+
+import numpy as np
+import pytest
+
+from BN_Compare import compare_joint, compare_posterior, pairwise, total_variation
+from BN_Compiled import CompiledNetwork
+from BN_DiscreteCPDs import CASES, make_network, make_scenarios
+from BN_Structured import StructuredCPD, noisy_or
+
+
+def _joint(network):
+    # The full joint with the axes in name order, so differently ordered DAGs line up
+    return network.query(sorted(network.nodes)).ravel()
+
+
+def _brute(p, q):
+    p, q = _joint(p), _joint(q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl = np.where(p > 0, p * np.log(p / q), 0.0).sum()
+    return kl, 0.5 * np.abs(p - q).sum(), np.sqrt(p * q).sum()
+
+
+def _small():
+    # Three models over a, b, c, d: two different DAGs and a noisy-or child
+    rng = np.random.default_rng(0)
+
+    def table(card, *parent_cards):
+        values = rng.random((card,) + parent_cards) + 0.05
+        return values / values.sum(axis=0)
+
+    p = CompiledNetwork('abcd', [2, 3, 2, 2], [[], [0], [0, 1], [2]],
+                        [table(2), table(3, 2), table(2, 2, 3), table(2, 2)])
+    q = CompiledNetwork('dcba', [2, 2, 3, 2], [[], [0], [1], [2, 1]],
+                        [table(2), table(2, 2), table(3, 2), table(2, 3, 2)])
+    s = CompiledNetwork('abcd', [2, 3, 2, 2], [[], [0], [0, 1], [2]],
+                        list(p.cpts[:3]) + [noisy_or('d', ['c'], [0.7], leak=0.1)])
+    return {'p': p, 'q': q, 's': s}
+
+
+@pytest.mark.parametrize('pair', [('worst', 'best'), ('actual', 'worst'), ('best', 'best')])
+def test_trust_networks(pair):
+    p, q = make_network(pair[0]), make_network(pair[1])
+    result = compare_joint(p, q)
+    kl, tv, bc = _brute(p, q)
+    assert result.kl == pytest.approx(kl, rel=1e-9, abs=1e-12)
+    assert sum(result.contributions.values()) == pytest.approx(result.kl)
+    assert result.tv == pytest.approx(tv, abs=1e-12)
+    assert result.bhattacharyya == pytest.approx(bc, rel=1e-12)
+    assert result.hellinger == pytest.approx(np.sqrt(max(0.0, 1 - bc)), abs=1e-6)
+    lower, upper = result.tv_bounds
+    assert lower - 1e-12 <= tv <= upper + 1e-12
+
+
+@pytest.mark.parametrize('first, second', [('p', 'q'), ('q', 'p'), ('p', 's'), ('s', 'q')])
+def test_different_structures(first, second):
+    models = _small()
+    result = compare_joint(models[first], models[second])
+    kl, tv, bc = _brute(models[first], models[second])
+    assert result.kl == pytest.approx(kl, rel=1e-9)
+    assert result.tv == pytest.approx(tv, abs=1e-12)
+    assert result.bhattacharyya == pytest.approx(bc, rel=1e-12)
+
+
+def test_structured_cpds_are_not_expanded(monkeypatch):
+    def dense(cpd):
+        raise AssertionError('to_dense called for %r' % cpd.variable)
+
+    monkeypatch.setattr(StructuredCPD, 'to_dense', dense)
+    models = _small()
+    for first, second in [('p', 's'), ('s', 'q'), ('s', 's')]:
+        kl, tv, bc = _brute(models[first], models[second])
+        result = compare_joint(models[first], models[second])
+        assert result.kl == pytest.approx(kl, rel=1e-9, abs=1e-12)
+        assert result.bhattacharyya == pytest.approx(bc, rel=1e-12)
+    # A noisy-or child of 30 roots: its dense table would have 2^31 cells. Only the
+    # roots differ, so KL and BC are those of the roots.
+    rng = np.random.default_rng(3)
+    roots = [rng.dirichlet(np.ones(2), size=2) for _ in range(30)]
+    child = noisy_or('y', ['r%d' % k for k in range(30)], rng.uniform(0.1, 0.9, 30), leak=0.05)
+    nodes, parents = ['r%d' % k for k in range(30)] + ['y'], [[]] * 30 + [list(range(30))]
+    p = CompiledNetwork(nodes, [2] * 31, parents, [r[0] for r in roots] + [child])
+    q = CompiledNetwork(nodes, [2] * 31, parents, [r[1] for r in roots] + [child])
+    result = compare_joint(p, q)
+    assert result.tv is None and result.contributions['y'] == 0.0
+    assert result.kl == pytest.approx(sum((a * np.log(a / b)).sum() for a, b in roots), rel=1e-9)
+    assert result.bhattacharyya == pytest.approx(np.prod([np.sqrt(a * b).sum() for a, b in roots]), rel=1e-9)
+
+
+def test_keyword_dict_models():
+    names, matrix = pairwise({'actual': CASES['actual'], 'best': CASES['best']}, 'kl')
+    assert names == ('actual', 'best')
+    assert matrix[0, 1] == pytest.approx(compare_joint(make_network('actual'), make_network('best')).kl, abs=1e-6)
+    result = compare_joint(CASES['worst'], CASES['best'])
+    assert result.kl == pytest.approx(compare_joint(make_network('worst'), make_network('best')).kl)
+
+
+def test_tv_limit():
+    p, q = make_network('worst'), make_network('best')
+    assert compare_joint(p, q, tv_limit=1000).tv is None
+    with pytest.raises(ValueError):
+        total_variation(p, q, tv_limit=1000)
+
+
+def test_posterior(network):
+    other = make_network('best')
+    result = compare_posterior(network, other, ['trust'], {'robustness': 0})
+    p, q = network.query(['trust'], {'robustness': 0}), other.query(['trust'], {'robustness': 0})
+    assert result.kl == pytest.approx((p * np.log(p / q)).sum())
+    assert result.tv == pytest.approx(0.5 * np.abs(p - q).sum())
+    matrix = np.full((4, len(network.nodes)), -1)
+    matrix[:, network.index['robustness']] = [0, 1, 0, -1]
+    batch = compare_posterior(network, other, ['trust'], matrix)
+    assert batch.kl.shape == (4,)
+    assert batch.kl[0] == pytest.approx(result.kl) and batch.tv[2] == pytest.approx(result.tv)
+    assert batch.tv[3] == pytest.approx(compare_posterior(network, other, ['trust']).tv)
+
+
+@pytest.mark.parametrize('metric', ['kl', 'hellinger', 'tv'])
+def test_pairwise_matches_compare_joint(metric):
+    scenarios = make_scenarios()
+    names, matrix = pairwise(scenarios, metric)
+    assert names == scenarios.scenarios and matrix.shape == (3, 3)
+    for a, first in enumerate(names):
+        for b, second in enumerate(names):
+            assert matrix[a, b] == pytest.approx(
+                getattr(compare_joint(make_network(first), make_network(second)), metric), abs=1e-6)
+
+
+def test_pairwise_posteriors_and_loop(network):
+    scenarios = make_scenarios()
+    names, matrix = pairwise(scenarios, 'tv', variables=['trust'], evidence={'robustness': 0})
+    for a, first in enumerate(names):
+        for b, second in enumerate(names):
+            assert matrix[a, b] == pytest.approx(compare_posterior(
+                make_network(first), make_network(second), ['trust'], {'robustness': 0}).tv)
+    matrix = np.full((5, len(network.nodes)), -1)
+    assert pairwise(scenarios, 'kl', variables=['trust'], evidence=matrix)[1].shape == (3, 3, 5)
+    models = _small()
+    names, matrix = pairwise(models, 'kl')
+    assert names == ('p', 'q', 's')
+    np.testing.assert_allclose(np.diag(matrix), 0.0, atol=1e-12)
+    assert matrix[0, 1] == pytest.approx(_brute(models['p'], models['q'])[0], rel=1e-9)
+    with pytest.raises(ValueError):
+        pairwise(scenarios, 'mean')
+    with pytest.raises(ValueError):
+        pairwise(scenarios, 'tv', tv_limit=1000)
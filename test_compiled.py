@@ -0,0 +1,88 @@
+# Tests of BN_Compiled.py: compiled queries against pgmpy variable elimination
+
+import warnings
+
+import numpy as np
+import pytest
+
+from BN_Compiled import CompiledNetwork, compile_model, compile_tables, model_fingerprint
+from BN_DiscreteCPDs import CASES, edges, make_cpds, make_network
+
+
+@pytest.fixture(scope='module')
+def elimination():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from pgmpy.inference import VariableElimination
+        from pgmpy.models import DiscreteBayesianNetwork
+    model = DiscreteBayesianNetwork(edges)
+    model.add_cpds(*make_cpds('worst'))
+    return VariableElimination(model)
+
+
+@pytest.mark.parametrize('variables, evidence', [
+    (['trust'], {}),
+    (['trust'], {'robustness': 0}),
+    (['trust', 'privacy'], {'rssi': 1}),
+    (['security'], {'trust': 0, 'memory': 1}),
+    (['robustness', 'trust1', 'performance'], {'trust': 1, 'standards': 0}),
+])
+def test_query_matches_pgmpy(elimination, variables, evidence):
+    expected = elimination.query(variables, evidence=evidence, show_progress=False)
+    order = [expected.variables.index(v) for v in variables]
+    result = make_network('worst').query(variables, evidence)
+    np.testing.assert_allclose(result, np.transpose(expected.values, order), atol=1e-12)
+
+
+def test_compile_model_matches_compile_tables():
+    tables = make_network('best')
+    model = compile_model(make_cpds('best'))
+    for name in tables.nodes:
+        np.testing.assert_array_equal(tables.query([name]), model.query([name]))
+
+
+def test_fingerprint_tracks_cpt_values():
+    assert model_fingerprint(make_cpds('best')) == model_fingerprint(make_cpds('best'))
+    assert model_fingerprint(make_cpds('best')) != model_fingerprint(make_cpds('worst'))
+    assert compile_tables(CASES['best']).fingerprint() == make_network('best').fingerprint()
+    assert make_network('best').fingerprint() != make_network('actual').fingerprint()
+
+
+def test_plans_are_cached(network):
+    plan = network.plan(['trust'], ['robustness'])
+    network.query(['trust'], {'robustness': 1})
+    assert network.plan(['trust'], ['robustness']) is plan
+
+
+def test_cpts_are_read_only(network):
+    with pytest.raises(ValueError):
+        network.cpts[0][0, ...] = 1.0
+
+
+def test_unknown_variable_and_state(network):
+    with pytest.raises(KeyError):
+        network.query(['nope'])
+    with pytest.raises(ValueError):
+        network.query(['trust'], {'robustness': 2})
+    with pytest.raises(ValueError):
+        network.query(['trust', 'trust'])
+
+
+def test_wrong_cpt_shape():
+    with pytest.raises(ValueError):
+        CompiledNetwork(['a', 'b'], [2, 2], [[], [0]], [np.full(2, 0.5), np.full((2, 3), 0.5)])
+
+
+def test_with_cpts_keeps_plans(network):
+    table = np.array([[0.9, 0.2], [0.1, 0.8]])
+    other = network.with_cpts({'privacy': table})
+    assert other.plan(['trust'], ['robustness']) is network.plan(['trust'], ['robustness'])
+    assert other.fingerprint() != network.fingerprint()
+    assert not np.allclose(other.query(['trust']), network.query(['trust']))
+
+
+def test_large_network_does_not_underflow(large, large_evidence):
+    result = large.query(['trust'], large_evidence)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result.sum(), 1.0)
+    np.testing.assert_allclose(result, [0.57522697, 0.42477303], atol=1e-8)
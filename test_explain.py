@@ -0,0 +1,128 @@
+# Tests of BN_Explain.py: k best assignments against sorting the full joint posterior
+
+import numpy as np
+import pytest
+
+from BN_Benchmark import synthetic_tables
+from BN_Compiled import compile_tables
+from BN_DiscreteCPDs import make_network, make_scenarios
+from BN_Explain import describe, map_query
+from BN_Structured import NoisyMaxCPD
+
+INDICATORS = ['memory', 'rssi', 'integrity', 'transparent', 'power', 'latency']
+
+
+def _brute(network, variables, evidence, k):
+    # The k largest entries of P(variables | evidence), largest first
+    joint = network.query(variables, evidence)
+    order = np.argsort(-joint.ravel(), kind='stable')[:k]
+    return joint, joint.ravel()[order]
+
+
+@pytest.mark.parametrize('evidence', [{'trust': 0}, {'trust': 0, 'security': 1}, {}])
+def test_top_k_matches_joint(evidence):
+    network = make_network('worst')
+    result = map_query(network, INDICATORS, evidence, k=5)
+    joint, best = _brute(network, INDICATORS, evidence, 5)
+    assert result.variables == tuple(INDICATORS) and result.states.shape == (5, len(INDICATORS))
+    np.testing.assert_allclose(result.probability, best, rtol=1e-10)
+    np.testing.assert_allclose([joint[tuple(s)] for s in result.states], result.probability, rtol=1e-10)
+    assert len({tuple(s) for s in result.states}) == 5
+
+
+def test_mpe_covers_unobserved_nodes(network):
+    result = map_query(network, evidence={'trust': 0, 'memory': 1}, k=3)
+    assert set(result.variables) == set(network.nodes) - {'trust', 'memory'}
+    _, best = _brute(network, list(result.variables), {'trust': 0, 'memory': 1}, 3)
+    np.testing.assert_allclose(result.probability, best, rtol=1e-10)
+
+
+def test_batch_mpe_leaves_out_columns_observed_in_every_row(network):
+    matrix = np.full((6, len(network.nodes)), -1)
+    matrix[:, network.index['trust']] = [0, 1, 0, 1, 0, 1]
+    matrix[:, network.index['memory']] = [0, 1, -1, 0, 1, -1]
+    result = map_query(network, evidence=matrix, k=2)
+    assert set(result.variables) == set(network.nodes) - {'trust'}
+    evidence = {'trust': 1, 'memory': 1}
+    np.testing.assert_allclose(result.probability[1], _brute(network, list(result.variables), evidence, 2)[1],
+                               rtol=1e-10)
+
+
+def test_mpe_on_a_wide_network():
+    # 100 nodes: the joint over the explained nodes is far too large to form, so the
+    # probabilities are checked as products of CPT entries over P(evidence)
+    network = compile_tables(synthetic_tables(100))
+    rng = np.random.default_rng(2)
+    picked = list(rng.choice(network.nodes, 30, replace=False))
+    for variables, evidence in [(None, {'trust': 0}), (picked, {}), (network.nodes, {})]:
+        result = map_query(network, variables, evidence, k=3)
+        assert np.all(np.diff(result.probability) <= 0) and len({tuple(s) for s in result.states}) == 3
+        if variables is picked:
+            continue
+        for states, probability in zip(result.states, result.probability):
+            full = dict(evidence, **dict(zip(result.variables, states)))
+            joint = np.prod([cpt[(full[node],) + tuple(full[network.nodes[p]] for p in parents)]
+                             for node, cpt, parents in zip(network.nodes, network.cpts, network.parents)])
+            marginal = network.query(['trust'])[0] if evidence else 1.0
+            assert probability == pytest.approx(joint / marginal, rel=1e-9)
+
+
+def test_batch_rows_match_single_queries(network):
+    rng = np.random.default_rng(0)
+    matrix = np.full((40, len(network.nodes)), -1)
+    matrix[:, network.index['trust']] = rng.integers(0, 2, 40)
+    matrix[:, network.index['memory']] = rng.integers(-1, 2, 40)
+    variables = ['rssi', 'integrity', 'transparent', 'security']
+    result = map_query(network, variables, matrix, k=4)
+    assert result.states.shape == (40, 4, 4) and result.probability.shape == (40, 4)
+    for row in range(0, 40, 7):
+        evidence = {name: int(v) for name, v in zip(network.nodes, matrix[row]) if v >= 0}
+        np.testing.assert_allclose(result.probability[row], _brute(network, variables, evidence, 4)[1],
+                                   rtol=1e-10)
+
+
+def test_scenarios_and_structured_cpds():
+    scenarios = make_scenarios()
+    result = map_query(scenarios, ['security', 'robustness'], {'trust': 0}, k=2)
+    assert result.probability.shape == (3, 2)
+    for s, name in enumerate(scenarios.scenarios):
+        np.testing.assert_allclose(result.probability[s],
+                                   _brute(make_network(name), ['security', 'robustness'], {'trust': 0}, 2)[1],
+                                   rtol=1e-10)
+    rng = np.random.default_rng(1)
+    parents = ['p%d' % i for i in range(5)]
+    roots = [dict(variable=p, variable_card=3, values=rng.dirichlet(np.ones(3)).reshape(3, 1)) for p in parents]
+    weights = [rng.dirichlet(np.ones(3), 3).T for _ in parents]
+    network = compile_tables(roots + [NoisyMaxCPD('y', 3, parents, [3] * 5, weights)])
+    result = map_query(network, parents, {'y': 2}, k=4)
+    np.testing.assert_allclose(result.probability, _brute(network, parents, {'y': 2}, 4)[1], rtol=1e-10)
+
+
+def test_large_network(large, large_evidence):
+    variables = [large.nodes[large.parents[large.index['trust']][0]], 'trust']
+    result = map_query(large, variables, large_evidence, k=2)
+    np.testing.assert_allclose(result.probability, _brute(large, variables, large_evidence, 2)[1], rtol=1e-8)
+
+
+def test_describe(network):
+    rows = describe(network, map_query(network, ['security', 'privacy'], {'trust': 0}, k=3))
+    assert len(rows) == 3 and rows[0]['probability'] >= rows[1]['probability'] >= rows[2]['probability']
+    assert set(rows[0]['assignment']) == {'security', 'privacy'}
+    for row in rows:
+        for name, state in row['assignment'].items():
+            assert state in network.state_names[network.index[name]]
+
+
+def test_invalid_queries(network):
+    with pytest.raises(ValueError):
+        map_query(network, ['trust'], {'trust': 0})
+    with pytest.raises(KeyError):
+        map_query(network, ['nope'], {'trust': 0})
+    with pytest.raises(ValueError):
+        map_query(network, ['security'], {'trust': 5})
+    with pytest.raises(ValueError):
+        map_query(network, ['security'], [[5]], columns=['trust'])
+    with pytest.raises(ValueError):
+        map_query(network, ['security'], [[0, 1]], columns=['trust'])
+    with pytest.raises(ValueError):
+        map_query(network, ['security', 'security'], {'trust': 0})
@@ -0,0 +1,34 @@
+# Tests of the headless modules: importing them loads neither bnlearn nor plotting
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from BN_DiscreteCPDs import CASES, make_cpds, make_network
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY = ('bnlearn', 'pgmpy', 'matplotlib', 'networkx', 'pandas')
+MODULES = sorted(name[:-3] for name in os.listdir(HERE) if name.startswith('BN_') and name.endswith('.py'))
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_has_no_heavy_dependencies(module):
+    code = 'import sys, %s; print(",".join(m for m in %r if m in sys.modules))' % (module, HEAVY)
+    out = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ''
+
+
+def test_import_has_no_output():
+    out = subprocess.run([sys.executable, '-c', 'import BN_DiscreteCPDs'], cwd=HERE,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout == '' and out.stderr == ''
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_tables_match_tabular_cpds(case):
+    network = make_network(case)
+    for cpd in make_cpds(case):
+        np.testing.assert_array_equal(network.align_cpd(cpd), network.cpts[network._node(cpd.variable)])
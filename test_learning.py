@@ -0,0 +1,84 @@
+# Tests of BN_Learning.py: chunked counts and smoothed CPTs
+
+import numpy as np
+import pytest
+
+from BN_Approximate import _conditional, _draw
+from BN_DiscreteCPDs import edges
+from BN_Compiled import CompiledNetwork
+from BN_Learning import FamilyCounts, learn_cpds
+from BN_Structured import noisy_or
+
+
+def _sample(network, n, seed=0):
+    # Forward samples of the network as {node: states}
+    rng = np.random.default_rng(seed)
+    states = np.zeros((n, len(network.nodes)), dtype=np.int64)
+    for i in range(len(network.nodes)):
+        states[:, i] = _draw(rng, _conditional(network, i, states))
+    return {name: states[:, i] for i, name in enumerate(network.nodes)}
+
+
+def _chunks(data, size):
+    n = len(next(iter(data.values())))
+    for start in range(0, n, size):
+        yield {name: values[start:start + size] for name, values in data.items()}
+
+
+def test_learned_cpts_converge(network):
+    data = _sample(network, 200000)
+    learned = learn_cpds(_chunks(data, 30000), prior=network, prior_weight=0.0, output='network')
+    for name in network.nodes:
+        np.testing.assert_allclose(learned.cpts[learned._node(name)], network.cpts[network._node(name)],
+                                   atol=0.02)
+
+
+def test_chunking_does_not_change_the_counts(network):
+    data = _sample(network, 5000)
+    parents = {name: [network.nodes[p] for p in network.parents[i]] for i, name in enumerate(network.nodes)}
+    cards = dict(zip(network.nodes, network.cards))
+    whole = FamilyCounts(parents, cards).update(data)
+    chunked = FamilyCounts(parents, cards)
+    for chunk in _chunks(data, 777):
+        chunked.update(chunk)
+    assert whole.rows == chunked.rows == 5000
+    for name in network.nodes:
+        np.testing.assert_array_equal(whole.counts[name], chunked.counts[name])
+
+
+def test_prior_weight_and_missing_values(network):
+    data = {name: values.astype(float) for name, values in _sample(network, 50).items()}
+    data['privacy'][:] = np.nan
+    tables = learn_cpds([data], prior=network, prior_weight=10.0, output='network')
+    np.testing.assert_allclose(tables.cpts[tables._node('privacy')], network.cpts[network._node('privacy')])
+    assert not np.allclose(tables.cpts[tables._node('rssi')], network.cpts[network._node('rssi')])
+
+
+def test_csv_source(network, tmp_path):
+    pd = pytest.importorskip('pandas')
+    data = _sample(network, 2000)
+    path = tmp_path / 'telemetry.csv'
+    pd.DataFrame(data).to_csv(path, index=False)
+    from_memory = learn_cpds([data], prior=network, output='tables')
+    for source in (str(path), path):
+        from_file = learn_cpds(source, prior=network, chunksize=300, output='tables')
+        for a, b in zip(from_file, from_memory):
+            np.testing.assert_allclose(a['values'], b['values'])
+
+
+def test_structured_prior():
+    prior = CompiledNetwork(['a', 'b', 'y'], [2, 2, 2], [[], [], [0, 1]],
+                            [np.array([0.6, 0.4]), np.array([0.3, 0.7]), noisy_or('y', ['a', 'b'], [0.9, 0.5])])
+    dense = prior.cpts[2].to_dense()
+    learned = learn_cpds([{'a': np.array([1]), 'b': np.array([0]), 'y': np.array([1])}], [('a', 'y'), ('b', 'y')],
+                         prior=prior, prior_weight=10.0, output='network')
+    expected = dense.copy()
+    expected[:, 1, 0] = (10.0 * dense[:, 1, 0] + [0, 1]) / 11.0
+    np.testing.assert_allclose(learned.cpts[learned._node('y')], expected)
+
+
+def test_invalid_states(network):
+    data = _sample(network, 10)
+    data['rssi'] = np.full(10, 2)
+    with pytest.raises(ValueError):
+        learn_cpds([data], edges, prior=network)
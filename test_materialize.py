@@ -0,0 +1,73 @@
+# Tests of BN_Materialize.py: table lookups equal compiled queries
+
+import itertools
+
+import numpy as np
+import pytest
+
+import BN_Materialize
+from BN_Compiled import MISSING
+from BN_DiscreteCPDs import make_cpds, make_network
+from BN_Materialize import DETERMINANTS, ROOT_INDICATORS, MaterializedTable
+
+
+@pytest.fixture(scope='module')
+def table(network):
+    return MaterializedTable(network)
+
+
+def test_lookup_matches_query(network, table):
+    for evidence in [{}, {'rssi': 1}, {'memory': 0, 'power': 1, 'transparent': 0},
+                     {name: 1 for name in ROOT_INDICATORS}]:
+        posteriors = table.lookup(evidence)
+        for target in DETERMINANTS:
+            np.testing.assert_allclose(posteriors[target], network.query([target], evidence), atol=1e-12)
+
+
+def test_lookup_batch_matches_query(network, table):
+    rng = np.random.default_rng(0)
+    evidence = rng.integers(-1, 2, size=(50, len(ROOT_INDICATORS)))
+    result = table.lookup_batch(evidence)['trust']
+    expected = network.query_batch(['trust'], evidence, columns=ROOT_INDICATORS)
+    np.testing.assert_allclose(result, expected, atol=1e-12)
+
+
+def test_every_pattern_has_its_own_row(table):
+    patterns = np.array(list(itertools.product([0, 1, MISSING], repeat=3)))
+    evidence = np.full((len(patterns), len(ROOT_INDICATORS)), MISSING)
+    evidence[:, :3] = patterns
+    assert len(set(table.codes(evidence))) == len(patterns)
+
+
+@pytest.mark.parametrize('state', [2, -2, 7])
+def test_states_outside_the_card_are_rejected(table, state):
+    evidence = np.full((1, len(ROOT_INDICATORS)), MISSING)
+    evidence[0, 0] = state
+    with pytest.raises(ValueError):
+        table.codes(evidence)
+
+
+def test_refresh_after_cpt_change(network):
+    table = MaterializedTable(network.with_cpts({}), auto_refresh=True)
+    assert not table.refresh()
+    table.model = network.with_cpts({'rssi': np.array([0.3, 0.7])})
+    assert table.refresh()
+    np.testing.assert_allclose(table.lookup()['trust'], table.model.query(['trust']), atol=1e-12)
+
+
+def test_auto_refresh_hashes_only_replaced_cpds(monkeypatch):
+    cpds = make_cpds('actual')
+    table = MaterializedTable(cpds)
+    calls = []
+    fingerprint = BN_Materialize.model_fingerprint
+    monkeypatch.setattr(BN_Materialize, 'model_fingerprint', lambda model: calls.append(1) or fingerprint(model))
+    for _ in range(5):
+        table.lookup({'rssi': 1})
+    table.lookup_batch(np.full((3, len(ROOT_INDICATORS)), MISSING))
+    assert not calls
+    rssi = next(cpd for cpd in cpds if cpd.variable == 'rssi')
+    rssi.values = np.array([0.3, 0.7])
+    expected = make_network('actual').with_cpts({'rssi': np.array([0.3, 0.7])})
+    np.testing.assert_allclose(table.lookup({'memory': 0})['trust'], expected.query(['trust'], {'memory': 0}),
+                               atol=1e-12)
+    assert len(calls) == 1
@@ -0,0 +1,38 @@
+# Tests of BN_MonteCarlo.py: closed-form scores, seeding and summaries
+
+import numpy as np
+import pytest
+
+from BN_MonteCarlo import CASES, SCORES, case_scores, draw, simulate
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_analytic_matches_grid(case):
+    means, sds = draw(CASES[case], 200, np.random.default_rng(1))
+    analytic = case_scores(CASES[case], means, sds, 'analytic')
+    grid = case_scores(CASES[case], means, sds, 'grid')
+    assert analytic.shape == grid.shape == (200, len(SCORES))
+    # The grid quadrature agrees to about 1e-6 relative (1e-8 for the log AUC)
+    np.testing.assert_allclose(analytic[:, -1], grid[:, -1], rtol=1e-7, atol=0)
+    np.testing.assert_allclose(analytic[:, :-1], grid[:, :-1], rtol=5e-6, atol=0)
+
+
+def test_result_does_not_depend_on_workers():
+    one = simulate('best', iterations=5000, seed=3, workers=1, chunk=1000, keep_scores=True)
+    two = simulate('best', iterations=5000, seed=3, workers=2, chunk=1000, keep_scores=True)
+    np.testing.assert_array_equal(one['scores'], two['scores'])
+
+
+def test_summary():
+    result = simulate('worst', iterations=1500, seed=0, chunk=1000, keep_scores=True)
+    assert result['scores'].shape == (1500, len(SCORES))
+    assert list(result['summary']) == list(SCORES)
+    stats = result['summary']['OverallTrust']
+    assert stats['min'] <= stats['q05'] <= stats['median'] <= stats['q95'] <= stats['max']
+    assert stats['mean'] == pytest.approx(result['scores'][:, -2].mean())
+
+
+def test_unknown_method():
+    means, sds = draw(CASES['best'], 2, np.random.default_rng(0))
+    with pytest.raises(ValueError):
+        case_scores(CASES['best'], means, sds, 'exact')
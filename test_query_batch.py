@@ -0,0 +1,64 @@
+# Tests of CompiledNetwork.query_batch: one vectorized call equals a query per row
+
+import numpy as np
+import pytest
+
+from BN_Compiled import MISSING
+from BN_DiscreteCPDs import make_scenarios
+
+RECORDS = [{}, {'robustness': 0}, {'rssi': 1, 'memory': 0}, {'trust1': 1, 'privacy': 0},
+           {'robustness': 1, 'security': 0, 'transparent': 1}]
+
+
+def test_rows_match_single_queries(network):
+    matrix = network.evidence_matrix(RECORDS)
+    result = network.query_batch(['trust'], matrix)
+    assert result.shape == (len(RECORDS), 2)
+    for row, record in zip(result, RECORDS):
+        np.testing.assert_allclose(row, network.query(['trust'], record), atol=1e-12)
+
+
+def test_evidence_columns(network):
+    columns = ['robustness', 'rssi']
+    matrix = np.array([[0, MISSING], [1, 1], [MISSING, MISSING]])
+    result = network.query_batch(['trust', 'privacy'], matrix, columns=columns)
+    assert result.shape == (3, 2, 2)
+    np.testing.assert_allclose(result[1], network.query(['trust', 'privacy'], {'robustness': 1, 'rssi': 1}))
+    np.testing.assert_allclose(result[2], network.query(['trust', 'privacy']))
+
+
+def test_invalid_evidence(network):
+    with pytest.raises(ValueError):
+        network.query_batch(['trust'], [[0, 1]], columns=['robustness'])
+    with pytest.raises(ValueError):
+        network.query_batch(['trust'], [[2]], columns=['robustness'])
+    with pytest.raises(ValueError):
+        network.query_batch(['trust'], [[-3]], columns=['robustness'])
+    with pytest.raises(KeyError):
+        network.evidence_matrix([{'nope': 0}])
+
+
+def test_scenario_axis_comes_first():
+    scenarios = make_scenarios()
+    matrix = scenarios.evidence_matrix(RECORDS)
+    result = scenarios.query_batch(['trust'], matrix)
+    assert result.shape == (3, len(RECORDS), 2)
+    for k, record in enumerate(RECORDS):
+        np.testing.assert_allclose(result[:, k], scenarios.query(['trust'], record), atol=1e-12)
+
+
+@pytest.mark.parametrize('rows', [0, 1, 3])
+def test_rows_without_evidence(network, rows):
+    scenarios = make_scenarios()
+    for model, shape in [(network, ()), (scenarios, (3,))]:
+        result = model.query_batch(['trust', 'privacy'], model.evidence_matrix([{}] * rows))
+        assert result.shape == shape + (rows, 2, 2)
+        for k in range(rows):
+            np.testing.assert_allclose(result[..., k, :, :], model.query(['trust', 'privacy']), atol=1e-12)
+
+
+def test_large_batch_does_not_underflow(large, large_evidence):
+    matrix = large.evidence_matrix([large_evidence, {}])
+    result = large.query_batch(['trust'], matrix)
+    np.testing.assert_allclose(result[0], large.query(['trust'], large_evidence), atol=1e-10)
+    np.testing.assert_allclose(result[1], large.query(['trust']), atol=1e-10)
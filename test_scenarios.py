@@ -0,0 +1,53 @@
+# Tests of BN_Scenarios.py: one stacked query equals one query per case
+
+import numpy as np
+import pytest
+
+from BN_DiscreteCPDs import CASES, make_cpds, make_network, make_scenarios
+from BN_Scenarios import compile_scenarios
+
+
+def test_scenarios_match_separate_networks():
+    scenarios = make_scenarios()
+    assert scenarios.scenarios == ('actual', 'best', 'worst')
+    result = scenarios.query_scenarios(['trust'], {'robustness': 0})
+    for case in scenarios.scenarios:
+        np.testing.assert_allclose(result[case], make_network(case).query(['trust'], {'robustness': 0}))
+
+
+def test_shared_cpts_are_stored_once():
+    scenarios = make_scenarios()
+    stacked = [scenarios.nodes[i] for i, cpt in enumerate(scenarios.cpts) if cpt.ndim > 1 + len(scenarios.parents[i])]
+    assert sorted(stacked) == ['privacy', 'robustness', 'security']
+
+
+def test_partial_variants():
+    cpds = {cpd.variable: cpd for cpd in make_cpds('best')}
+    scenarios = compile_scenarios({'actual': make_network('actual'),
+                                   'best': [cpds['robustness'], cpds['security'], cpds['privacy']]})
+    np.testing.assert_allclose(scenarios.query_scenarios(['trust'])['best'],
+                               make_network('best').query(['trust']))
+
+
+def test_keyword_dict_variants():
+    best = [table for table in CASES['best'] if table['variable'] in ('robustness', 'security', 'privacy')]
+    scenarios = compile_scenarios({'actual': CASES['actual'], 'best': best})
+    result = scenarios.query_scenarios(['trust'], {'memory': 1})
+    for case in scenarios.scenarios:
+        np.testing.assert_allclose(result[case], make_network(case).query(['trust'], {'memory': 1}))
+
+
+def test_identical_variants_are_not_stacked():
+    scenarios = compile_scenarios({'a': make_network('worst'), 'b': make_network('worst')})
+    assert scenarios.param_shape == ()
+    assert set(scenarios.query_scenarios(['trust'])) == {'a', 'b'}
+
+
+def test_changed_parents_are_rejected(network):
+    table = np.full((2, 2), 0.5)
+    other = type(network)(network.nodes, network.cards,
+                          [ps if name != 'privacy' else (network.nodes.index('rssi'),)
+                           for name, ps in zip(network.nodes, network.parents)],
+                          [cpt if name != 'privacy' else table for name, cpt in zip(network.nodes, network.cpts)])
+    with pytest.raises(ValueError):
+        compile_scenarios({'a': network, 'b': other})
@@ -0,0 +1,88 @@
+# Tests of BN_Sensitivity.py: derivatives against finite differences
+
+import numpy as np
+import pytest
+
+from BN_DiscreteCPDs import make_network
+from BN_Sensitivity import ranked_report, sensitivity
+
+EPS = 1e-6
+
+
+def _difference(network, name, table, evidence):
+    # Central difference of P(trust = 1 | evidence) for a changed CPT
+    up = network.with_cpts({name: table(+EPS)}).query(['trust'], evidence)[1]
+    down = network.with_cpts({name: table(-EPS)}).query(['trust'], evidence)[1]
+    return (up - down) / (2 * EPS)
+
+
+def _entry(cpt, index):
+    def table(step):
+        t = np.array(cpt)
+        t[index] += step
+        return t
+    return table
+
+
+def _column(cpt, index):
+    # Move one entry and scale the rest of its column, as the covarying derivative does
+    def table(step):
+        t = np.array(cpt)
+        column = (slice(None),) + index[1:]
+        theta = t[index]
+        t[column] *= (1 - theta - step) / (1 - theta)
+        t[index] = theta + step
+        return t
+    return table
+
+
+@pytest.mark.parametrize('evidence', [{}, {'rssi': 0, 'latency': 1, 'security': 1}])
+def test_gradients_match_finite_differences(evidence):
+    network = make_network('worst')
+    result = sensitivity(network, 'trust', 1, evidence)
+    np.testing.assert_allclose(result.posterior, network.query(['trust'], evidence)[1])
+    for name, cpt in zip(network.nodes, network.cpts):
+        for index in np.ndindex(cpt.shape):
+            assert result.gradients[name][index] == pytest.approx(
+                _difference(network, name, _entry(cpt, index), evidence), abs=1e-6)
+            if cpt[index] < 1:
+                assert result.covarying[name][index] == pytest.approx(
+                    _difference(network, name, _column(cpt, index), evidence), abs=1e-6)
+
+
+def test_batch_matches_single_rows(network):
+    records = [{}, {'robustness': 0}, {'rssi': 1, 'privacy': 0}]
+    batch = sensitivity(network, 'trust', 1, network.evidence_matrix(records))
+    for k, record in enumerate(records):
+        single = sensitivity(network, 'trust', 1, record)
+        assert batch.posterior[k] == pytest.approx(single.posterior)
+        for name in network.nodes:
+            np.testing.assert_allclose(batch.gradients[name][k], single.gradients[name], atol=1e-12)
+
+
+def test_invalid_batch_evidence(network):
+    with pytest.raises(ValueError):
+        sensitivity(network, 'trust', 1, [[5]], columns=['rssi'])
+    with pytest.raises(ValueError):
+        sensitivity(network, 'trust', 1, [[0, 1]], columns=['rssi'])
+
+
+def test_large_network_does_not_underflow(large, large_evidence):
+    result = sensitivity(large, 'trust', 1, large_evidence)
+    assert result.posterior == pytest.approx(large.query(['trust'], large_evidence)[1])
+    for name in large.nodes:
+        assert np.isfinite(result.gradients[name]).all()
+    trust = large._node('trust')
+    for name in ['trust', large.nodes[large.parents[trust][0]]]:
+        cpt = large.cpts[large._node(name)]
+        index = (0,) * cpt.ndim
+        expected = _difference(large, name, _entry(cpt, index), large_evidence)
+        assert result.gradients[name][index] == pytest.approx(expected, rel=1e-4, abs=1e-8)
+
+
+def test_ranked_report(network):
+    result = sensitivity(network, 'trust', 1, {'robustness': 0})
+    rows = ranked_report(network, result, top=5)
+    assert len(rows) == 5
+    assert [row['influence'] for row in rows] == sorted((row['influence'] for row in rows), reverse=True)
+    assert set(rows[0]) == {'node', 'state', 'parents', 'value', 'derivative', 'influence'}
@@ -0,0 +1,93 @@
+# Tests of BN_Serialize.py: saved model files load as the same network
+
+import struct
+
+import numpy as np
+import pytest
+
+from BN_Compiled import CompiledNetwork
+from BN_DiscreteCPDs import make_scenarios
+from BN_Materialize import ROOT_INDICATORS
+from BN_Serialize import MAGIC, VERSION, load_network, save_network
+from BN_Structured import DeterministicCPD, NoisyMaxCPD, StructuredCPD, TreeCPD, noisy_or
+
+QUERIES = [(['trust'], {}), (['trust'], {'memory': 1, 'rssi': 0}), (['security', 'privacy'], {'trust': 1})]
+
+
+def _structured():
+    # Parents a, b, c and one child of every structured kind
+    rng = np.random.default_rng(0)
+    weights = [rng.dirichlet(np.ones(3), size=card).T for card in (2, 3, 2)]
+    children = [
+        noisy_or('y0', ['a', 'c'], [0.9, 0.5], leak=0.05),
+        NoisyMaxCPD('y1', 3, ['a', 'b', 'c'], [2, 3, 2], weights, leak=[0.8, 0.15, 0.05]),
+        DeterministicCPD('y2', 4, ['a', 'b', 'c'], [2, 3, 2], 'sum'),
+        TreeCPD('y3', 2, ['a', 'b'], [2, 3], ('a', [[0.9, 0.1], ('b', [[0.5, 0.5], [0.2, 0.8], [0.3, 0.7]])])),
+    ]
+    nodes = ['a', 'b', 'c'] + [cpd.variable for cpd in children]
+    cards = [2, 3, 2] + [cpd.variable_card for cpd in children]
+    parents = [[], [], []] + [[nodes.index(p) for p in cpd.evidence] for cpd in children]
+    roots = [rng.dirichlet(np.ones(card)) for card in (2, 3, 2)]
+    return CompiledNetwork(nodes, cards, parents, roots + children)
+
+
+def test_round_trip(tmp_path, network):
+    path = tmp_path / 'model.bn'
+    save_network(network, path, queries=[(['trust'], ROOT_INDICATORS)])
+    loaded = load_network(path, verify=True)
+    assert type(loaded) is CompiledNetwork
+    assert loaded.nodes == network.nodes and loaded.fingerprint() == network.fingerprint()
+    assert loaded._plans.keys() == network._plans.keys() and loaded._plans
+    for variables, evidence in QUERIES:
+        np.testing.assert_array_equal(loaded.query(variables, evidence), network.query(variables, evidence))
+    for cpt in loaded.cpts:
+        assert not cpt.flags.writeable
+        with pytest.raises(ValueError):
+            cpt[...] = 0
+
+
+def test_round_trip_scenarios(tmp_path):
+    network = make_scenarios()
+    save_network(network, tmp_path / 'scenarios.bn')
+    loaded = load_network(tmp_path / 'scenarios.bn', verify=True)
+    assert loaded.scenarios == network.scenarios and loaded.param_shape == network.param_shape
+    for variables, evidence in QUERIES:
+        np.testing.assert_array_equal(loaded.query(variables, evidence), network.query(variables, evidence))
+
+
+def test_round_trip_structured(tmp_path):
+    network = _structured()
+    path = tmp_path / 'structured.bn'
+    save_network(network, path)
+    assert b'pickle' not in path.read_bytes() and b'\x80\x05' not in path.read_bytes()
+    loaded = load_network(path, verify=True)
+    # The factor tables are used in place from the memory map, not copied
+    mapped = [table for cpt in loaded.cpts if isinstance(cpt, StructuredCPD) for _, table in cpt.factors]
+    assert all(any(table is factor for factor in loaded.factor_tables) for table in mapped)
+    for before, after in zip(network.cpts, loaded.cpts):
+        if not isinstance(before, StructuredCPD):
+            continue
+        assert type(after) is StructuredCPD and after.hidden == before.hidden
+        np.testing.assert_allclose(after.to_dense(), before.to_dense(), atol=1e-15)
+        states = np.indices(before.evidence_card).reshape(len(before.evidence), -1).T
+        np.testing.assert_allclose(after.conditional(states), before.conditional(states), atol=1e-15)
+    for variables, evidence in [(['y1'], {}), (['a', 'b'], {'y0': 1, 'y2': 2}), (['c'], {'y1': 0, 'y3': 1})]:
+        np.testing.assert_allclose(loaded.query(variables, evidence), network.query(variables, evidence),
+                                   atol=1e-15)
+
+
+def test_bad_files(tmp_path, network):
+    path = tmp_path / 'model.bn'
+    save_network(network, path)
+    data = path.read_bytes()
+    path.write_bytes(b'NOTTRUST' + data[8:])
+    with pytest.raises(ValueError, match='not a trust model'):
+        load_network(path)
+    path.write_bytes(MAGIC + struct.pack('<I', VERSION - 1) + data[12:])
+    with pytest.raises(ValueError, match='format version'):
+        load_network(path)
+    data = bytearray(data)
+    data[-8:] = np.float64(0.5).tobytes()
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='Fingerprint'):
+        load_network(path, verify=True)
@@ -0,0 +1,119 @@
+# Tests of BN_Service.py: requests over a Unix socket against a thread-scored service
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import BN_Service
+from BN_DiscreteCPDs import make_network, make_scenarios
+from BN_Serialize import save_network
+from BN_Service import TrustService, _read_message, replay
+
+EVIDENCE = [{'memory': 1, 'rssi': 0}, {'latency': 1}, {}, {'integrity': 0, 'compliance': 1}]
+
+
+def _serve(network, tmp_path, client, window=0.001):
+    # Run ``client(service, socket path)`` against a service of ``network``
+    path = str(tmp_path / 'model.bnt')
+    save_network(network, path)
+    sock = str(tmp_path / 'trust.sock')
+
+    async def main():
+        service = TrustService(path, window=window, workers=0)
+        await service.start(unix_path=sock)
+        try:
+            return await asyncio.wait_for(client(service, sock), 10)
+        finally:
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+async def _post(reader, writer, body):
+    writer.write(b'POST /query HTTP/1.1\r\nHost: trust\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+    (_, status, *_), _, response = await _read_message(reader)
+    return int(status), json.loads(response)
+
+
+def test_scores_match_queries(tmp_path, network):
+    async def client(service, sock):
+        return await asyncio.gather(*[service.submit(evidence) for evidence in EVIDENCE])
+
+    for evidence, posterior in zip(EVIDENCE, _serve(network, tmp_path, client)):
+        np.testing.assert_allclose(posterior, network.query(['trust'], evidence), atol=1e-12)
+
+
+def test_scenario_file(tmp_path):
+    network = make_scenarios()
+
+    async def client(service, sock):
+        result = await replay([{'evidence': e} for e in EVIDENCE * 5], unix_path=sock, concurrency=4)
+        reader, writer = await asyncio.open_unix_connection(sock)
+        responses = [await _post(reader, writer, json.dumps({'evidence': e}).encode()) for e in EVIDENCE]
+        writer.close()
+        return result, responses
+
+    result, responses = _serve(network, tmp_path, client)
+    assert result['status'] == {'200': len(EVIDENCE) * 5}
+    for evidence, (status, payload) in zip(EVIDENCE, responses):
+        assert status == 200 and payload['scenarios'] == list(network.scenarios)
+        np.testing.assert_allclose(payload['posterior'], network.query(['trust'], evidence), atol=1e-12)
+
+
+def test_bad_requests_keep_the_connection(tmp_path, monkeypatch):
+    score = BN_Service._score
+
+    def failing(variables, evidence):
+        if 'privacy' in variables:
+            raise RuntimeError('worker failed')
+        return score(variables, evidence)
+
+    monkeypatch.setattr(BN_Service, '_score', failing)
+
+    async def client(service, sock):
+        reader, writer = await asyncio.open_unix_connection(sock)
+        responses = []
+        for body in [b'not json', b'[1, 2]', b'"trust"', b'{"variables": 5}', b'{"evidence": {"memory": 9}}',
+                     b'{"variables": "privacy"}', b'{"variables": "trust"}']:
+            responses.append(await _post(reader, writer, body))
+        writer.close()
+        return responses, service.stats['errors']
+
+    responses, errors = _serve(make_network('actual'), tmp_path, client)
+    assert [status for status, _ in responses] == [400, 400, 400, 400, 400, 500, 200]
+    assert 'worker failed' in responses[5][1]['error'] and errors == 6
+    assert responses[6][1]['variables'] == ['trust']
+    assert responses[6][1]['posterior'] == pytest.approx(make_network('actual').query(['trust']).tolist())
+
+
+def test_malformed_messages(tmp_path):
+    async def client(service, sock):
+        reader, writer = await asyncio.open_unix_connection(sock)
+        writer.write(b'GARBAGE\r\n\r\n')
+        (_, garbage, *_), _, _ = await _read_message(reader)
+        status, _ = await _post(reader, writer, b'{}')
+        writer.write(b'POST /query HTTP/1.1\r\nContent-Length: abc\r\n\r\n{}')
+        (_, length, *_), _, _ = await _read_message(reader)
+        closed = await reader.read() == b''
+        writer.close()
+        return [garbage, str(status), length], closed, service.stats['errors']
+
+    statuses, closed, errors = _serve(make_network('actual'), tmp_path, client)
+    assert statuses == ['400', '200', '400'] and closed and errors == 2
+
+
+def test_cancelled_request_does_not_stall_the_batch(tmp_path):
+    async def client(service, sock):
+        first = asyncio.ensure_future(service.submit({'memory': 1}))
+        second = asyncio.ensure_future(service.submit({'memory': 0}))
+        await asyncio.sleep(0)
+        first.cancel()
+        third = await service.submit({'rssi': 1})
+        return await second, third
+
+    network = make_network('actual')
+    second, third = _serve(network, tmp_path, client, window=0.05)
+    np.testing.assert_allclose(second, network.query(['trust'], {'memory': 0}), atol=1e-12)
+    np.testing.assert_allclose(third, network.query(['trust'], {'rssi': 1}), atol=1e-12)
@@ -0,0 +1,79 @@
+# Tests of BN_Session.py: incremental updates equal full queries
+
+import numpy as np
+import pytest
+
+from BN_Session import TrustSession
+
+
+def test_updates_match_queries(network):
+    session = TrustSession(network)
+    evidence = {}
+    for change in [{'robustness': 0}, {'rssi': 1}, {'robustness': 1}, {'rssi': None},
+                   {'memory': 0, 'privacy': 1}]:
+        result = session.update(change)
+        evidence.update(change)
+        evidence = {name: value for name, value in evidence.items() if value is not None}
+        assert 'trust' in result
+        for target in session.targets:
+            np.testing.assert_allclose(session.posteriors[target], network.query([target], evidence), atol=1e-12)
+        for target, posterior in result.items():
+            np.testing.assert_array_equal(posterior, session.posteriors[target])
+    assert session.evidence == evidence
+
+
+def test_only_changed_targets_are_reported(network):
+    session = TrustSession(network)
+    result = session.update({'transparent': 0})
+    assert set(result) == {'trust', 'privacy'}
+    assert set(session.update({'transparent': 0})) == {'trust'}
+
+
+def test_reset_and_unobservable(network):
+    session = TrustSession(network, observable=['rssi', 'robustness'])
+    session.update({'rssi': 0, 'robustness': 1})
+    session.reset()
+    np.testing.assert_allclose(session.posteriors['trust'], network.query(['trust']), atol=1e-12)
+    with pytest.raises(KeyError):
+        session.update({'memory': 0})
+
+
+@pytest.mark.parametrize('bad', [{'memory': 5}, {'nope': 0}])
+def test_failed_update_changes_nothing(network, bad):
+    session = TrustSession(network)
+    session.update({'memory': 0})
+    before = dict(session.posteriors)
+    with pytest.raises((KeyError, ValueError)):
+        session.update(dict({'rssi': 0, 'robustness': 1}, **bad))
+    assert session.evidence == {'memory': 0}
+    for target in session.targets:
+        np.testing.assert_array_equal(session.posteriors[target], before[target])
+    session.update({'privacy': 1})
+    np.testing.assert_allclose(session.posteriors['trust'], network.query(['trust'], {'memory': 0, 'privacy': 1}),
+                               atol=1e-12)
+
+
+def test_update_does_less_work_than_a_query(network, monkeypatch):
+    # Count the contractions: an update of one root reruns only the messages on its
+    # path, and a network this small needs no rescaling
+    session = TrustSession(network, targets=('trust',))
+    network.query(['trust'], {'rssi': 1})
+    calls = []
+    einsum = np.einsum
+    monkeypatch.setattr(np, 'einsum', lambda *args, **kwargs: calls.append(1) or einsum(*args, **kwargs))
+    monkeypatch.setattr('BN_Session._rescale', lambda *args: pytest.fail('small networks are not rescaled'))
+    network.query(['trust'], {'rssi': 1})
+    query = len(calls)
+    del calls[:]
+    session.update({'rssi': 1})
+    assert 0 < len(calls) <= query // 2
+
+
+def test_large_network_does_not_underflow(large, large_evidence):
+    session = TrustSession(large, targets=('trust',))
+    session.update(large_evidence)
+    np.testing.assert_allclose(session.posteriors['trust'], large.query(['trust'], large_evidence), atol=1e-10)
+    name = next(iter(large_evidence))
+    changed = dict(large_evidence, **{name: 1 - large_evidence[name]})
+    session.update({name: changed[name]})
+    np.testing.assert_allclose(session.posteriors['trust'], large.query(['trust'], changed), atol=1e-10)
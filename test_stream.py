@@ -0,0 +1,99 @@
+# Tests of BN_Stream.py: discretization, rolling scores and replay
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from BN_Stream import Rule, TrustScorer, micro_batches, score_records, stream_scores
+
+
+def _records(n, devices, seed=0):
+    rng = np.random.default_rng(seed)
+    records = []
+    for _ in range(n):
+        record = {'device': 'd%d' % rng.integers(devices),
+                  'memory_pct': float(rng.uniform(0, 100)),
+                  'rssi_dbm': float(rng.uniform(-100, -40)),
+                  'latency_ms': float(rng.uniform(0, 200))}
+        if rng.random() < 0.3:
+            del record['rssi_dbm']
+        records.append(record)
+    return records
+
+
+def test_scores_match_queries(network):
+    records = _records(20, 5)
+    scorer = TrustScorer(network)
+    evidence = scorer.discretize(next(micro_batches(records, scorer.fields)).columns)
+    scored = score_records(network, records)
+    for row, score in zip(evidence, scored.scores):
+        observed = {node: int(state) for node, state in zip(scorer.nodes, row) if state >= 0}
+        assert score == pytest.approx(network.query(['trust'], observed)[1])
+
+
+def test_discretize_reverse_and_missing(network):
+    scorer = TrustScorer(network)
+    evidence = scorer.discretize({'memory_pct': [10.0, 90.0, np.nan], 'rssi_dbm': [-50.0, -90.0, -60.0]})
+    memory, rssi = scorer.nodes.index('memory'), scorer.nodes.index('rssi')
+    assert evidence[:, memory].tolist() == [1, 0, -1]
+    assert evidence[:, rssi].tolist() == [1, 0, 1]
+
+
+def test_rolling_scores_do_not_depend_on_batch_size(network):
+    records = _records(600, 40)
+    results = [score_records(network, records, size=size, max_devices=10).rolling
+               for size in (1, 7, 64, 600)]
+    for rolling in results[1:]:
+        np.testing.assert_array_equal(rolling, results[0])
+
+
+def test_max_devices(network):
+    scorer = TrustScorer(network, max_devices=3)
+    list(scorer.score(micro_batches(_records(50, 10), scorer.fields, size=50)))
+    assert len(scorer.rolling) == 3
+
+
+def test_rules_must_match_the_card(network):
+    with pytest.raises(ValueError):
+        TrustScorer(network, rules={'rssi_dbm': Rule('rssi', (-80.0, -60.0), False)})
+    with pytest.raises(KeyError):
+        TrustScorer(network, rules={'x': Rule('nope', (1.0,), False)})
+
+
+def test_async_pipeline_equals_offline(network):
+    records = _records(300, 20)
+
+    async def source():
+        for record in records:
+            yield record
+
+    async def run():
+        scorer = TrustScorer(network)
+        return [batch async for batch in stream_scores(source(), scorer, size=32)]
+
+    scored = asyncio.run(run())
+    rolling = np.concatenate([batch.rolling for batch in scored])
+    np.testing.assert_array_equal(rolling, score_records(network, records).rolling)
+
+
+def test_device_field(network):
+    records = _records(100, 7)
+    renamed = [dict({k: v for k, v in record.items() if k != 'device'}, host=record['device'])
+               for record in records]
+
+    async def source():
+        for record in renamed:
+            yield record
+
+    async def run():
+        scorer = TrustScorer(network)
+        return [batch async for batch in stream_scores(source(), scorer, size=16, device_field='host')]
+
+    expected = score_records(network, records)
+    offline = score_records(network, renamed, device_field='host')
+    streamed = asyncio.run(run())
+    np.testing.assert_array_equal(offline.devices, expected.devices)
+    np.testing.assert_array_equal(offline.rolling, expected.rolling)
+    np.testing.assert_array_equal(np.concatenate([batch.devices for batch in streamed]), expected.devices)
+    np.testing.assert_array_equal(np.concatenate([batch.rolling for batch in streamed]), expected.rolling)
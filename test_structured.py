@@ -0,0 +1,94 @@
+# Tests of BN_Structured.py: factorized CPDs against their dense expansions
+
+import itertools
+import string
+
+import numpy as np
+import pytest
+
+from BN_Compiled import CompiledNetwork
+from BN_Structured import DeterministicCPD, NoisyMaxCPD, SparseCPD, TreeCPD, noisy_or
+
+
+def _product(cpd):
+    # Multiply the factors and sum out the hidden variables: the dense table
+    names = [cpd.variable] + cpd.evidence + list(cpd.hidden)
+    letters = dict(zip(names, string.ascii_letters))
+    operands = ','.join(''.join(letters[v] for v in scope) for scope, _ in cpd.factors)
+    output = ''.join(letters[v] for v in [cpd.variable] + cpd.evidence)
+    return np.einsum(operands + '->' + output, *[table for _, table in cpd.factors])
+
+
+def _cpds():
+    rng = np.random.default_rng(0)
+    weights = [rng.dirichlet(np.ones(3), size=card).T for card in (2, 3, 2)]
+    return [
+        noisy_or('y', ['a', 'b', 'c'], [0.9, 0.5, 0.2], leak=0.05),
+        NoisyMaxCPD('y', 3, ['a', 'b', 'c'], [2, 3, 2], weights, leak=[0.8, 0.15, 0.05]),
+        NoisyMaxCPD('y', 3, ['a', 'b', 'c'], [2, 3, 2], weights, mode='min'),
+        DeterministicCPD('y', 3, ['a', 'b', 'c'], [2, 3, 2], 'max'),
+        DeterministicCPD('y', 3, ['a', 'b', 'c'], [2, 3, 2], 'min'),
+        DeterministicCPD('y', 4, ['a', 'b', 'c'], [2, 3, 2], 'sum'),
+        TreeCPD('y', 2, ['a', 'b', 'c'], [2, 3, 2],
+                ('a', [[0.9, 0.1], ('b', [[0.5, 0.5], [0.2, 0.8], ('c', [[0.3, 0.7], [0.6, 0.4]])])])),
+        SparseCPD('y', 2, ['a', 'b', 'c'], [2, 3, 2], [0.7, 0.3], {(1, 2, 0): [0.1, 0.9], (0, 0, 1): [0.4, 0.6]}),
+    ]
+
+
+@pytest.mark.parametrize('cpd', _cpds(), ids=repr)
+def test_factors_match_dense_table(cpd):
+    dense = cpd.to_dense()
+    assert dense.shape == (cpd.variable_card,) + tuple(cpd.evidence_card)
+    np.testing.assert_allclose(dense.sum(axis=0), 1.0)
+    np.testing.assert_allclose(_product(cpd), dense, atol=1e-12)
+
+
+def test_dense_values():
+    dense = noisy_or('y', ['a', 'b'], [0.9, 0.5], leak=0.1).to_dense()
+    for a, b in itertools.product(range(2), repeat=2):
+        assert dense[1, a, b] == pytest.approx(1 - 0.9 * (1 - 0.9) ** a * (1 - 0.5) ** b)
+    total = DeterministicCPD('y', 4, ['a', 'b', 'c'], [2, 3, 2], 'sum').to_dense()
+    for a, b, c in itertools.product(range(2), range(3), range(2)):
+        assert total[min(a + b + c, 3), a, b, c] == 1.0
+    sparse = SparseCPD('y', 2, ['a', 'b'], [2, 2], [0.7, 0.3], {(1, 0): [0.1, 0.9]}).to_dense()
+    np.testing.assert_allclose(sparse[:, 1, 0], [0.1, 0.9])
+    np.testing.assert_allclose(sparse[:, 0, 1], [0.7, 0.3])
+
+
+@pytest.mark.parametrize('cpd', _cpds(), ids=repr)
+def test_queries_match_dense_network(cpd):
+    rng = np.random.default_rng(1)
+    roots = [rng.dirichlet(np.ones(card)) for card in cpd.evidence_card]
+    args = (['a', 'b', 'c', 'y'], list(cpd.evidence_card) + [cpd.variable_card], [[], [], [], [0, 1, 2]])
+    structured = CompiledNetwork(*args, roots + [cpd])
+    dense = CompiledNetwork(*args, roots + [cpd.to_dense()])
+    for variables, evidence in [(['y'], {}), (['a'], {'y': 1}), (['b', 'c'], {'y': 0, 'a': 1})]:
+        np.testing.assert_allclose(structured.query(variables, evidence), dense.query(variables, evidence),
+                                   atol=1e-12)
+
+
+def test_many_parents():
+    n = 200
+    probabilities = np.linspace(0.01, 0.5, n)
+    priors = np.linspace(0.1, 0.9, n)
+    parents = ['x%d' % i for i in range(n)]
+    network = CompiledNetwork(parents + ['y'], [2] * (n + 1), [[]] * n + [list(range(n))],
+                              [np.array([1 - p, p]) for p in priors]
+                              + [noisy_or('y', parents, probabilities, leak=0.01)])
+    expected = 1 - 0.99 * np.prod(1 - probabilities * priors)
+    assert network.query(['y'])[1] == pytest.approx(expected)
+    posterior = network.query(['x0'], {'y': 0})
+    assert posterior[1] == pytest.approx(priors[0] * (1 - probabilities[0]) / (1 - priors[0] * probabilities[0]))
+
+
+def test_invalid_definitions():
+    with pytest.raises(ValueError):
+        NoisyMaxCPD('y', 2, ['a'], [2], [np.ones((3, 2))])
+    with pytest.raises(ValueError):
+        DeterministicCPD('y', 2, ['a'], [2], 'mean')
+    with pytest.raises(ValueError):
+        TreeCPD('y', 2, ['a'], [2], ('b', [[0.5, 0.5], [0.5, 0.5]]))
+    with pytest.raises(ValueError):
+        SparseCPD('y', 2, ['a', 'b'], [2, 2], [0.5, 0.5], {(1,): [0.2, 0.8]})
+    with pytest.raises(ValueError):
+        CompiledNetwork(['a', 'y'], [2, 2], [[], [0]], [np.full(2, 0.5), noisy_or('z', ['a'], [0.5])])
@@ -0,0 +1,55 @@
+# Tests of BN_Uncertainty.py: Dirichlet CPT samples and credible intervals
+
+import numpy as np
+import pytest
+
+from BN_Structured import noisy_or
+from BN_Uncertainty import credible_interval, posterior_interval, sample_networks
+
+
+def test_samples_are_stacked_distributions(network):
+    sampled = sample_networks(network, samples=500, seed=0)
+    assert sampled.param_shape == (500,)
+    for i, cpt in enumerate(sampled.cpts):
+        np.testing.assert_allclose(cpt.sum(axis=1), 1.0)
+        assert (cpt[:, network.cpts[i] == 0] == 0).all()
+
+
+def test_interval_is_centred_on_the_expert_posterior(network):
+    interval = posterior_interval(network, ['trust'], {'robustness': 0}, samples=4000,
+                                  concentration=200.0, seed=0)
+    expected = network.query(['trust'], {'robustness': 0})
+    np.testing.assert_allclose(interval.mean, expected, atol=0.01)
+    assert (interval.lower <= expected).all() and (expected <= interval.upper).all()
+    assert (interval.upper - interval.lower < 0.2).all()
+
+
+def test_batched_evidence(network):
+    matrix = network.evidence_matrix([{}, {'robustness': 1}, {'rssi': 0}])
+    interval = posterior_interval(network, ['trust'], matrix, samples=200, seed=0)
+    assert interval.mean.shape == (3, 2)
+
+
+def test_selected_nodes_and_concentration(network):
+    sampled = sample_networks(network, samples=50, concentration={'privacy': 10.0}, seed=0)
+    assert sampled.cpts[network._node('privacy')].shape[0] == 50
+    assert sampled.cpts[network._node('trust')] is network.cpts[network._node('trust')]
+    with pytest.raises(ValueError):
+        sample_networks(network, samples=5, concentration=0.0)
+    with pytest.raises(ValueError):
+        sample_networks(sampled)
+
+
+def test_structured_cpds_are_not_sampled():
+    from BN_Compiled import CompiledNetwork
+
+    network = CompiledNetwork(['a', 'b'], [2, 2], [[], [0]],
+                              [np.array([0.4, 0.6]), noisy_or('b', ['a'], [0.8], 0.1)])
+    assert sample_networks(network, samples=10, seed=0).cpts[1] is network.cpts[1]
+    with pytest.raises(ValueError):
+        sample_networks(network, samples=10, nodes=['b'])
+
+
+def test_credible_interval_levels():
+    interval = credible_interval(np.linspace(0.0, 1.0, 1001), level=0.9)
+    assert interval.lower == pytest.approx(0.05) and interval.upper == pytest.approx(0.95)